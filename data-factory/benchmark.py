@@ -0,0 +1,1060 @@
+#!/usr/bin/env python3
+"""
+MicroTerm Data Factory - Benchmarks
+Measures hot paths against a throwaway database
+
+Usage:
+    python benchmark.py            # run every benchmark
+    python benchmark.py db_calls   # run selected benchmarks
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCHMARKS = {}
+
+def benchmark(func):
+    """Register a benchmark under its name without the bench_ prefix"""
+    BENCHMARKS[func.__name__[len('bench_'):]] = func
+    return func
+
+@contextmanager
+def temp_database():
+    """Yield a Database backed by a temporary file"""
+    from database.models import Database
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        try:
+            yield db
+        finally:
+            db.close()
+
+@contextmanager
+def stub_server(handler_class):
+    """Serve handler_class on a local port for the duration of the block"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Keep-alive HTTP handler with simulated network latency"""
+    protocol_version = 'HTTP/1.1'
+    latency = 0.02
+
+    def send_body(self, body: bytes, status: int = 200, headers: dict = None):
+        time.sleep(self.latency)
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class StubJsonRpcHandler(StubHandler):
+    """Fake Base node serving synthetic blocks of 150 transactions"""
+    head = 10_000
+
+    def block(self, number: int) -> dict:
+        transactions = []
+        for i in range(150):
+            whale = i == 0 and number % 10 == 0
+            transactions.append({
+                'hash': f"0x{number:032x}{i:032x}",
+                'from': f"0x{(number * 150 + i) % 2 ** 160:040x}",
+                'to': f"0x{i:040x}",
+                'value': hex(500 * 10 ** 18 if whale else 10 ** 15),
+            })
+        return {'number': hex(number), 'timestamp': hex(1_700_000_000 + number * 2),
+                'transactions': transactions}
+
+    def logs(self, params: dict) -> list:
+        import config
+        logs = []
+        for number in range(int(params['fromBlock'], 16), int(params['toBlock'], 16) + 1):
+            for i in range(20):
+                amount = 5_000_000 if i == 0 and number % 5 == 0 else 250
+                logs.append({
+                    'address': config.USDC_BASE_ADDRESS.lower(),
+                    'blockNumber': hex(number),
+                    'transactionHash': f"0x{number:032x}{i + 1000:032x}",
+                    'topics': [params['topics'][0], f"0x{i:064x}", f"0x{number:064x}"],
+                    'data': f"0x{amount * 10 ** 6:064x}",
+                })
+        return logs
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        responses = []
+        for call in payload if isinstance(payload, list) else [payload]:
+            if call['method'] == 'eth_blockNumber':
+                result = hex(self.head)
+            elif call['method'] == 'eth_getBlockByNumber':
+                result = self.block(int(call['params'][0], 16))
+                if not call['params'][1]:
+                    result['transactions'] = [tx['hash'] for tx in result['transactions']]
+            elif call['method'] == 'eth_getLogs':
+                result = self.logs(call['params'][0])
+            else:
+                result = None
+            responses.append({'jsonrpc': '2.0', 'id': call['id'], 'result': result})
+        self.send_body(json.dumps(responses if isinstance(payload, list) else responses[0]).encode(),
+                       headers={'Content-Type': 'application/json'})
+
+class LiveChainHandler(StubJsonRpcHandler):
+    """Stub node whose chain advances one block per second, block number = unix time"""
+    latency = 0.005
+
+    @property
+    def head(self):
+        return int(time.time())
+
+    def block(self, number: int) -> dict:
+        block = super().block(number)
+        block['timestamp'] = hex(number)
+        block['transactions'][0]['value'] = hex(500 * 10 ** 18)
+        return block
+
+class StubFeedHandler(StubHandler):
+    """RSS feed of 50 items per path, honouring If-None-Match with a 304"""
+    items = 50
+
+    def feed(self) -> bytes:
+        items = ''.join(
+            f"<item><title>Story {i} on {self.path}</title><link>https://example.com{self.path}/{i}</link>"
+            f"<description>{'Lorem ipsum dolor sit amet. ' * 20}</description>"
+            f"<pubDate>Mon, 01 Jan 2024 00:00:00 GMT</pubDate></item>"
+            for i in range(self.items)
+        )
+        return f"<?xml version='1.0'?><rss version='2.0'><channel><title>{self.path}</title>{items}</channel></rss>".encode()
+
+    def do_GET(self):
+        etag = f'"{self.path}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_body(b'', 304, {'ETag': etag})
+        else:
+            self.send_body(self.feed(), 200, {'ETag': etag, 'Content-Type': 'application/rss+xml'})
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+class StubSecHandler(StubHandler):
+    """Fake EDGAR: a current-filings Atom feed and a primary_doc.xml per filing from saved fixtures"""
+    filings = 40
+    fixtures = sorted(
+        open(os.path.join(FIXTURES_DIR, 'form_d', name), 'rb').read()
+        for name in os.listdir(os.path.join(FIXTURES_DIR, 'form_d'))
+    )
+
+    def do_GET(self):
+        if self.path.startswith('/cgi-bin/browse-edgar'):
+            host = f"http://{self.headers['Host']}"
+            entries = ''.join(
+                f"<entry><title>D - Issuer {i} ({i:010d}) (Filer)</title>"
+                f"<link rel='alternate' type='text/html' href='{host}/Archives/edgar/data/{i}/{i:010d}24{i:06d}/{i:010d}-24-{i:06d}-index.htm'/>"
+                f"<updated>2024-03-01T16:05:12-05:00</updated><id>urn:tag:sec.gov,2008:accession-number={i:010d}-24-{i:06d}</id></entry>"
+                for i in range(1, self.filings + 1)
+            )
+            self.send_body(f"<?xml version='1.0'?><feed xmlns='http://www.w3.org/2005/Atom'><title>Latest Filings</title>{entries}</feed>".encode())
+        elif '/full-index/' in self.path or '/daily-index/' in self.path:
+            # Index files from fixtures, honouring single byte ranges like a real server
+            name = os.path.basename(self.path)
+            body = open(os.path.join(FIXTURES_DIR, 'edgar_index', name), 'rb').read()
+            byte_range = self.headers.get('Range', '')
+            if byte_range.startswith('bytes='):
+                start = int(byte_range[len('bytes='):].split('-')[0])
+                if start >= len(body):
+                    self.send_body(b'', 416)
+                else:
+                    self.send_body(body[start:], 206, {'Content-Range': f"bytes {start}-{len(body) - 1}/{len(body)}"})
+            else:
+                self.send_body(body)
+        elif self.path.endswith('/primary_doc.xml'):
+            cik = int(self.path.split('/')[4])
+            self.send_body(self.fixtures[cik % len(self.fixtures)], headers={'Content-Type': 'application/xml'})
+        else:
+            self.send_body(b'not found', 404)
+
+@contextmanager
+def stub_ws_node(block_time: float = 1.0):
+    """Fake WebSocket node pushing a newHeads notification every block_time seconds"""
+    import websockets
+
+    async def handler(ws, path=None):
+        request = json.loads(await ws.recv())
+        await ws.send(json.dumps({'jsonrpc': '2.0', 'id': request['id'], 'result': '0x1'}))
+        try:
+            while True:
+                await asyncio.sleep(block_time)
+                await ws.send(json.dumps({
+                    'jsonrpc': '2.0', 'method': 'eth_subscription',
+                    'params': {'subscription': '0x1', 'result': {'number': hex(int(time.time()))}},
+                }))
+        except websockets.ConnectionClosed:
+            pass
+
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    address = {}
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        server = loop.run_until_complete(websockets.serve(handler, '127.0.0.1', 0))
+        address['port'] = server.sockets[0].getsockname()[1]
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, daemon=True).start()
+    ready.wait()
+    try:
+        yield f"ws://127.0.0.1:{address['port']}"
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+
+def timed(func, iterations: int) -> float:
+    """Call func(i) for each iteration and return elapsed seconds"""
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(i)
+    return time.perf_counter() - start
+
+def report(label: str, count: int, elapsed: float, unit: str = 'calls'):
+    print(f"  {label:<44} {count / elapsed:>14,.0f} {unit}/s")
+
+@benchmark
+def bench_db_calls(iterations: int = 2000):
+    """Per-call connect/commit (previous behaviour) vs pooled connections"""
+    print(f"[Benchmark] Database calls ({iterations} iterations)")
+    with temp_database() as db:
+        addresses = [f"0x{i:040x}" for i in range(iterations)]
+
+        def legacy_connection():
+            conn = sqlite3.connect(db.db_path)
+            conn.row_factory = sqlite3.Row
+            return conn
+
+        def legacy_insert(i):
+            conn = legacy_connection()
+            conn.execute(
+                'INSERT OR REPLACE INTO known_addresses (address, label, category) VALUES (?, ?, ?)',
+                (addresses[i], 'legacy', 'bench')
+            )
+            conn.commit()
+            conn.close()
+
+        def legacy_lookup(i):
+            conn = legacy_connection()
+            conn.execute('SELECT label FROM known_addresses WHERE address = ?', (addresses[i],)).fetchone()
+            conn.close()
+
+        report('insert_known_address (connect per call)', iterations, timed(legacy_insert, iterations))
+        report('insert_known_address (pooled)', iterations,
+               timed(lambda i: db.insert_known_address(addresses[i], 'pooled', 'bench'), iterations))
+        report('get_address_label (connect per call)', iterations, timed(legacy_lookup, iterations))
+        report('get_address_label (pooled)', iterations,
+               timed(lambda i: db.get_address_label(addresses[i]), iterations))
+
+@benchmark
+def bench_worker_setup(iterations: int = 50):
+    """Per-tick worker construction (previous behaviour) vs one long-lived worker"""
+    from database.models import Database
+    from workers.blockchain_worker import BlockchainWorker
+
+    print(f"[Benchmark] Worker setup overhead ({iterations} ticks)")
+    with temp_database() as db:
+        def per_tick_worker(i):
+            # Previously every tick built a Database (full schema init) and re-seeded labels
+            tick_db = Database(db.db_path)
+            BlockchainWorker(db=tick_db).setup()
+            tick_db.close()
+
+        start = time.perf_counter()
+        worker = BlockchainWorker(db=db)
+        worker.setup()
+        startup = time.perf_counter() - start
+
+        elapsed = timed(per_tick_worker, iterations)
+        print(f"  {'one-time startup (long-lived worker)':<44} {startup * 1000:>14,.2f} ms")
+        print(f"  {'overhead per tick (construct per tick)':<44} {elapsed / iterations * 1000:>14,.2f} ms")
+
+@benchmark
+def bench_address_labels(count: int = 200_000, lookups: int = 50_000):
+    """Bulk label import, index warm-up and lookups vs per-call SQLite queries"""
+    import random
+    from database.address_labels import AddressLabelIndex, import_label_file
+
+    print(f"[Benchmark] Address labels ({count:,} labels, {lookups:,} lookups)")
+    with temp_database() as db:
+        path = os.path.join(os.path.dirname(db.db_path), 'labels.csv')
+        addresses = [f"0x{random.getrandbits(160):040x}" for _ in range(count)]
+        with open(path, 'w') as f:
+            f.write('address,label,category\n')
+            for i, address in enumerate(addresses):
+                f.write(f"{address},Entity {i % 5000},exchange\n")
+
+        start = time.perf_counter()
+        import_label_file(db, path)
+        report('import_label_file', count, time.perf_counter() - start, 'rows')
+
+        index = AddressLabelIndex(db)
+        start = time.perf_counter()
+        index.warm()
+        print(f"  {'AddressLabelIndex.warm':<44} {(time.perf_counter() - start) * 1000:>14,.0f} ms")
+
+        # Half known, half unknown addresses, like senders/receivers in a block
+        probes = [addresses[i % count] if i % 2 else f"0x{random.getrandbits(160):040x}"
+                  for i in range(lookups)]
+        report('Database.get_address_label', lookups, timed(lambda i: db.get_address_label(probes[i]), lookups))
+        report('AddressLabelIndex.get', lookups, timed(lambda i: index.get(probes[i]), lookups))
+
+@benchmark
+def bench_block_scan(blocks: int = 400):
+    """Block range scan throughput against a stub JSON-RPC node"""
+    import config
+    from workers.blockchain_worker import BlockchainWorker
+    from workers.rpc import JsonRpcClient
+
+    print(f"[Benchmark] Block scan ({blocks} blocks, {StubJsonRpcHandler.latency * 1000:.0f}ms RPC latency)")
+    scan_mode = config.BLOCKCHAIN_SCAN_MODE
+    with temp_database() as db, stub_server(StubJsonRpcHandler) as url:
+        for mode, batch_size, concurrency in (('blocks', 1, 1), ('blocks', 20, 1),
+                                              ('blocks', 20, 4), ('logs', 20, 4)):
+            config.BLOCKCHAIN_SCAN_MODE = mode
+            worker = BlockchainWorker(db=db, rpc=JsonRpcClient(url, batch_size=batch_size,
+                                                                max_workers=concurrency))
+            start = StubJsonRpcHandler.head - blocks + 1
+            stats = worker.scan_range(start, StubJsonRpcHandler.head, f"bench:{mode}:{batch_size}:{concurrency}")
+            report(f"mode={mode} batch={batch_size} concurrency={concurrency}",
+                   stats['blocks'], stats['seconds'], 'blocks')
+    config.BLOCKCHAIN_SCAN_MODE = scan_mode
+
+@benchmark
+def bench_stream_latency(seconds: float = 8):
+    """Block timestamp to alert insert latency with newHeads streaming vs polling"""
+    import config
+    from workers.blockchain_worker import BlockchainWorker
+    from workers.rpc import JsonRpcClient
+
+    print(f"[Benchmark] Alert latency ({seconds:.0f}s per mode, 1s blocks)")
+    with temp_database() as db, stub_server(LiveChainHandler) as url, stub_ws_node() as ws_url:
+        worker = BlockchainWorker(db=db, rpc=JsonRpcClient(url), ws_url=ws_url)
+        stream = threading.Thread(target=worker.stream, daemon=True)
+        stream.start()
+        time.sleep(seconds)
+        worker.stop_stream()
+        stream.join()
+        streamed = worker.latency_stats()
+
+        # Polling at the configured interval, sampled over one interval
+        worker = BlockchainWorker(db=db, rpc=JsonRpcClient(url), ws_url=ws_url)
+        worker.catch_up()
+        time.sleep(min(seconds, config.BLOCKCHAIN_WORKER_INTERVAL))
+        worker.catch_up()
+        polled = worker.latency_stats()
+
+    for label, stats in (('newHeads stream', streamed), ('polling', polled)):
+        if stats['count']:
+            print(f"  {label:<44} p50 {stats['p50']:.1f}s  p95 {stats['p95']:.1f}s  max {stats['max']:.1f}s")
+
+@benchmark
+def bench_feed_fetch(fetches: int = 50):
+    """Unconditional download and parse (previous behaviour) vs conditional GET"""
+    import feedparser
+    import requests
+    from workers.feeds import FeedFetcher
+    from workers.ratelimit import HostRateLimiter
+
+    print(f"[Benchmark] Feed fetch ({fetches} fetches of an unchanged feed)")
+    with temp_database() as db, stub_server(StubFeedHandler) as url:
+        session = requests.Session()
+        feed_url = f"{url}/news"
+
+        def unconditional(i):
+            feedparser.parse(session.get(feed_url).content)
+
+        def conditional(i):
+            feed, validators = fetcher.fetch(feed_url)
+            if validators:
+                fetcher.commit(feed_url, validators)
+
+        fetcher = FeedFetcher(db, session, HostRateLimiter(default=(1000, 1000)))
+        report('download + parse every tick', fetches, timed(unconditional, fetches), 'fetches')
+        report('conditional GET (304)', fetches, timed(conditional, fetches), 'fetches')
+        stats = db.get_feed_stats()[0]
+        print(f"  {'304s / parsed':<44} {stats['not_modified']:>8} / {stats['parsed']}")
+        print(f"  {'bytes downloaded / saved':<44} {stats['bytes_downloaded']:>8,} / {stats['bytes_saved']:,}")
+
+@benchmark
+def bench_feed_fanout(feeds: int = 100, sec_requests: int = 30):
+    """Sequential feed fetch with a 1s pause (previous behaviour) vs concurrent, rate limited per host"""
+    import feedparser
+    from workers.feeds import FeedFetcher
+    from workers.ratelimit import HostRateLimiter, pooled_session
+
+    class SlowFeedHandler(StubFeedHandler):
+        latency = 0.1
+
+    print(f"[Benchmark] Feed fan-out ({feeds} feeds, {SlowFeedHandler.latency * 1000:.0f}ms latency)")
+    with temp_database() as db, stub_server(SlowFeedHandler) as url:
+        urls = [f"{url}/feed/{i}" for i in range(feeds)]
+        session = pooled_session()
+
+        start = time.perf_counter()
+        for feed_url in urls:
+            feedparser.parse(session.get(feed_url).content)
+        elapsed = time.perf_counter() - start
+        report('sequential (without the 1s pauses)', feeds, elapsed, 'feeds')
+        report('sequential (with the 1s pauses)', feeds, elapsed + feeds, 'feeds')
+
+        # 127.0.0.1 stands in for many unrelated hosts; "localhost" reaches the
+        # same server but is held to the SEC fair-access rate
+        limiter = HostRateLimiter(limits={'localhost': (10, 10)}, default=(1000, 1000))
+        fetcher = FeedFetcher(db, session, limiter)
+        start = time.perf_counter()
+        fetched = sum(1 for _, feed, _, error in fetcher.fetch_many(urls) if feed and not error)
+        report(f'concurrent x{fetcher.max_workers}', fetched, time.perf_counter() - start, 'feeds')
+
+        sec_urls = [f"{url.replace('127.0.0.1', 'localhost')}/sec/{i}" for i in range(sec_requests)]
+        start = time.perf_counter()
+        list(fetcher.fetch_many(sec_urls))
+        report('concurrent, one host limited to 10/s', sec_requests, time.perf_counter() - start, 'feeds')
+
+@benchmark
+def bench_seen_keys(entries: int = 200, rounds: int = 20):
+    """Steady-state feed of stored articles: full enrichment before the UNIQUE check vs seen-key rejection"""
+    import feedparser
+    import requests
+    from database.seen_keys import SeenKeyIndex
+    from workers.news_worker import NewsWorker
+
+    class WideFeedHandler(StubFeedHandler):
+        items = entries
+
+    print(f"[Benchmark] Duplicate rejection ({entries} stored entries x {rounds} rounds)")
+    with temp_database() as db, stub_server(WideFeedHandler) as url:
+        feed = feedparser.parse(requests.get(f"{url}/news").content)
+        worker = NewsWorker(db=db)
+
+        def enrich_and_insert(entries):
+            articles = [worker.parse_article(entry, url) for entry in entries]
+            worker.score_articles(articles)
+            db.insert_news_many(articles)
+
+        enrich_and_insert(feed.entries)
+
+        seen = SeenKeyIndex(db)
+        seen.warm(['news'])
+
+        def reject_early(i):
+            enrich_and_insert([entry for entry in feed.entries if not seen.seen('news', entry.get('link', ''))])
+
+        report('parse + enrich + insert (UNIQUE rejects)', entries * rounds,
+               timed(lambda i: enrich_and_insert(feed.entries), rounds), 'entries')
+        report('seen-key index rejects first', entries * rounds, timed(reject_early, rounds), 'entries')
+
+@benchmark
+def bench_sentiment(articles: int = 2000, terms: int = 10_000):
+    """Per-keyword substring scan (previous behaviour) vs the compiled lexicon, at 14 and 10k terms"""
+    import random
+    from workers.sentiment import DEFAULT_LEXICON, SentimentEngine
+
+    print(f"[Benchmark] Sentiment scoring ({articles:,} articles)")
+    rng = random.Random(7)
+    vocabulary = [f"word{i}" for i in range(5000)] + list(DEFAULT_LEXICON)
+    texts = [' '.join(rng.choice(vocabulary) for _ in range(rng.randint(25, 60))) for _ in range(articles)]
+
+    legacy_bullish = ['surge', 'rally', 'gain', 'approve', 'adoption', 'upgrade', 'success']
+    legacy_bearish = ['crash', 'drop', 'fall', 'reject', 'hack', 'scam', 'fraud']
+    large = dict(DEFAULT_LEXICON)
+    while len(large) < terms:
+        words = [f"term{rng.randrange(10 ** 6)}" for _ in range(rng.choice((1, 1, 1, 2, 3)))]
+        large[' '.join(words)] = rng.choice((-2, -1, 1, 2))
+    large_bullish = [term for term, weight in large.items() if weight > 0]
+    large_bearish = [term for term, weight in large.items() if weight < 0]
+
+    def legacy(text, bullish, bearish):
+        text = text.lower()
+        return sum(1 for word in bullish if word in text) - sum(1 for word in bearish if word in text)
+
+    for label, bullish, bearish, lexicon in (
+        ('14 terms', legacy_bullish, legacy_bearish, {w: 1 for w in legacy_bullish} | {w: -1 for w in legacy_bearish}),
+        (f"{len(large):,} terms", large_bullish, large_bearish, large),
+    ):
+        sample = texts if len(bullish) + len(bearish) < 100 else texts[:max(1, articles // 20)]
+        report(f"substring scan, {label}", len(sample),
+               timed(lambda i: legacy(sample[i], bullish, bearish), len(sample)), 'articles')
+
+        start = time.perf_counter()
+        engine = SentimentEngine(lexicon)
+        compiled = time.perf_counter() - start
+        report(f"SentimentEngine.score_many, {label}", articles,
+               timed(lambda i: engine.score_many(texts), 1), 'articles')
+        print(f"  {'  (compile)':<44} {compiled * 1000:>14,.1f} ms")
+
+# Feed summary shapes seen in the configured sources: image-led teasers,
+# short plain paragraphs, and full article bodies in the description
+FEED_SUMMARIES = [
+    '<p style="float:right; margin:0 0 10px 15px; width:240px;"><img src="https://images.cointelegraph.com/images/240_abc.jpg"></p>'
+    '<p>Bitcoin&rsquo;s price climbed above $67,000 as spot ETF inflows hit a three-week high, '
+    'while traders eye the Federal Reserve&#39;s next rate decision.</p>',
+    'Ether fell 4% on Tuesday after a large holder moved 25,000 ETH to an exchange &mdash; '
+    'the biggest single deposit since March.',
+    '<div class="article"><h2>Markets</h2>' + ''.join(
+        f'<p>Paragraph {i}: the <a href="https://www.coindesk.com/tag/{i}/">protocol</a> upgrade '
+        f'went live at block 19,{i:03d},000 &amp; validators reported <em>no issues</em>. '
+        f'Analysts at <strong>Example&nbsp;Capital</strong> said demand could stay strong.</p>'
+        for i in range(40)
+    ) + '<script>window.dataLayer = window.dataLayer || [];</script></div>',
+    '<figure><img src="a.png" alt="chart"/><figcaption>BTC/USD daily chart. Source: TradingView</figcaption></figure>'
+    '<p>Short interest in COIN shares rose to 12% of float, data shows.</p><!-- tracking pixel -->',
+]
+
+@benchmark
+def bench_html_summary(rounds: int = 2000):
+    """Per-entry BeautifulSoup tree (previous behaviour) vs the streaming text extractor"""
+    from workers.html_text import summarize_html
+
+    print(f"[Benchmark] Feed summary extraction ({len(FEED_SUMMARIES)} summary shapes x {rounds})")
+    corpus = FEED_SUMMARIES * rounds
+
+    try:
+        from bs4 import BeautifulSoup
+    except ImportError:
+        print(f"  {'BeautifulSoup (not installed, skipped)':<44}")
+    else:
+        def soup_summary(i):
+            text = BeautifulSoup(corpus[i], 'html.parser').get_text()
+            return text[:200] + '...' if len(text) > 200 else text
+        sample = len(corpus) // 10
+        report('BeautifulSoup get_text + slice', sample, timed(soup_summary, sample), 'summaries')
+
+    report('summarize_html', len(corpus), timed(lambda i: summarize_html(corpus[i], 200), len(corpus)), 'summaries')
+
+@benchmark
+def bench_form_d(rounds: int = 2000):
+    """Form D parsing (full tree vs streaming) and concurrent primary_doc.xml fetch under the SEC rate limit"""
+    from lxml import etree
+    import config
+    from workers.doc_cache import DocumentCache
+    from workers.form_d import parse_form_d
+    from workers.ratelimit import HostRateLimiter, pooled_session
+    from workers.sec_worker import SECWorker
+
+    class SlowSecHandler(StubSecHandler):
+        latency = 0.25
+
+    print(f"[Benchmark] Form D pipeline ({len(StubSecHandler.fixtures)} fixtures, {SlowSecHandler.filings} filings)")
+    docs = StubSecHandler.fixtures * rounds
+
+    def full_tree(i):
+        root = etree.fromstring(docs[i])
+        ns = {'d': root.nsmap[None]} if None in root.nsmap else None
+        prefix = 'd:' if ns else ''
+        return (root.findtext(f'.//{prefix}primaryIssuer/{prefix}entityName', namespaces=ns),
+                root.findtext(f'.//{prefix}totalOfferingAmount', namespaces=ns))
+
+    report('etree.fromstring + findtext', len(docs), timed(full_tree, len(docs)), 'docs')
+    report('parse_form_d (iterparse, stops at amounts)', len(docs),
+           timed(lambda i: parse_form_d(docs[i]), len(docs)), 'docs')
+
+    feed_url = config.SEC_FORM_D_RSS
+    with stub_server(SlowSecHandler) as url:
+        config.SEC_FORM_D_RSS = f"{url}/cgi-bin/browse-edgar?action=getcurrent&type=D&output=atom"
+        for concurrency in (1, config.SEC_FETCH_CONCURRENCY):
+            # A fresh, empty document cache per run, so every run downloads every filing
+            with temp_database() as db, tempfile.TemporaryDirectory() as cache_dir:
+                # The stub host gets the same 10 req/s bucket as www.sec.gov
+                worker = SECWorker(db=db, session=pooled_session(), cache=DocumentCache(cache_dir),
+                                   limiter=HostRateLimiter(limits={'127.0.0.1': config.HOST_RATE_LIMITS['www.sec.gov']}))
+                worker.form_d.max_workers = concurrency
+                start = time.perf_counter()
+                worker.fetch_form_d_filings()
+                elapsed = time.perf_counter() - start
+                stored = len(db.get_recent_deals(limit=SlowSecHandler.filings))
+            report(f"fetch + parse + store, concurrency={concurrency}", SlowSecHandler.filings, elapsed, 'filings')
+            print(f"  {'  (stored over $1M)':<44} {stored:>14}")
+    config.SEC_FORM_D_RSS = feed_url
+
+@benchmark
+def bench_doc_cache(evict_max_bytes: int = 64 * 1024):
+    """Re-running the Form D pipeline from a fresh database: network vs on-disk document cache"""
+    import config
+    from workers.doc_cache import DocumentCache
+    from workers.ratelimit import HostRateLimiter, pooled_session
+    from workers.sec_worker import SECWorker
+
+    class SlowSecHandler(StubSecHandler):
+        latency = 0.25
+        filings = 200
+
+    print(f"[Benchmark] EDGAR document cache ({SlowSecHandler.filings} filings per run)")
+    feed_url = config.SEC_FORM_D_RSS
+    with stub_server(SlowSecHandler) as url, tempfile.TemporaryDirectory() as cache_dir:
+        config.SEC_FORM_D_RSS = f"{url}/cgi-bin/browse-edgar?action=getcurrent&type=D&output=atom"
+        cache = DocumentCache(cache_dir)
+        for label in ('cold cache (network)', 'warm cache (disk)'):
+            # A fresh database each run, like a rebuild or a backfill over stored filings
+            with temp_database() as db:
+                worker = SECWorker(db=db, session=pooled_session(), cache=cache,
+                                   limiter=HostRateLimiter(limits={'127.0.0.1': config.HOST_RATE_LIMITS['www.sec.gov']}))
+                start = time.perf_counter()
+                worker.fetch_form_d_filings()
+                report(label, SlowSecHandler.filings, time.perf_counter() - start, 'filings')
+        print(f"  {'cache stats':<44} {cache.stats()}")
+
+        small = DocumentCache(cache_dir, max_bytes=evict_max_bytes)
+        small.put('bench/evict.xml', StubSecHandler.fixtures[0])
+        remaining = sum(size for _, _, size in small._scan())
+        print(f"  {f'evict to {evict_max_bytes // 1024} KB limit':<44} {small.evictions:>8} evicted, {remaining:,} bytes left")
+    config.SEC_FORM_D_RSS = feed_url
+
+@benchmark
+def bench_edgar_index(lines: int = 500_000):
+    """Streaming a large synthetic form.idx: throughput and peak Python memory"""
+    import tracemalloc
+    import config
+    from workers.edgar_index import stream_index
+
+    print(f"[Benchmark] EDGAR index streaming ({lines:,} lines)")
+    form_types = ['10-K', '10-Q', '8-K', 'D', 'D/A', '4', 'SC 13G', 'S-1']
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'form.idx')
+        with open(path, 'w') as f:
+            f.write('Form Type   Company Name                                                  CIK         Date Filed  File Name\n')
+            f.write('-' * 141 + '\n')
+            for i in range(lines):
+                f.write(f"{form_types[i % len(form_types)]:<12}{f'Company {i} Holdings Inc':<62}{i:<12}"
+                        f"2024-01-02  edgar/data/{i}/{i:010d}-24-{i % 1000000:06d}.txt\n")
+        size = os.path.getsize(path)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        matched = sum(1 for row, _ in stream_index(path) if row and row.form_type in config.SEC_BACKFILL_FORM_TYPES)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    report('stream_index + Form D filter', lines, elapsed, 'lines')
+    print(f"  {'Form D / D/A rows':<44} {matched:>14,}")
+    print(f"  {'index size / peak Python memory':<44} {size / 1e6:>11,.1f} MB / {peak / 1e6:.2f} MB")
+
+def fake_market_source(latency: float = 0.0, days: int = 5):
+    """Market source returning random daily bars in yfinance's (field, ticker) layout.
+
+    Each call sleeps for latency, like one HTTP round trip. Tickers without
+    a -USD suffix get no bars on the frame's weekend rows, as stocks do.
+    """
+    import numpy as np
+    import pandas as pd
+
+    def source(tickers):
+        time.sleep(latency)
+        rng = np.random.default_rng(len(tickers))
+        index = pd.date_range(end='2024-03-04', periods=days, freq='D')
+        close = 100 * np.cumprod(1 + rng.normal(0, 0.02, (days, len(tickers))), axis=0)
+        volume = rng.integers(1_000, 10_000_000, (days, len(tickers))).astype(float)
+        weekend = np.asarray(index.dayofweek >= 5)
+        stocks = np.array([not ticker.endswith('-USD') for ticker in tickers])
+        close[np.ix_(weekend, stocks)] = np.nan
+        volume[np.ix_(weekend, stocks)] = np.nan
+        columns = pd.MultiIndex.from_product([['Close', 'Volume'], tickers])
+        return pd.DataFrame(np.hstack([close, volume]), index=index, columns=columns)
+    return source
+
+@benchmark
+def bench_market_batch(tickers: int = 1000, serial_tickers: int = 100, latency: float = 0.05):
+    """Per-ticker fetch and write (previous behaviour) vs one batched download and transaction"""
+    from workers.market_worker import MarketWorker, compute_snapshots
+
+    print(f"[Benchmark] Market data ({latency * 1000:.0f} ms per request)")
+    symbols = [f"T{i}" if i % 2 else f"C{i}-USD" for i in range(tickers)]
+    source = fake_market_source(latency)
+    with temp_database() as db:
+        def per_ticker(i):
+            # The old worker made an info and a history request per ticker
+            source([symbols[i]])
+            frame = source([symbols[i]])
+            for row in compute_snapshots(frame, [symbols[i]]):
+                db.update_market_data(**row)
+
+        report('per-ticker requests + writes', serial_tickers, timed(per_ticker, serial_tickers), 'symbols')
+
+        worker = MarketWorker(db=db, source=source, tickers=symbols)
+        start = time.perf_counter()
+        stored = worker.fetch_market_data()
+        report('batched download + one transaction', stored, time.perf_counter() - start, 'symbols')
+
+        frame = fake_market_source()(symbols)
+        report('compute_snapshots (vectorized)', tickers * 20,
+               timed(lambda i: compute_snapshots(frame, symbols), 20), 'symbols')
+        rows = compute_snapshots(frame, symbols)
+        report('update_market_data (one per symbol)', tickers,
+               timed(lambda i: db.update_market_data(**rows[i]), tickers), 'symbols')
+        report('update_market_data_many', tickers * 5,
+               timed(lambda i: db.update_market_data_many(rows), 5), 'symbols')
+
+@benchmark
+def bench_change_feed(rows: int = 20_000, polls: int = 5000, batch: int = 200):
+    """Stream polling: latest row per feed table (previous behaviour) vs change log version and deltas"""
+    from datetime import datetime, timedelta
+
+    print(f"[Benchmark] Change feed ({rows:,} rows per feed table)")
+    with temp_database() as db:
+        now = datetime.now()
+
+        def articles(start, count):
+            return [{'title': f"Article {i}", 'url': f"https://example.com/{i}", 'source': 'bench',
+                     'published_at': now + timedelta(seconds=i)} for i in range(start, start + count)]
+
+        start = time.perf_counter()
+        db.insert_news_many(articles(0, rows))
+        report('insert_news_many (with change log triggers)', rows, time.perf_counter() - start, 'rows')
+        db.insert_deals_many([{'company_name': f"Co {i}", 'filing_url': f"f{i}", 'filed_at': now}
+                              for i in range(rows)])
+        db.insert_whale_alerts_many([{'tx_hash': f"0x{i:064x}", 'amount': i, 'timestamp': now}
+                                     for i in range(rows)])
+
+        conn = db.get_connection()
+
+        def latest_rows(i):
+            conn.execute('SELECT * FROM private_deals ORDER BY filed_at DESC LIMIT 1').fetchone()
+            conn.execute('SELECT * FROM whale_alerts ORDER BY timestamp DESC LIMIT 1').fetchone()
+            conn.execute('SELECT * FROM news ORDER BY published_at DESC LIMIT 1').fetchone()
+
+        report('3 latest-row queries per poll', polls, timed(latest_rows, polls), 'polls')
+        report('get_change_version (nothing changed)', polls,
+               timed(lambda i: db.get_change_version(), polls), 'polls')
+
+        version = db.get_change_version()
+        db.insert_news_many(articles(rows, batch))
+        report(f'get_changes_since ({batch} new rows)', polls // 10,
+               timed(lambda i: db.get_changes_since(version), polls // 10), 'polls')
+
+@benchmark
+def bench_keyset_pages(rows: int = 100_000, page_size: int = 50, depth: int = 1000, pages: int = 200):
+    """Deep history pages: LIMIT/OFFSET vs (timestamp, id) keyset cursors, plus query plan checks"""
+    from datetime import datetime, timedelta
+
+    print(f"[Benchmark] Keyset pagination ({rows:,} rows, page {depth} of {page_size})")
+    with temp_database() as db:
+        now = datetime.now()
+        sentiments = ('Bullish', 'Bearish', 'Neutral')
+        db.insert_news_many([{'title': f"Article {i}", 'url': f"https://example.com/{i}",
+                              'source': f"source{i % 8}", 'sentiment': sentiments[i % 3],
+                              'published_at': now - timedelta(seconds=i // 2)} for i in range(rows)])
+        labels = ('Binance', None, 'Coinbase', 'Kraken')
+        db.insert_whale_alerts_many([{'tx_hash': f"0x{i:064x}", 'token_symbol': ('USDC', 'ETH')[i % 2],
+                                      'amount': i, 'sender_label': labels[i % 4], 'receiver_label': labels[i % 3],
+                                      'timestamp': now - timedelta(seconds=i)} for i in range(rows // 10)])
+        db.insert_deals_many([{'company_name': f"Co {i}", 'filing_url': f"f{i}", 'sector': f"sector{i % 5}",
+                               'amount_raised': i * 1000, 'filed_at': now - timedelta(minutes=i)}
+                              for i in range(rows // 10)])
+        conn = db.get_connection()
+        conn.execute('ANALYZE')
+
+        cursor = None
+        for _ in range(depth):
+            cursor = db.get_news_page(cursor, page_size)['next_cursor']
+        offset = depth * page_size
+
+        report(f'OFFSET {offset:,}', pages, timed(lambda i: conn.execute(
+            'SELECT * FROM news ORDER BY published_at DESC, id DESC LIMIT ? OFFSET ?', (page_size, offset)
+        ).fetchall(), pages), 'pages')
+        report(f'keyset cursor at row {offset:,}', pages,
+               timed(lambda i: db.get_news_page(cursor, page_size), pages), 'pages')
+        report('keyset cursor, sentiment + source filter', pages,
+               timed(lambda i: db.get_news_page(cursor, page_size, sentiment='Bullish', source='source2'), pages),
+               'pages')
+
+        # Every filter must page with an index range scan over its intended index
+        # and no sort over the table (the label UNION only sorts its two
+        # page-sized branches to merge them)
+        checks = [
+            ('deals', db.get_deals_page, {}, ['idx_deals_filed_at_amount']),
+            ('deals sector', db.get_deals_page, {'sector': 'sector1'}, ['idx_deals_sector_filed_at']),
+            ('deals amount', db.get_deals_page, {'min_amount': 1000, 'max_amount': 5_000_000},
+             ['idx_deals_filed_at_amount']),
+            ('alerts', db.get_alerts_page, {}, ['idx_alerts_time_amount']),
+            ('alerts token', db.get_alerts_page, {'token_symbol': 'ETH'}, ['idx_alerts_token_time']),
+            ('alerts amount', db.get_alerts_page, {'min_amount': 10}, ['idx_alerts_time_amount']),
+            ('alerts label', db.get_alerts_page, {'label': 'Binance', 'min_amount': 10},
+             ['idx_alerts_receiver_label_time', 'idx_alerts_sender_label_time']),
+            ('news', db.get_news_page, {}, ['idx_news_published']),
+            ('news sentiment', db.get_news_page, {'sentiment': 'Bearish'}, ['idx_news_sentiment_published']),
+            ('news source', db.get_news_page, {'source': 'source3'}, ['idx_news_source_published']),
+        ]
+        for label, get_page, filters, expected in checks:
+            statements = []
+            next_cursor = get_page(None, page_size, **filters)['next_cursor']
+            conn.set_trace_callback(statements.append)
+            get_page(next_cursor, page_size, **filters)
+            conn.set_trace_callback(None)
+            query = next(sql for sql in statements if sql.lstrip().startswith('SELECT'))
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}")]
+            index_scan = all(not step.startswith('SCAN') or 'subquery' in step for step in plan) and \
+                any('USING INDEX' in step for step in plan)
+            full_sort = any('TEMP B-TREE' in step for step in plan) and 'MERGE (UNION)' not in plan
+            indexes = sorted({step.split('USING INDEX ')[1].split()[0] for step in plan if 'USING INDEX' in step})
+            if not index_scan or full_sort:
+                status = 'NOT AN INDEX RANGE SCAN'
+            elif indexes != expected:
+                status = 'WRONG INDEX'
+            else:
+                status = 'ok'
+            print(f"  {f'plan: {label}':<44} {status:>14}  {', '.join(indexes)}")
+
+@benchmark
+def bench_search(news: int = 1_000_000, deals: int = 500_000, alerts: int = 500_000, queries: int = 200):
+    """Keyword lookup across news, deals and alert labels: LIKE scan vs FTS5 search()"""
+    import random
+    from datetime import datetime
+
+    print(f"[Benchmark] Full-text search ({news + deals + alerts:,} rows)")
+    rng = random.Random(7)
+    # 20k-word vocabulary: any one word appears in ~0.2% of articles
+    vocabulary = [f"w{i}" for i in range(20_000)]
+    words = lambda count: ' '.join(rng.choices(vocabulary, k=count))
+
+    with temp_database() as db:
+        now = datetime.now()
+        start = time.perf_counter()
+        for offset in range(0, news, 50_000):
+            db.insert_news_many([{'title': words(8), 'summary': words(24), 'url': f"u{i}", 'published_at': now}
+                                 for i in range(offset, min(offset + 50_000, news))])
+        for offset in range(0, deals, 50_000):
+            db.insert_deals_many([{'company_name': f"{words(2)} Holdings LLC", 'sector': words(1),
+                                   'filing_url': f"f{i}", 'filed_at': now}
+                                  for i in range(offset, min(offset + 50_000, deals))])
+        for offset in range(0, alerts, 50_000):
+            db.insert_whale_alerts_many([{'tx_hash': f"0x{i:064x}", 'sender_label': words(2),
+                                          'receiver_label': words(2), 'timestamp': now}
+                                         for i in range(offset, min(offset + 50_000, alerts))])
+        report('insert with FTS and change log triggers', news + deals + alerts,
+               time.perf_counter() - start, 'rows')
+
+        conn = db.get_connection()
+        terms = rng.choices(vocabulary, k=queries)
+        like_runs = 3
+        elapsed = timed(lambda i: conn.execute(
+            'SELECT id FROM news WHERE title LIKE ? OR summary LIKE ?', (f"%{terms[i]} %",) * 2
+        ).fetchall(), like_runs)
+        print(f"  {'LIKE scan of news title/summary':<44} {elapsed / like_runs * 1000:>11.2f} ms/query")
+
+        for label, make_query, options in (
+            ('search(): one word, all kinds', lambda i: terms[i], {}),
+            ('search(): one word, news only', lambda i: terms[i], {'kinds': ['news']}),
+            ('search(): two words', lambda i: f"{terms[i]} {terms[-i - 1]}", {}),
+            ('search(): one word, page 6', lambda i: terms[i], {'offset': 100}),
+        ):
+            elapsed = timed(lambda i: db.search(make_query(i), limit=20, **options), queries)
+            print(f"  {label:<44} {elapsed / queries * 1000:>11.2f} ms/query")
+
+@benchmark
+def bench_retention(rows: int = 200_000, days: int = 180):
+    """Archiving aged news and ticks: rows moved per second, hot file size, archive reads"""
+    from datetime import datetime, timedelta
+    from database.retention import Archive, RetentionManager
+
+    print(f"[Benchmark] Retention ({rows:,} news rows and {rows:,} ticks over {days} days)")
+    with temp_database() as db, tempfile.TemporaryDirectory() as archive_dir:
+        now = datetime.now()
+        step = timedelta(days=days) / rows
+        summary = 'Ether fell 4% after a large holder moved 25,000 ETH to an exchange.'
+        db.insert_news_many([{'title': f"Article {i} about markets", 'summary': summary,
+                              'url': f"https://example.com/{i}", 'source': 'bench', 'sentiment': 'Neutral',
+                              'published_at': now - step * i} for i in range(rows)])
+        conn = db.get_connection()
+        with conn:
+            conn.executemany(
+                'INSERT INTO market_ticks (symbol, price, change_24h, volume_24h, ts) VALUES (?, ?, ?, ?, ?)',
+                [('BTC', 60_000 + i % 1000, 0.5, 1e9, now - step * i) for i in range(rows)]
+            )
+
+        manager = RetentionManager(db, Archive(archive_dir))
+        before = manager.stats()['hot_bytes']
+        start = time.perf_counter()
+        moved = manager.run(now)
+        elapsed = time.perf_counter() - start
+        stats = manager.stats()
+        archive_bytes = sum(table['bytes'] for table in stats['archive'].values())
+
+        report('archive + delete + incremental vacuum', sum(moved.values()), elapsed, 'rows')
+        print(f"  {'hot database before / after':<44} {before / 1e6:>11,.1f} MB / {stats['hot_bytes'] / 1e6:.1f} MB")
+        print(f"  {'archive size (gzip NDJSON)':<44} {archive_bytes / 1e6:>11,.1f} MB")
+
+        start = time.perf_counter()
+        history = manager.query_range('news', now - timedelta(days=120), now - timedelta(days=60), include_archive=True)
+        report('query_range over hot + archived news', len(history), time.perf_counter() - start, 'rows')
+
+@benchmark
+def bench_columnar(ticks: int = 1_000_000, symbols: int = 500):
+    """Loading tick history for analysis: sqlite3.Row dicts vs memory-mapped column files"""
+    import tracemalloc
+    from datetime import datetime, timedelta
+    import numpy as np
+    from database.columnar import ColumnarExporter, ColumnarStore
+
+    print(f"[Benchmark] Columnar export ({ticks:,} ticks, {symbols} symbols)")
+    with temp_database() as db, tempfile.TemporaryDirectory() as columnar_dir:
+        start_ts = datetime.now() - timedelta(days=365)
+        conn = db.get_connection()
+        with conn:
+            conn.executemany(
+                'INSERT INTO market_ticks (symbol, price, change_24h, volume_24h, ts) VALUES (?, ?, ?, ?, ?)',
+                [(f"SYM{i % symbols}", 100 + i % 997, 0.5, 1e6, start_ts + timedelta(seconds=i * 30))
+                 for i in range(ticks)]
+            )
+
+        store = ColumnarStore(columnar_dir)
+        exporter = ColumnarExporter(db, store, tables=['market_ticks'])
+        start = time.perf_counter()
+        exporter.export('market_ticks')
+        report('export (from watermark 0)', ticks, time.perf_counter() - start, 'rows')
+        with conn:
+            conn.executemany(
+                'INSERT INTO market_ticks (symbol, price, change_24h, volume_24h, ts) VALUES (?, ?, ?, ?, ?)',
+                [('SYM0', 100, 0.5, 1e6, datetime.now())] * 1000
+            )
+        start = time.perf_counter()
+        exporter.export('market_ticks')
+        report('incremental export (1,000 new rows)', 1000, time.perf_counter() - start, 'rows')
+
+        def mean_price_rows():
+            totals, counts = {}, {}
+            for row in conn.execute('SELECT * FROM market_ticks').fetchall():
+                totals[row['symbol']] = totals.get(row['symbol'], 0) + row['price']
+                counts[row['symbol']] = counts.get(row['symbol'], 0) + 1
+            return {symbol: totals[symbol] / counts[symbol] for symbol in totals}
+
+        def mean_price_columns():
+            columns = store.load('market_ticks', ['symbol', 'price'])
+            sums = np.bincount(columns['symbol'], weights=columns['price'])
+            means = sums / np.bincount(columns['symbol'])
+            return dict(zip(store.dictionary('market_ticks', 'symbol'), means))
+
+        results = []
+        for label, func in (('SELECT * + sqlite3.Row', mean_price_rows), ('memmap columns + NumPy', mean_price_columns)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            results.append(func())
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"  {'mean price per symbol, ' + label:<44} {elapsed * 1000:>11,.1f} ms, peak {peak / 1e6:,.1f} MB")
+        row_means, column_means = results
+        mismatched = sum(1 for symbol, mean in row_means.items() if abs(column_means.get(symbol, np.nan) - mean) > 1e-6)
+        print(f"  {'symbols whose means differ':<44} {mismatched:>14}")
+        print(f"  {'column files on disk':<44} {store.stats()['market_ticks']['bytes'] / 1e6:>11,.1f} MB")
+
+@benchmark
+def bench_unlock_checks(wallets: int = 2000, unlocks: int = 20, page: int = 50, pages: int = 2000):
+    """Feed page entitlements: check_unlock per item (previous behaviour) vs cached check_unlocks"""
+    import random
+
+    print(f"[Benchmark] Unlock checks ({wallets:,} wallets, {unlocks} unlocks each, {page} items per page)")
+    with temp_database() as db:
+        rng = random.Random(7)
+        addresses = [f"0x{i:040x}" for i in range(wallets)]
+        conn = db.get_connection()
+        with conn:
+            for n, wallet in enumerate(addresses):
+                conn.executemany(
+                    'INSERT INTO user_unlocks (user_wallet, item_type, item_id, tx_hash, amount_paid) '
+                    'VALUES (?, ?, ?, ?, 0.05)',
+                    [(wallet, 'deal', item_id, f"0x{n}-{item_id}") for item_id in range(unlocks)]
+                )
+                conn.execute("INSERT INTO token_gates (user_wallet, item_type, item_id) VALUES (?, 'news', 1)",
+                             (wallet,))
+        items = [('deal', item_id) for item_id in range(page)]
+
+        def per_item(i):
+            wallet = addresses[rng.randrange(wallets)]
+            for item_type, item_id in items:
+                db.check_unlock(wallet, item_type, item_id)
+
+        def batched(i):
+            db.check_unlocks(addresses[rng.randrange(wallets)], items)
+
+        report(f'check_unlock x{page} (paid unlocks only)', pages, timed(per_item, pages), 'pages')
+        db.unlock_cache.max_wallets = 0
+        report('check_unlocks (uncached, 3 sources)', pages, timed(batched, pages), 'pages')
+        db.unlock_cache.max_wallets = wallets
+        timed(batched, wallets * 4)  # warm
+        report('check_unlocks (cached)', pages, timed(batched, pages), 'pages')
+        print(f"  cache: {db.unlock_cache.stats()}")
+
+@benchmark
+def bench_loyalty(wallets: int = 1000, accruals: int = 20_000, threads: int = 8):
+    """Loyalty accrual: SELECT then UPDATE (previous behaviour) vs ledger UPSERT, single and batched"""
+    import threading
+
+    print(f"[Benchmark] Loyalty accrual ({accruals:,} accruals over {wallets:,} wallets, {threads} threads)")
+    with temp_database() as db:
+        addresses = [f"0x{i:040x}" for i in range(wallets)]
+        with db.get_connection() as conn:
+            conn.executemany('INSERT INTO loyalty_balances (user_wallet) VALUES (?)', [(a,) for a in addresses])
+
+        def read_modify_write(i):
+            # Each thread reads and writes on its own connection; yielding
+            # between the two stands in for the work done on the read value
+            # and lets other threads interleave, as in production
+            conn = db.get_connection()
+            wallet = addresses[i % wallets]
+            row = conn.execute('SELECT * FROM loyalty_balances WHERE user_wallet = ?', (wallet,)).fetchone()
+            time.sleep(0)
+            with conn:
+                conn.execute('UPDATE loyalty_balances SET balance = ?, total_earned = ? WHERE user_wallet = ?',
+                             (row['balance'] + 1, row['total_earned'] + 1, wallet))
+
+        def concurrently(func, label):
+            per_thread = accruals // threads
+            workers = [threading.Thread(target=timed, args=(lambda i, t=t: func(t * per_thread + i), per_thread))
+                       for t in range(threads)]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - start
+            total = db.get_connection().execute('SELECT COALESCE(SUM(total_earned), 0) FROM loyalty_balances').fetchone()[0]
+            report(label, per_thread * threads, elapsed, 'accruals')
+            print(f"  {'':<44} {per_thread * threads - total:>14,.0f} lost updates")
+            with db.get_connection() as conn:
+                conn.execute('UPDATE loyalty_balances SET balance = 0, total_earned = 0')
+
+        concurrently(read_modify_write, 'SELECT + UPDATE per accrual')
+        concurrently(lambda i: db.update_loyalty_balance(addresses[i % wallets], 1), 'update_loyalty_balance (ledger UPSERT)')
+
+        batch = [{'user_wallet': addresses[i % wallets], 'amount_earned': 1, 'ref': f"tx{i}"} for i in range(accruals)]
+        start = time.perf_counter()
+        db.accrue_loyalty_many(batch)
+        report('accrue_loyalty_many (one transaction)', accruals, time.perf_counter() - start, 'accruals')
+
+def main(names):
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"Unknown benchmark(s): {', '.join(unknown)}")
+        print(f"Available: {', '.join(BENCHMARKS)}")
+        sys.exit(1)
+
+    for name in names or BENCHMARKS:
+        BENCHMARKS[name]()
+        print()
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -6,9 +6,50 @@ load_dotenv()
 # Database
 DATABASE_PATH = os.getenv('DATABASE_PATH', './data/financial_data.db')
 
+# SQLite tuning profile, applied to every pooled connection
+SQLITE_PRAGMAS = {
+    # Must precede journal_mode, which creates the file; applies to new databases
+    # only (retention converts older ones with a one-time VACUUM)
+    'auto_vacuum': 'INCREMENTAL',
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # safe with WAL; fsync only at checkpoints
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': -64_000,  # negative = KiB, so ~64MB page cache
+    'busy_timeout': 5000,  # ms
+    'temp_store': 'MEMORY',
+}
+SQLITE_CACHED_STATEMENTS = 256  # prepared statements kept per connection
+CHANGE_LOG_MAX_ROWS = 100_000  # newest change_log entries kept when pruning at startup
+UNLOCK_CACHE_WALLETS = 10_000  # wallets whose entitlements are cached in process
+UNLOCK_CACHE_TTL = 60  # seconds; bounds staleness for unlocks written by the web app
+LOYALTY_FREE_UNLOCK_MIN_BALANCE = 100  # tokens needed to use a free unlock
+LOYALTY_FREE_UNLOCK_COOLDOWN_HOURS = 24
+
 # Blockchain
 ALCHEMY_BASE_URL = os.getenv('ALCHEMY_BASE_URL', '')
+ALCHEMY_BASE_WS_URL = os.getenv('ALCHEMY_BASE_WS_URL', '')  # enables newHeads streaming
+BLOCKCHAIN_WS_STALE_AFTER = 30  # seconds without a head before polling takes over
+BLOCKCHAIN_WS_MAX_BACKOFF = 60  # max seconds between reconnect attempts
 USDC_BASE_ADDRESS = '0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913'
+BLOCKCHAIN_RPC_BATCH_SIZE = 20  # JSON-RPC calls per HTTP request
+BLOCKCHAIN_RPC_CONCURRENCY = 4  # batch requests in flight at once
+BLOCKCHAIN_RPC_MISSING_RETRIES = 2  # re-requests of blocks a lagging node returned as null
+BLOCKCHAIN_RPC_MISSING_RETRY_DELAY = 0.5  # seconds before each re-request
+BLOCKCHAIN_SCAN_CHUNK = 100  # blocks per checkpoint
+BLOCKCHAIN_MAX_CATCHUP_BLOCKS = 5000  # beyond this, skip ahead and leave the gap to backfill
+BLOCKCHAIN_GAP_BACKFILL_BLOCKS = 1000  # skipped blocks backfilled per blockchain tick
+
+# HTTP
+HTTP_TIMEOUT = 30  # seconds
+HTTP_POOL_SIZE = 32  # keep-alive connections per host in the shared session
+FEED_FETCH_CONCURRENCY = 16  # feeds fetched at once
+
+# Per-host token buckets: host -> (requests per second, burst)
+# SEC fair access allows at most 10 requests per second across all of sec.gov
+HOST_RATE_LIMITS = {
+    'www.sec.gov': (10, 10),
+}
+DEFAULT_HOST_RATE_LIMIT = (2, 4)
 
 # API Keys
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
@@ -16,6 +57,14 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
 # SEC Configuration
 SEC_USER_AGENT = os.getenv('SEC_USER_AGENT', 'MicroTerm admin@microterm.io')
 SEC_FORM_D_RSS = 'https://www.sec.gov/cgi-bin/browse-edgar?action=getcurrent&type=D&company=&dateb=&owner=exclude&start=0&count=100&output=atom'
+SEC_FETCH_CONCURRENCY = 8  # primary_doc.xml downloads in flight (still capped by HOST_RATE_LIMITS)
+SEC_ARCHIVES_URL = 'https://www.sec.gov/Archives/edgar'
+SEC_BACKFILL_FORM_TYPES = ('D', 'D/A')
+SEC_BACKFILL_BATCH = 200  # index rows per fetch/insert/checkpoint
+
+# EDGAR documents never change once filed; keep them on disk across runs and backfills
+DOC_CACHE_DIR = os.getenv('DOC_CACHE_DIR', './data/edgar_cache')
+DOC_CACHE_MAX_BYTES = int(os.getenv('DOC_CACHE_MAX_BYTES', 512 * 1024 * 1024))
 
 # News Sources
 NEWS_SOURCES = [
@@ -23,13 +72,57 @@ NEWS_SOURCES = [
     'https://cointelegraph.com/rss',
 ]
 
+# Sentiment: optional term,weight CSV merged over the built-in lexicon
+SENTIMENT_LEXICON_PATH = os.getenv('SENTIMENT_LEXICON_PATH', '')
+SENTIMENT_THRESHOLD = 0.05  # |score| below this is Neutral
+
+# Market: Yahoo Finance symbols, all fetched in one batched download per run
+MARKET_TICKERS = [
+    ticker.strip() for ticker in
+    os.getenv('MARKET_TICKERS', 'BTC-USD,ETH-USD,SOL-USD,NVDA,COIN').split(',')
+    if ticker.strip()
+]
+MARKET_HISTORY_PERIOD = '5d'  # daily bars per download; enough to span weekends and holidays
+
 # Whale Alert Thresholds
 WHALE_THRESHOLD_USDC = 1_000_000  # $1M
 WHALE_THRESHOLD_ETH = 100  # 100 ETH
 
+# ERC-20 tokens watched for large Transfer events (threshold in whole tokens)
+WATCHED_TOKENS = {
+    USDC_BASE_ADDRESS: {'symbol': 'USDC', 'decimals': 6, 'threshold': WHALE_THRESHOLD_USDC},
+}
+
+# 'logs': eth_getLogs Transfer events for WATCHED_TOKENS only (least data)
+# 'blocks': full transaction bodies for native ETH transfers
+# 'all': both
+BLOCKCHAIN_SCAN_MODE = os.getenv('BLOCKCHAIN_SCAN_MODE', 'all')
+
+# Retention: rows older than the hot window are moved to gzip NDJSON archives
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', './data/archive')
+RETENTION_BATCH = 5000  # rows archived and deleted per transaction
+RETENTION_POLICIES = [
+    # (table, timestamp column, days kept in the hot database, extra filter)
+    ('whale_alerts', 'timestamp', 90, None),
+    ('news', 'published_at', 90, None),
+    ('agent_actions', 'executed_at', 180, None),
+    ('market_ticks', 'ts', 7, None),
+    ('market_bars', 'bucket_start', 7, "interval = '1m'"),
+    ('market_bars', 'bucket_start', 60, "interval = '5m'"),
+]
+
+# Columnar export: NumPy column files of tick and whale-alert history for analysis
+COLUMNAR_DIR = os.getenv('COLUMNAR_DIR', './data/columnar')
+COLUMNAR_BATCH = 100_000  # rows per append
+
 # Worker Intervals (seconds)
 SEC_WORKER_INTERVAL = 600  # 10 minutes
 BLOCKCHAIN_WORKER_INTERVAL = 30  # 30 seconds
 NEWS_WORKER_INTERVAL = 300  # 5 minutes
 MARKET_WORKER_INTERVAL = 60  # 1 minute
+RETENTION_INTERVAL = 3600  # 1 hour
+COLUMNAR_EXPORT_INTERVAL = 300  # 5 minutes
+
+# Max random delay before each worker's first run, so they don't all start at once
+WORKER_STARTUP_JITTER = 5
 
@@ -0,0 +1,181 @@
+"""
+In-process address label index and bulk label importer
+
+Usage:
+    python database/address_labels.py labels.csv [more.ndjson ...]
+
+CSV files need address and label columns (category optional); NDJSON files
+hold one {"address": ..., "label": ..., "category": ...} object per line.
+"""
+
+import csv
+import json
+import re
+import sys
+import os
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.models import Database
+
+ADDRESS_RE = re.compile(r'^0x[0-9a-f]{40}$')
+KEY_SIZE = 20
+BUCKETS = 1 << 16  # keys are bucketed by their first two bytes
+
+class AddressLabelIndex:
+    """Read-mostly index from 20-byte address to label.
+
+    The bulk of the labels lives in one sorted bytes blob of 20-byte keys with a
+    parallel array of label ids, so millions of addresses cost ~24 bytes each
+    instead of a Python dict entry. A directory of offsets by two-byte prefix
+    narrows each lookup to a handful of keys, and an empty bucket answers
+    "unknown" (the common case) without any search. Rows added after warm()
+    are picked up by refresh() into a small overlay dict, which is folded back
+    into the sorted blob once it grows past merge_threshold.
+    """
+
+    def __init__(self, db: Database, merge_threshold: int = 10_000):
+        self.db = db
+        self.merge_threshold = merge_threshold
+        self._keys = b''
+        self._label_ids = array('I')
+        self._offsets = array('I', bytes(4 * (BUCKETS + 1)))
+        self._labels: List[str] = []
+        self._label_lookup: Dict[str, int] = {}
+        self._overlay: Dict[bytes, str] = {}
+        self._last_rowid = 0
+
+    def _intern(self, label: str) -> int:
+        label_id = self._label_lookup.get(label)
+        if label_id is None:
+            label_id = len(self._labels)
+            self._labels.append(label)
+            self._label_lookup[label] = label_id
+        return label_id
+
+    def warm(self):
+        """Load every label from known_addresses into the sorted blob"""
+        conn = self.db.get_connection()
+        keys = bytearray()
+        label_ids = array('I')
+        self._labels, self._label_lookup = [], {}
+
+        # address is the primary key and always lowercase 0x + 40 hex chars,
+        # so primary key order is already byte order of the decoded keys
+        cursor = conn.execute('SELECT address, label FROM known_addresses ORDER BY address')
+        while True:
+            rows = cursor.fetchmany(50_000)
+            if not rows:
+                break
+            for address, label in rows:
+                if not ADDRESS_RE.match(address):
+                    continue
+                keys += bytes.fromhex(address[2:])
+                label_ids.append(self._intern(label))
+
+        # offsets[b]..offsets[b + 1] is the slice of keys starting with prefix b
+        offsets = array('I', bytes(4 * (BUCKETS + 1)))
+        for position in range(0, len(keys), KEY_SIZE):
+            offsets[(keys[position] << 8 | keys[position + 1]) + 1] += 1
+        for bucket in range(BUCKETS):
+            offsets[bucket + 1] += offsets[bucket]
+
+        self._keys = bytes(keys)
+        self._label_ids = label_ids
+        self._offsets = offsets
+        self._overlay = {}
+        self._last_rowid = conn.execute('SELECT COALESCE(MAX(rowid), 0) FROM known_addresses').fetchone()[0]
+
+    def refresh(self):
+        """Pick up labels inserted or replaced since the last warm/refresh"""
+        cursor = self.db.get_connection().execute(
+            'SELECT rowid, address, label FROM known_addresses WHERE rowid > ? ORDER BY rowid',
+            (self._last_rowid,)
+        )
+        for rowid, address, label in cursor.fetchall():
+            self._last_rowid = rowid
+            if ADDRESS_RE.match(address):
+                self._overlay[bytes.fromhex(address[2:])] = label
+
+        if len(self._overlay) > self.merge_threshold:
+            self.warm()
+
+    def _search(self, key: bytes) -> Optional[int]:
+        bucket = key[0] << 8 | key[1]
+        lo, end = self._offsets[bucket], self._offsets[bucket + 1]
+        if lo == end:
+            return None
+
+        keys = self._keys
+        hi = end
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if keys[mid * KEY_SIZE:(mid + 1) * KEY_SIZE] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < end and keys[lo * KEY_SIZE:(lo + 1) * KEY_SIZE] == key:
+            return lo
+        return None
+
+    def get(self, address: str) -> Optional[str]:
+        """Get the label for an address, or None if unknown"""
+        if len(address) != 42 or address[:2] not in ('0x', '0X'):
+            return None
+        try:
+            key = bytes.fromhex(address[2:])
+        except ValueError:
+            return None
+
+        if self._overlay:
+            label = self._overlay.get(key)
+            if label is not None:
+                return label
+
+        position = self._search(key)
+        return self._labels[self._label_ids[position]] if position is not None else None
+
+    def get_many(self, addresses: List[str]) -> List[Optional[str]]:
+        """Label a batch of addresses, e.g. every sender and receiver in a block"""
+        return [self.get(address) for address in addresses]
+
+def read_label_file(path: str) -> Iterator[Tuple[str, str, str]]:
+    """Stream (address, label, category) rows from a CSV or NDJSON label file"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith(('.ndjson', '.jsonl')):
+            records = (json.loads(line) for line in f if line.strip())
+        else:
+            records = csv.DictReader(f)
+
+        for record in records:
+            address = (record.get('address') or '').strip().lower()
+            label = (record.get('label') or '').strip()
+            if ADDRESS_RE.match(address) and label:
+                yield address, label, (record.get('category') or 'unknown').strip()
+
+def import_label_file(db: Database, path: str, batch_size: int = 50_000) -> int:
+    """Bulk import a label file into known_addresses, one transaction per batch"""
+    imported = 0
+    batch = []
+    for row in read_label_file(path):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            imported += db.insert_known_addresses_many(batch)
+            batch = []
+    if batch:
+        imported += db.insert_known_addresses_many(batch)
+    return imported
+
+def main(paths: List[str]):
+    if not paths:
+        print(__doc__)
+        sys.exit(1)
+
+    db = Database()
+    for path in paths:
+        count = import_label_file(db, path)
+        print(f"[Address Labels] Imported {count:,} labels from {path}")
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,248 @@
+"""
+Columnar export of tick and whale-flow history as memory-mappable NumPy column files
+"""
+
+import json
+import os
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from database.models import Database
+import config
+
+# table -> column -> encoding. 'dict' columns are stored as int32 codes into
+# a per-column dictionary; 'time' is datetime64[us]; 'S<n>' is fixed-width bytes.
+COLUMNAR_SCHEMAS: Dict[str, Dict[str, str]] = {
+    # market_data keeps only the latest snapshot; its history is market_ticks
+    'market_ticks': {
+        'id': 'int64',
+        'symbol': 'dict',
+        'price': 'float64',
+        'change_24h': 'float64',
+        'volume_24h': 'float64',
+        'ts': 'time',
+    },
+    'whale_alerts': {
+        'id': 'int64',
+        'tx_hash': 'S66',
+        'sender_address': 'dict',
+        'sender_label': 'dict',
+        'receiver_address': 'dict',
+        'receiver_label': 'dict',
+        'token_symbol': 'dict',
+        'amount': 'float64',
+        'is_tradeable': 'bool',
+        'timestamp': 'time',
+    },
+}
+
+def _dtype(encoding: str) -> np.dtype:
+    if encoding == 'dict':
+        return np.dtype('int32')
+    if encoding == 'time':
+        return np.dtype('datetime64[us]')
+    return np.dtype(encoding)
+
+def _parse_time(value: Any) -> str:
+    # SQLite holds Python's str(datetime); numpy parses it once any UTC offset is cut
+    text = str(value or 'NaT')
+    return text[:26] if text[19:20] == '.' else text[:19]
+
+class ColumnarStore:
+    """One directory per table holding a raw column file per column plus meta.json.
+
+    Column files are plain little-endian arrays, so a year of history loads
+    with np.memmap and no parsing or copying. String dictionaries live in
+    append-only <column>.dict files, one JSON string per line, so an append
+    writes only the values it adds. meta.json records the row count, each
+    dictionary's length and size, and the export watermark; it is replaced
+    atomically after the data is fsynced, so readers only ever see whole
+    batches. Bytes past the recorded sizes (left by a crashed append) are
+    ignored by readers and truncated by the next append.
+    """
+
+    def __init__(self, root: str = config.COLUMNAR_DIR):
+        self.root = root
+        # (table, column) -> (values, bytes, value list, value -> code), so
+        # appends don't re-read a dictionary they already hold
+        self._dictionaries: Dict[tuple, tuple] = {}
+
+    def _meta_path(self, table: str) -> str:
+        return os.path.join(self.root, table, 'meta.json')
+
+    def _column_path(self, table: str, column: str) -> str:
+        return os.path.join(self.root, table, f"{column}.bin")
+
+    def _dictionary_path(self, table: str, column: str) -> str:
+        return os.path.join(self.root, table, f"{column}.dict")
+
+    def _read_dictionary(self, table: str, column: str, meta: Dict[str, Any]) -> List[str]:
+        entry = meta['dictionaries'].get(column)
+        if entry is None:
+            return []
+        if isinstance(entry, list):  # stores written before dictionaries had their own files
+            return entry
+        with open(self._dictionary_path(table, column), 'rb') as f:
+            data = f.read(entry['bytes'])
+        return [json.loads(line) for line in data.splitlines()]
+
+    def _append_dictionary(self, table: str, column: str, meta: Dict[str, Any],
+                           values: Sequence[Any]) -> List[int]:
+        """Codes for values, appending unseen values to the column's dictionary file"""
+        entry = meta['dictionaries'].get(column)
+        legacy = isinstance(entry, list)
+        size = (0, 0) if legacy or entry is None else (entry['values'], entry['bytes'])
+        cached = self._dictionaries.pop((table, column), None)  # put back only once persisted
+        if cached and not legacy and cached[:2] == size:
+            dictionary, index = cached[2], cached[3]
+        else:
+            dictionary = self._read_dictionary(table, column, meta)
+            index = {value: code for code, value in enumerate(dictionary)}
+        added = dictionary[size[0]:] if legacy else []  # rewritten into the file once
+        codes = []
+        for value in values:
+            value = '' if value is None else str(value)
+            code = index.get(value)
+            if code is None:
+                code = index[value] = len(dictionary)
+                dictionary.append(value)
+                added.append(value)
+            codes.append(code)
+
+        length = size[1]
+        if added or entry is None or legacy:
+            data = ''.join(json.dumps(value) + '\n' for value in added).encode()
+            with open(self._dictionary_path(table, column), 'ab') as f:
+                f.truncate(length)  # drop a crashed append's tail
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            length += len(data)
+        meta['dictionaries'][column] = {'values': len(dictionary), 'bytes': length}
+        self._dictionaries[(table, column)] = (len(dictionary), length, dictionary, index)
+        return codes
+
+    def meta(self, table: str) -> Dict[str, Any]:
+        """Row count, dictionary sizes and watermark for a table; empty before the first export"""
+        try:
+            with open(self._meta_path(table)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'rows': 0, 'watermark': 0, 'dictionaries': {}}
+
+    def append(self, table: str, rows: List[Sequence[Any]], watermark: int):
+        """Append rows (tuples in COLUMNAR_SCHEMAS column order) and advance the watermark"""
+        schema = COLUMNAR_SCHEMAS[table]
+        meta = self.meta(table)
+        os.makedirs(os.path.join(self.root, table), exist_ok=True)
+
+        for (column, encoding), values in zip(schema.items(), zip(*rows)):
+            if encoding == 'dict':
+                array = np.array(self._append_dictionary(table, column, meta, values), dtype='int32')
+            elif encoding == 'time':
+                array = np.array([_parse_time(value) for value in values], dtype='datetime64[us]')
+            elif encoding.startswith('S'):
+                array = np.array([(value or '').encode() for value in values], dtype=encoding)
+            elif encoding == 'float64':
+                array = np.array(values, dtype=float)  # None becomes NaN
+            else:
+                array = np.array([value or 0 for value in values], dtype=encoding)
+
+            with open(self._column_path(table, column), 'ab') as f:
+                f.truncate(meta['rows'] * array.itemsize)  # drop a crashed append's tail
+                f.write(array.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+        meta['rows'] += len(rows)
+        meta['watermark'] = watermark
+        meta['columns'] = {column: str(_dtype(encoding)) for column, encoding in schema.items()}
+        meta['updated_at'] = datetime.now().isoformat()
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, table), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path(table))
+
+    def load(self, table: str, columns: Sequence[str] = None) -> Dict[str, np.ndarray]:
+        """Memory-mapped, read-only arrays for a table's columns.
+
+        Dictionary-encoded columns come back as int32 codes; see dictionary()
+        and decode().
+        """
+        schema = COLUMNAR_SCHEMAS[table]
+        rows = self.meta(table)['rows']
+        arrays = {}
+        for column in columns or schema:
+            dtype = _dtype(schema[column])
+            if rows == 0:
+                arrays[column] = np.empty(0, dtype=dtype)
+            else:
+                arrays[column] = np.memmap(self._column_path(table, column), dtype=dtype, mode='r', shape=(rows,))
+        return arrays
+
+    def dictionary(self, table: str, column: str) -> np.ndarray:
+        """Values of a dictionary-encoded column, indexed by code"""
+        return np.array(self._read_dictionary(table, column, self.meta(table)), dtype=object)
+
+    def decode(self, table: str, column: str, codes: Optional[np.ndarray] = None) -> np.ndarray:
+        """Strings of a dictionary-encoded column (or of the given codes from it)"""
+        if codes is None:
+            codes = self.load(table, [column])[column]
+        return self.dictionary(table, column)[codes]
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Rows, watermark and bytes on disk per exported table"""
+        stats = {}
+        for table, schema in COLUMNAR_SCHEMAS.items():
+            meta = self.meta(table)
+            paths = [self._column_path(table, column) for column in schema]
+            paths += [self._dictionary_path(table, column) for column in meta['dictionaries']]
+            size = sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+            stats[table] = {'rows': meta['rows'], 'watermark': meta['watermark'], 'bytes': size}
+        return stats
+
+class ColumnarExporter:
+    """Appends rows added since the last export, in id order, to the columnar store"""
+
+    def __init__(self, db: Database = None, store: ColumnarStore = None,
+                 tables: Sequence[str] = None, batch_size: int = config.COLUMNAR_BATCH):
+        self.db = db or Database()
+        self.store = store or ColumnarStore()
+        self.tables = list(tables or COLUMNAR_SCHEMAS)
+        self.batch_size = batch_size
+
+    def export(self, table: str) -> int:
+        """Export one table from its watermark; returns rows appended"""
+        columns = ', '.join(COLUMNAR_SCHEMAS[table])
+        conn = self.db.get_connection()
+        exported = 0
+        while True:
+            watermark = self.store.meta(table)['watermark']
+            cursor = conn.execute(
+                f"SELECT {columns} FROM {table} WHERE id > ? ORDER BY id LIMIT ?", (watermark, self.batch_size)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                return exported
+            self.store.append(table, rows, rows[-1]['id'])
+            exported += len(rows)
+
+    def run(self) -> Dict[str, int]:
+        """Export every table; returns rows appended per table"""
+        exported = {table: self.export(table) for table in self.tables}
+        print(f"[Columnar] Exported {exported}")
+        return exported
+
+def run_once():
+    """Export new rows once"""
+    exporter = ColumnarExporter()
+    exporter.run()
+    print(f"[Columnar] {exporter.store.stats()}")
+
+if __name__ == '__main__':
+    run_once()
@@ -1,18 +1,259 @@
+import base64
+import json
+import re
 import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Iterable, Set, FrozenSet
 import config
 
+# OHLCV rollup intervals maintained for every market tick
+BAR_INTERVALS = ('1m', '5m', '1h', '1d')
+
+# Feed tables whose inserts, updates and deletes are recorded in change_log
+CHANGE_LOG_TABLES = ('private_deals', 'whale_alerts', 'news')
+
+# Full-text search: kind -> (table, indexed columns, BM25 weight per column)
+SEARCH_INDEXES = {
+    'news': ('news', ('title', 'summary'), (10.0, 1.0)),
+    'deals': ('private_deals', ('company_name', 'sector'), (5.0, 1.0)),
+    'alerts': ('whale_alerts', ('sender_label', 'receiver_label'), (1.0, 1.0)),
+}
+SNIPPET_TOKENS = 12  # tokens of context per snippet
+
+def fts_query(text: str, prefix: bool = False) -> str:
+    """FTS5 MATCH expression for plain user text, with every word required.
+
+    Words are quoted, so FTS5 operators and punctuation in the input are
+    never interpreted as query syntax. With prefix, the last word also
+    matches longer words, as for search-as-you-type.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return ''
+    return ' '.join(f'"{word}"' for word in words) + ('*' if prefix else '')
+
+def encode_cursor(ts: Any, row_id: int) -> str:
+    """Opaque page cursor for the (timestamp, id) of the last row on a page"""
+    return base64.urlsafe_b64encode(json.dumps([str(ts), row_id]).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """(timestamp, id) from a cursor made by encode_cursor; ValueError if malformed"""
+    try:
+        ts, row_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return str(ts), int(row_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"invalid page cursor {cursor!r}") from e
+
+def bucket_start(ts: datetime, interval: str) -> datetime:
+    """Floor a timestamp to the start of its bar for the given interval"""
+    ts = ts.replace(second=0, microsecond=0)
+    if interval == '1m':
+        return ts
+    if interval == '5m':
+        return ts.replace(minute=ts.minute - ts.minute % 5)
+    if interval == '1h':
+        return ts.replace(minute=0)
+    if interval == '1d':
+        return ts.replace(hour=0, minute=0)
+    raise ValueError(f"Unknown bar interval {interval!r}")
+
+class EntitlementCache:
+    """Per-wallet LRU of the (item_type, item_id) pairs a wallet has unlocked.
+    
+    Holds at most max_wallets wallets and evicts the least recently used.
+    The record_* methods invalidate a wallet when they add an entitlement;
+    entries also expire after ttl seconds, since the web app records paid
+    unlocks in its own process. A load that races an invalidation is not
+    cached, so a stale set can never outlive the write that changed it.
+    """
+
+    def __init__(self, max_wallets: int, ttl: float):
+        self.max_wallets = max_wallets
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, Tuple[float, FrozenSet[Tuple[str, int]]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = 0  # bumped by every invalidation
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, wallet: str) -> Optional[FrozenSet[Tuple[str, int]]]:
+        """Cached entitlements for a wallet, or None when absent or expired"""
+        with self._lock:
+            entry = self._entries.get(wallet)
+            if entry is None or entry[0] <= time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(wallet)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, wallet: str, unlocked: FrozenSet[Tuple[str, int]], generation: int):
+        """Cache a wallet's entitlements, loaded when the cache was at generation"""
+        with self._lock:
+            if generation != self.generation:
+                return  # invalidated while loading
+            self._entries[wallet] = (time.monotonic() + self.ttl, unlocked)
+            self._entries.move_to_end(wallet)
+            while len(self._entries) > self.max_wallets:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, wallet: str):
+        """Drop a wallet so its next check reloads from the database"""
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(wallet, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'wallets': len(self._entries), 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions}
+
+class _ThreadToken:
+    """Stored in a thread's threading.local; collected when the thread exits"""
+
 class Database:
     def __init__(self, db_path: str = config.DATABASE_PATH):
         self.db_path = db_path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self.unlock_cache = EntitlementCache(config.UNLOCK_CACHE_WALLETS, config.UNLOCK_CACHE_TTL)
         self.init_database()
     
-    def get_connection(self):
-        conn = sqlite3.connect(self.db_path)
+    def connect(self) -> sqlite3.Connection:
+        """Open a new connection with the SQLite tuning profile applied"""
+        # Connections are only ever used by the thread that created them;
+        # check_same_thread is off so close() can tear them down from any thread.
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=config.SQLITE_PRAGMAS['busy_timeout'] / 1000,
+            cached_statements=config.SQLITE_CACHED_STATEMENTS,
+            check_same_thread=False,
+        )
         conn.row_factory = sqlite3.Row
+        for pragma, value in config.SQLITE_PRAGMAS.items():
+            conn.execute(f'PRAGMA {pragma} = {value}')
+        return conn
+    
+    def get_connection(self) -> sqlite3.Connection:
+        """Get the calling thread's long-lived connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self.connect()
+            self._local.conn = conn
+            # threading.local drops a thread's attributes when the thread exits,
+            # so short-lived worker threads do not leave open connections behind
+            self._local.token = _ThreadToken()
+            weakref.finalize(self._local.token, self._release, conn)
+            with self._connections_lock:
+                self._connections.append(conn)
         return conn
     
+    def _release(self, conn: sqlite3.Connection):
+        with self._connections_lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+    
+    def close(self):
+        """Close every pooled connection opened by this handle"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+    
+    def _insert_many(self, table: str, columns: Dict[str, Any], key: str,
+                     rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+        """Insert rows in a single transaction, skipping rows whose key already exists.
+        
+        columns maps column name to the default used when a row omits it.
+        Returns the keys that were inserted and the keys that were duplicates.
+        """
+        result = {'inserted': [], 'duplicates': []}
+        if not rows:
+            return result
+        
+        names = ', '.join(columns)
+        placeholders = ', '.join('?' for _ in columns)
+        conn = self.get_connection()
+        with conn:
+            # Take the write lock up front so the duplicate check and the insert
+            # see the same snapshot of the table
+            conn.execute('BEGIN IMMEDIATE')
+            
+            existing = set()
+            keys = list({row[key] for row in rows if row.get(key) is not None})
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                cursor = conn.execute(
+                    f"SELECT {key} FROM {table} WHERE {key} IN ({', '.join('?' for _ in chunk)})",
+                    chunk
+                )
+                existing.update(row[0] for row in cursor.fetchall())
+            
+            fresh = []
+            for row in rows:
+                row_key = row.get(key)
+                if row_key is not None and row_key in existing:
+                    result['duplicates'].append(row_key)
+                    continue
+                if row_key is not None:
+                    existing.add(row_key)
+                fresh.append(tuple(row.get(column, default) for column, default in columns.items()))
+                result['inserted'].append(row_key)
+            
+            conn.executemany(
+                f"INSERT INTO {table} ({names}) VALUES ({placeholders}) ON CONFLICT({key}) DO NOTHING",
+                fresh
+            )
+        return result
+    
+    def _page(self, table: str, ts_column: str, conditions: List[Tuple[str, Any]],
+              cursor: Optional[str], limit: int,
+              any_of: List[Tuple[str, Any]] = None) -> Dict[str, Any]:
+        """One page of rows newest first, keyed on (ts_column, id).
+        
+        conditions are (SQL, parameter) pairs ANDed together; any_of pairs are
+        ORed by running one branch per pair and merging them, so each branch
+        is its own index range scan. Rows after the cursor are found with a
+        row-value comparison, so page N costs the same as page 1. Rows without
+        a timestamp are never paged. One row past limit is fetched to tell
+        whether another page follows.
+        """
+        where = [f"{ts_column} IS NOT NULL"]
+        params: List[Any] = []
+        for sql, value in conditions:
+            where.append(sql)
+            params.append(value)
+        if cursor:
+            where.append(f"({ts_column}, id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+        
+        order = f"ORDER BY {ts_column} DESC, id DESC LIMIT ?"
+        if any_of:
+            branches, branch_params = [], []
+            for sql, value in any_of:
+                branches.append(f"SELECT * FROM (SELECT * FROM {table} WHERE {' AND '.join(where + [sql])} {order})")
+                branch_params.extend(params + [value, limit + 1])
+            query = ' UNION '.join(branches) + f" {order}"
+            params = branch_params
+        else:
+            query = f"SELECT * FROM {table} WHERE {' AND '.join(where)} {order}"
+        
+        rows = [dict(row) for row in self.get_connection().execute(query, params + [limit + 1]).fetchall()]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][ts_column], rows[-1]['id'])
+        return {'items': rows, 'next_cursor': next_cursor}
+    
     def init_database(self):
         """Initialize database with schema"""
         conn = self.get_connection()
@@ -24,6 +265,8 @@ class Database:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 company_name TEXT NOT NULL,
                 amount_raised REAL,
+                offering_amount REAL,
+                form_type TEXT,
                 filing_url TEXT,
                 sector TEXT,
                 filed_at DATETIME,
@@ -60,6 +303,7 @@ class Database:
                 title TEXT NOT NULL,
                 summary TEXT,
                 sentiment TEXT,
+                sentiment_score REAL,
                 source TEXT,
                 url TEXT UNIQUE,
                 published_at DATETIME,
@@ -68,6 +312,18 @@ class Database:
             )
         ''')
         
+        # Older databases had no Form D offering details
+        deal_columns = {row[1] for row in cursor.execute('PRAGMA table_info(private_deals)')}
+        if 'offering_amount' not in deal_columns:
+            cursor.execute('ALTER TABLE private_deals ADD COLUMN offering_amount REAL')
+        if 'form_type' not in deal_columns:
+            cursor.execute('ALTER TABLE private_deals ADD COLUMN form_type TEXT')
+        
+        # Older databases stored only the sentiment label
+        news_columns = {row[1] for row in cursor.execute('PRAGMA table_info(news)')}
+        if 'sentiment_score' not in news_columns:
+            cursor.execute('ALTER TABLE news ADD COLUMN sentiment_score REAL')
+        
         # User Unlocks Table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS user_unlocks (
@@ -91,7 +347,7 @@ class Database:
             )
         ''')
         
-        # Market Data Table
+        # Market Data Table (latest snapshot, one row per symbol)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS market_data (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -103,6 +359,46 @@ class Database:
             )
         ''')
         
+        # Older databases appended a row per tick; keep only the newest per symbol
+        # before enforcing one snapshot row per symbol
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_market_data_symbol'"
+        )
+        if cursor.fetchone() is None:
+            cursor.execute('''
+                DELETE FROM market_data
+                WHERE id NOT IN (SELECT MAX(id) FROM market_data GROUP BY symbol)
+            ''')
+            cursor.execute('CREATE UNIQUE INDEX idx_market_data_symbol ON market_data(symbol)')
+        
+        # Market Ticks Table (append-only price history)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS market_ticks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                symbol TEXT NOT NULL,
+                price REAL,
+                change_24h REAL,
+                volume_24h REAL,
+                ts DATETIME NOT NULL
+            )
+        ''')
+        
+        # Market Bars Table (OHLCV rollups maintained on every tick)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS market_bars (
+                symbol TEXT NOT NULL,
+                interval TEXT NOT NULL,
+                bucket_start DATETIME NOT NULL,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL,
+                volume REAL,
+                tick_count INTEGER DEFAULT 0,
+                PRIMARY KEY (symbol, interval, bucket_start)
+            ) WITHOUT ROWID
+        ''')
+        
         # NFT Receipts Table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS nft_receipts (
@@ -130,6 +426,41 @@ class Database:
             )
         ''')
         
+        # Loyalty Ledger Table (append-only; loyalty_balances is its running total)
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'loyalty_ledger'")
+        ledger_exists = cursor.fetchone() is not None
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS loyalty_ledger (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_wallet TEXT NOT NULL,
+                amount_earned REAL NOT NULL DEFAULT 0,
+                amount_spent REAL NOT NULL DEFAULT 0,
+                reason TEXT,
+                ref TEXT UNIQUE,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        if not ledger_exists:
+            # Open the ledger with the balances accrued before it existed
+            cursor.execute('''
+                INSERT INTO loyalty_ledger (user_wallet, amount_earned, amount_spent, reason, created_at)
+                SELECT user_wallet, total_earned, total_spent, 'opening', updated_at FROM loyalty_balances
+            ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_loyalty_ledger_accrue
+            AFTER INSERT ON loyalty_ledger
+            BEGIN
+                INSERT INTO loyalty_balances (user_wallet, balance, total_earned, total_spent, updated_at)
+                VALUES (NEW.user_wallet, NEW.amount_earned - NEW.amount_spent,
+                        NEW.amount_earned, NEW.amount_spent, NEW.created_at)
+                ON CONFLICT(user_wallet) DO UPDATE SET
+                    balance = balance + excluded.balance,
+                    total_earned = total_earned + excluded.total_earned,
+                    total_spent = total_spent + excluded.total_spent,
+                    updated_at = excluded.updated_at;
+            END
+        ''')
+        
         # Token Gates Table (track free unlocks)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS token_gates (
@@ -170,17 +501,138 @@ class Database:
             )
         ''')
         
+        # Feed State Table (conditional GET validators and fetch counters per feed)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS feed_state (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                fingerprint TEXT,
+                body_size INTEGER,
+                not_modified INTEGER DEFAULT 0,
+                unchanged INTEGER DEFAULT 0,
+                parsed INTEGER DEFAULT 0,
+                bytes_downloaded INTEGER DEFAULT 0,
+                bytes_saved INTEGER DEFAULT 0,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Worker State Table (cursors and checkpoints that survive restarts)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS worker_state (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Change Log Table (one row per insert/update/delete on the feed tables,
+        # written by triggers so every writer is captured)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS change_log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                row_id INTEGER NOT NULL,
+                op TEXT NOT NULL,
+                changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        for table in CHANGE_LOG_TABLES:
+            for op, ref in (('insert', 'NEW'), ('update', 'NEW'), ('delete', 'OLD')):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_{op}_log AFTER {op.upper()} ON {table}
+                    BEGIN
+                        INSERT INTO change_log (table_name, row_id, op) VALUES ('{table}', {ref}.id, '{op}');
+                    END
+                ''')
+        
+        # Full-Text Search Tables (external content: the FTS tables hold only the
+        # index, and triggers keep it in step with every write to the source)
+        self.search_enabled = True
+        for table, columns, weights in SEARCH_INDEXES.values():
+            fts = f"{table}_fts"
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (fts,))
+            exists = cursor.fetchone() is not None
+            try:
+                cursor.execute(f'''
+                    CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                        {', '.join(columns)}, content='{table}', content_rowid='id',
+                        tokenize='porter unicode61 remove_diacritics 2'
+                    )
+                ''')
+            except sqlite3.OperationalError:
+                self.search_enabled = False  # SQLite built without FTS5
+                break
+            names = ', '.join(columns)
+            new = ', '.join(f'NEW.{column}' for column in columns)
+            old = ', '.join(f'OLD.{column}' for column in columns)
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_insert AFTER INSERT ON {table} BEGIN
+                    INSERT INTO {fts} (rowid, {names}) VALUES (NEW.id, {new});
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_delete AFTER DELETE ON {table} BEGIN
+                    INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', OLD.id, {old});
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_update AFTER UPDATE OF {names} ON {table} BEGIN
+                    INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', OLD.id, {old});
+                    INSERT INTO {fts} (rowid, {names}) VALUES (NEW.id, {new});
+                END
+            ''')
+            # Writing FTS5 config invalidates the copy cached by every other open
+            # connection (their next query fails), so write it only when it changes
+            rank = f"bm25({', '.join(map(str, weights))})"
+            cursor.execute(f"SELECT v FROM {fts}_config WHERE k = 'rank'")
+            stored = cursor.fetchone()
+            if stored is None or stored[0] != rank:
+                cursor.execute(f"INSERT INTO {fts} ({fts}, rank) VALUES ('rank', ?)", (rank,))
+            if not exists:
+                # Index rows written before search existed
+                cursor.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+        
+        # Older databases indexed the feed timestamps DESC, which leaves the
+        # implicit rowid suffix ascending; a backward scan of an ascending
+        # index gives (timestamp DESC, id DESC) without a sort
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = 'idx_news_published'")
+        existing = cursor.fetchone()
+        if existing and 'DESC' in existing[0]:
+            cursor.execute('DROP INDEX idx_news_published')
+        # Superseded by the (timestamp, id, amount) indexes below
+        cursor.execute('DROP INDEX IF EXISTS idx_deals_filed_at')
+        cursor.execute('DROP INDEX IF EXISTS idx_alerts_timestamp')
+        
         # Create indexes
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_deals_filed_at ON private_deals(filed_at DESC)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_timestamp ON whale_alerts(timestamp DESC)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_news_published ON news(published_at DESC)')
+        # Amount ranges can't seek and keep timestamp order in one index, so the
+        # amount rides along in the page-order index and is checked there
+        # before the row is read
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_deals_filed_at_amount ON private_deals(filed_at, id, amount_raised)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_time_amount ON whale_alerts(timestamp, id, amount)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_news_published ON news(published_at)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_unlocks_wallet ON user_unlocks(user_wallet)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_nft_receipts_wallet ON nft_receipts(user_wallet)')
+        # Entitlement lookups read (item_type, item_id) per wallet from the index alone
+        cursor.execute('DROP INDEX IF EXISTS idx_nft_receipts_wallet')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_nft_receipts_wallet_item ON nft_receipts(user_wallet, item_type, item_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_loyalty_ledger_wallet ON loyalty_ledger(user_wallet, id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_agent_actions_wallet ON agent_actions(user_wallet)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_agent_actions_time ON agent_actions(executed_at DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_market_ticks_symbol_ts ON market_ticks(symbol, ts)')
+        # Retention finds aged rows by timestamp alone
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_market_ticks_ts ON market_ticks(ts)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_market_bars_interval_start ON market_bars(interval, bucket_start)')
+        # Keyset pages per filter: equality column first, then the page order
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_deals_sector_filed_at ON private_deals(sector, filed_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_token_time ON whale_alerts(token_symbol, timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_sender_label_time ON whale_alerts(sender_label, timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_receiver_label_time ON whale_alerts(receiver_label, timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_news_sentiment_published ON news(sentiment, published_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_news_source_published ON news(source, published_at)')
         
         conn.commit()
-        conn.close()
+        self.prune_change_log()
     
     # Private Deals Methods
     def insert_deal(self, company_name: str, amount_raised: float, filing_url: str, 
@@ -188,30 +640,47 @@ class Database:
         """Insert a new private deal"""
         try:
             conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO private_deals (company_name, amount_raised, filing_url, sector, filed_at)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (company_name, amount_raised, filing_url, sector, filed_at))
-            conn.commit()
-            deal_id = cursor.lastrowid
-            conn.close()
-            return deal_id
+            with conn:
+                cursor = conn.execute('''
+                    INSERT INTO private_deals (company_name, amount_raised, filing_url, sector, filed_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (company_name, amount_raised, filing_url, sector, filed_at))
+            return cursor.lastrowid
         except sqlite3.IntegrityError:
             return None
     
+    def insert_deals_many(self, deals: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+        """Insert a batch of private deals in one transaction, keyed by filing_url"""
+        return self._insert_many('private_deals', {
+            'company_name': None,
+            'amount_raised': None,
+            'offering_amount': None,
+            'form_type': None,
+            'filing_url': None,
+            'sector': None,
+            'filed_at': None,
+        }, 'filing_url', deals)
+    
     def get_recent_deals(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Get recent deals"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
+        cursor = self.get_connection().execute('''
             SELECT * FROM private_deals 
             ORDER BY filed_at DESC 
             LIMIT ?
         ''', (limit,))
-        deals = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return deals
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def get_deals_page(self, cursor: str = None, limit: int = 50, sector: str = None,
+                       min_amount: float = None, max_amount: float = None) -> Dict[str, Any]:
+        """Deals newest first, filtered by sector and amount raised; pass next_cursor for the next page"""
+        conditions = []
+        if sector is not None:
+            conditions.append(('sector = ?', sector))
+        if min_amount is not None:
+            conditions.append(('amount_raised >= ?', min_amount))
+        if max_amount is not None:
+            conditions.append(('amount_raised <= ?', max_amount))
+        return self._page('private_deals', 'filed_at', conditions, cursor, limit)
     
     # Whale Alerts Methods
     def insert_whale_alert(self, tx_hash: str, sender_address: str, sender_label: str,
@@ -221,33 +690,55 @@ class Database:
         """Insert a new whale alert"""
         try:
             conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO whale_alerts 
-                (tx_hash, sender_address, sender_label, receiver_address, receiver_label, 
-                 token_symbol, token_address, amount, dex_pool, is_tradeable, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (tx_hash, sender_address, sender_label, receiver_address, receiver_label,
-                  token_symbol, token_address, amount, dex_pool, is_tradeable, timestamp))
-            conn.commit()
-            alert_id = cursor.lastrowid
-            conn.close()
-            return alert_id
+            with conn:
+                cursor = conn.execute('''
+                    INSERT INTO whale_alerts 
+                    (tx_hash, sender_address, sender_label, receiver_address, receiver_label, 
+                     token_symbol, token_address, amount, dex_pool, is_tradeable, timestamp)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (tx_hash, sender_address, sender_label, receiver_address, receiver_label,
+                      token_symbol, token_address, amount, dex_pool, is_tradeable, timestamp))
+            return cursor.lastrowid
         except sqlite3.IntegrityError:
             return None
     
+    def insert_whale_alerts_many(self, alerts: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+        """Insert a batch of whale alerts in one transaction, keyed by tx_hash"""
+        return self._insert_many('whale_alerts', {
+            'tx_hash': None,
+            'sender_address': None,
+            'sender_label': None,
+            'receiver_address': None,
+            'receiver_label': None,
+            'token_symbol': None,
+            'token_address': None,
+            'amount': None,
+            'dex_pool': None,
+            'is_tradeable': False,
+            'timestamp': None,
+        }, 'tx_hash', alerts)
+    
     def get_recent_alerts(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Get recent whale alerts"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
+        cursor = self.get_connection().execute('''
             SELECT * FROM whale_alerts 
             ORDER BY timestamp DESC 
             LIMIT ?
         ''', (limit,))
-        alerts = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return alerts
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def get_alerts_page(self, cursor: str = None, limit: int = 50, token_symbol: str = None,
+                        min_amount: float = None, label: str = None) -> Dict[str, Any]:
+        """Whale alerts newest first, filtered by token, minimum amount and sender or receiver label"""
+        conditions = []
+        if token_symbol is not None:
+            conditions.append(('token_symbol = ?', token_symbol))
+        if min_amount is not None:
+            conditions.append(('amount >= ?', min_amount))
+        any_of = None
+        if label is not None:
+            any_of = [('sender_label = ?', label), ('receiver_label = ?', label)]
+        return self._page('whale_alerts', 'timestamp', conditions, cursor, limit, any_of)
     
     # News Methods
     def insert_news(self, title: str, summary: str, sentiment: str, source: str,
@@ -255,105 +746,220 @@ class Database:
         """Insert a news article"""
         try:
             conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO news (title, summary, sentiment, source, url, published_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (title, summary, sentiment, source, url, published_at))
-            conn.commit()
-            news_id = cursor.lastrowid
-            conn.close()
-            return news_id
+            with conn:
+                cursor = conn.execute('''
+                    INSERT INTO news (title, summary, sentiment, source, url, published_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (title, summary, sentiment, source, url, published_at))
+            return cursor.lastrowid
         except sqlite3.IntegrityError:
             return None
     
+    def insert_news_many(self, articles: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+        """Insert a batch of news articles in one transaction, keyed by url"""
+        return self._insert_many('news', {
+            'title': None,
+            'summary': None,
+            'sentiment': None,
+            'sentiment_score': None,
+            'source': None,
+            'url': None,
+            'published_at': None,
+        }, 'url', articles)
+    
     def get_recent_news(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Get recent news"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
+        cursor = self.get_connection().execute('''
             SELECT * FROM news 
             ORDER BY published_at DESC 
             LIMIT ?
         ''', (limit,))
-        news = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return news
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def get_news_page(self, cursor: str = None, limit: int = 50, sentiment: str = None,
+                      source: str = None) -> Dict[str, Any]:
+        """News newest first, filtered by sentiment label and source"""
+        conditions = []
+        if sentiment is not None:
+            conditions.append(('sentiment = ?', sentiment))
+        if source is not None:
+            conditions.append(('source = ?', source))
+        return self._page('news', 'published_at', conditions, cursor, limit)
     
     # Known Addresses Methods
     def get_address_label(self, address: str) -> Optional[str]:
         """Get label for a known address"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT label FROM known_addresses WHERE address = ?', (address.lower(),))
+        cursor = self.get_connection().execute(
+            'SELECT label FROM known_addresses WHERE address = ?', (address.lower(),)
+        )
         result = cursor.fetchone()
-        conn.close()
         return result['label'] if result else None
     
     def insert_known_address(self, address: str, label: str, category: str):
         """Insert a known address"""
         try:
             conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO known_addresses (address, label, category)
-                VALUES (?, ?, ?)
-            ''', (address.lower(), label, category))
-            conn.commit()
-            conn.close()
+            with conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO known_addresses (address, label, category)
+                    VALUES (?, ?, ?)
+                ''', (address.lower(), label, category))
         except Exception as e:
             print(f"Error inserting known address: {e}")
     
+    def insert_known_addresses_many(self, rows: List[tuple]) -> int:
+        """Insert or replace (address, label, category) rows in one transaction"""
+        conn = self.get_connection()
+        with conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO known_addresses (address, label, category)
+                VALUES (?, ?, ?)
+            ''', [(address.lower(), label, category) for address, label, category in rows])
+        return len(rows)
+    
     # User Unlocks Methods
     def record_unlock(self, user_wallet: str, item_type: str, item_id: int, 
                      tx_hash: str, amount_paid: float) -> Optional[int]:
         """Record a user unlock"""
         try:
             conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO user_unlocks (user_wallet, item_type, item_id, tx_hash, amount_paid)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (user_wallet.lower(), item_type, item_id, tx_hash, amount_paid))
-            conn.commit()
-            unlock_id = cursor.lastrowid
-            conn.close()
-            return unlock_id
+            with conn:
+                cursor = conn.execute('''
+                    INSERT INTO user_unlocks (user_wallet, item_type, item_id, tx_hash, amount_paid)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (user_wallet.lower(), item_type, item_id, tx_hash, amount_paid))
+            self.unlock_cache.invalidate(user_wallet.lower())
+            return cursor.lastrowid
         except sqlite3.IntegrityError:
             return None
     
     def check_unlock(self, user_wallet: str, item_type: str, item_id: int) -> bool:
         """Check if user has unlocked an item"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
+        cursor = self.get_connection().execute('''
             SELECT id FROM user_unlocks 
             WHERE user_wallet = ? AND item_type = ? AND item_id = ?
         ''', (user_wallet.lower(), item_type, item_id))
-        result = cursor.fetchone()
-        conn.close()
-        return result is not None
+        return cursor.fetchone() is not None
+    
+    def check_unlocks(self, user_wallet: str, items: Iterable[Tuple[str, int]]) -> Set[Tuple[str, int]]:
+        """The (item_type, item_id) pairs among items that the wallet has unlocked.
+        
+        Paid unlocks, token-gated unlocks and NFT receipts all count. The
+        wallet's entitlements are read with one query across the three tables
+        and kept in the unlock cache, so checking a whole feed page is a set
+        lookup per item.
+        """
+        wallet = user_wallet.lower()
+        unlocked = self.unlock_cache.get(wallet)
+        if unlocked is None:
+            generation = self.unlock_cache.generation
+            cursor = self.get_connection().execute('''
+                SELECT item_type, item_id FROM user_unlocks WHERE user_wallet = ?
+                UNION SELECT item_type, item_id FROM token_gates WHERE user_wallet = ?
+                UNION SELECT item_type, item_id FROM nft_receipts WHERE user_wallet = ?
+            ''', (wallet, wallet, wallet))
+            unlocked = frozenset((row[0], row[1]) for row in cursor.fetchall())
+            self.unlock_cache.put(wallet, unlocked, generation)
+        return {(item_type, int(item_id)) for item_type, item_id in items
+                if (item_type, int(item_id)) in unlocked}
     
     # Market Data Methods
-    def update_market_data(self, symbol: str, price: float, change_24h: float, volume_24h: float):
-        """Update market data for a symbol"""
+    def update_market_data(self, symbol: str, price: float, change_24h: float, volume_24h: float,
+                           updated_at: datetime = None):
+        """Record a price tick: refresh the snapshot, append the tick and roll it into OHLCV bars"""
+        self.update_market_data_many([{
+            'symbol': symbol, 'price': price, 'change_24h': change_24h, 'volume_24h': volume_24h,
+        }], updated_at)
+    
+    def update_market_data_many(self, rows: List[Dict[str, Any]], updated_at: datetime = None) -> int:
+        """Record one tick per symbol for a whole universe in a single transaction"""
+        updated_at = updated_at or datetime.now()
+        ticks = [
+            (row['symbol'], row['price'], row['change_24h'], row['volume_24h'], updated_at)
+            for row in rows
+        ]
+        buckets = [(interval, bucket_start(updated_at, interval)) for interval in BAR_INTERVALS]
         conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO market_data (symbol, price, change_24h, volume_24h, updated_at)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (symbol, price, change_24h, volume_24h, datetime.now()))
-        conn.commit()
-        conn.close()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('''
+                INSERT INTO market_data (symbol, price, change_24h, volume_24h, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(symbol) DO UPDATE SET
+                    price = excluded.price,
+                    change_24h = excluded.change_24h,
+                    volume_24h = excluded.volume_24h,
+                    updated_at = excluded.updated_at
+            ''', ticks)
+            conn.executemany('''
+                INSERT INTO market_ticks (symbol, price, change_24h, volume_24h, ts)
+                VALUES (?, ?, ?, ?, ?)
+            ''', ticks)
+            # Bars assume ticks arrive in time order. The feed only reports a rolling
+            # 24h volume, so a bar's volume is the last reading inside its bucket.
+            conn.executemany('''
+                INSERT INTO market_bars
+                (symbol, interval, bucket_start, open, high, low, close, volume, tick_count)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)
+                ON CONFLICT(symbol, interval, bucket_start) DO UPDATE SET
+                    high = MAX(high, excluded.high),
+                    low = MIN(low, excluded.low),
+                    close = excluded.close,
+                    volume = excluded.volume,
+                    tick_count = tick_count + 1
+            ''', [
+                (symbol, interval, start, price, price, price, price, volume_24h)
+                for symbol, price, _, volume_24h, _ in ticks
+                for interval, start in buckets
+            ])
+        return len(ticks)
     
-    def get_market_data(self) -> List[Dict[str, Any]]:
-        """Get all market data"""
+    def seed_market_data(self, rows: List[Dict[str, Any]]) -> int:
+        """Insert snapshot rows for symbols that have none yet; returns the number inserted.
+        
+        Only market_data is written: seed prices must never reach market_ticks
+        or the OHLCV bars, and an existing (real) snapshot is left alone.
+        """
         conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM market_data ORDER BY symbol')
-        data = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return data
+        with conn:
+            cursor = conn.executemany('''
+                INSERT INTO market_data (symbol, price, change_24h, volume_24h, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(symbol) DO NOTHING
+            ''', [
+                (row['symbol'], row['price'], row['change_24h'], row['volume_24h'], datetime.now())
+                for row in rows
+            ])
+        return cursor.rowcount
+    
+    def get_market_data(self) -> List[Dict[str, Any]]:
+        """Get the latest snapshot for every symbol"""
+        cursor = self.get_connection().execute('SELECT * FROM market_data ORDER BY symbol')
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def get_market_ticks(self, symbol: str, start: datetime, end: datetime = None,
+                         limit: int = 10_000) -> List[Dict[str, Any]]:
+        """Get raw ticks for a symbol in [start, end), oldest first"""
+        cursor = self.get_connection().execute('''
+            SELECT * FROM market_ticks
+            WHERE symbol = ? AND ts >= ? AND ts < ?
+            ORDER BY ts
+            LIMIT ?
+        ''', (symbol, start, end or datetime.max, limit))
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def get_market_bars(self, symbol: str, interval: str = '1h', start: datetime = None,
+                        end: datetime = None, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Get pre-aggregated OHLCV bars for a symbol with bucket_start in [start, end), oldest first"""
+        if interval not in BAR_INTERVALS:
+            raise ValueError(f"Unknown bar interval {interval!r}, expected one of {', '.join(BAR_INTERVALS)}")
+        cursor = self.get_connection().execute('''
+            SELECT * FROM market_bars
+            WHERE symbol = ? AND interval = ? AND bucket_start >= ? AND bucket_start < ?
+            ORDER BY bucket_start
+            LIMIT ?
+        ''', (symbol, interval, start or datetime.min, end or datetime.max, limit))
+        return [dict(row) for row in cursor.fetchall()]
     
     # NFT Receipts Methods
     def record_nft_receipt(self, token_id: int, user_wallet: str, item_type: str,
@@ -361,68 +967,81 @@ class Database:
         """Record an NFT receipt mint"""
         try:
             conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO nft_receipts (token_id, user_wallet, item_type, item_id, price_paid, tx_hash)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (token_id, user_wallet.lower(), item_type, item_id, price_paid, tx_hash))
-            conn.commit()
-            receipt_id = cursor.lastrowid
-            conn.close()
-            return receipt_id
+            with conn:
+                cursor = conn.execute('''
+                    INSERT INTO nft_receipts (token_id, user_wallet, item_type, item_id, price_paid, tx_hash)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (token_id, user_wallet.lower(), item_type, item_id, price_paid, tx_hash))
+            self.unlock_cache.invalidate(user_wallet.lower())
+            return cursor.lastrowid
         except sqlite3.IntegrityError:
             return None
     
     def get_user_nft_receipts(self, user_wallet: str) -> List[Dict[str, Any]]:
         """Get all NFT receipts for a user"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
+        cursor = self.get_connection().execute('''
             SELECT * FROM nft_receipts 
             WHERE user_wallet = ? 
             ORDER BY minted_at DESC
         ''', (user_wallet.lower(),))
-        receipts = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return receipts
+        return [dict(row) for row in cursor.fetchall()]
     
     # Loyalty Balance Methods
     def update_loyalty_balance(self, user_wallet: str, amount_earned: float = 0,
-                              amount_spent: float = 0) -> None:
-        """Update user's loyalty token balance"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Get current balance or create new record
-        cursor.execute('SELECT * FROM loyalty_balances WHERE user_wallet = ?', (user_wallet.lower(),))
-        existing = cursor.fetchone()
+                              amount_spent: float = 0, reason: str = None, ref: str = None) -> bool:
+        """Append an entry to the loyalty ledger and roll it into the wallet's balance.
         
-        if existing:
-            new_balance = existing['balance'] + amount_earned - amount_spent
-            new_earned = existing['total_earned'] + amount_earned
-            new_spent = existing['total_spent'] + amount_spent
-            
-            cursor.execute('''
-                UPDATE loyalty_balances 
-                SET balance = ?, total_earned = ?, total_spent = ?, updated_at = ?
-                WHERE user_wallet = ?
-            ''', (new_balance, new_earned, new_spent, datetime.now(), user_wallet.lower()))
-        else:
-            cursor.execute('''
-                INSERT INTO loyalty_balances (user_wallet, balance, total_earned, total_spent)
-                VALUES (?, ?, ?, ?)
-            ''', (user_wallet.lower(), amount_earned - amount_spent, amount_earned, amount_spent))
+        ref makes the entry idempotent (e.g. the unlock's tx hash): an entry
+        whose ref is already in the ledger is ignored and False is returned.
+        """
+        return self.accrue_loyalty_many([{
+            'user_wallet': user_wallet, 'amount_earned': amount_earned, 'amount_spent': amount_spent,
+            'reason': reason, 'ref': ref,
+        }]) == 1
+    
+    def accrue_loyalty_many(self, entries: List[Dict[str, Any]]) -> int:
+        """Append a batch of ledger entries in one transaction; returns the number applied.
         
-        conn.commit()
-        conn.close()
+        Each entry has user_wallet and optionally amount_earned, amount_spent,
+        reason and ref. Balances are updated by a trigger on the ledger with a
+        single UPSERT per entry, so concurrent writers never lose an update.
+        Entries whose ref is already in the ledger are skipped; any other
+        constraint violation raises sqlite3.IntegrityError and rolls back the batch.
+        """
+        if not entries:
+            return 0
+        now = datetime.now()
+        conn = self.get_connection()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            cursor = conn.executemany('''
+                INSERT INTO loyalty_ledger
+                (user_wallet, amount_earned, amount_spent, reason, ref, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(ref) DO NOTHING
+            ''', [
+                (entry['user_wallet'].lower(), entry.get('amount_earned', 0), entry.get('amount_spent', 0),
+                 entry.get('reason'), entry.get('ref'), now)
+                for entry in entries
+            ])
+        return cursor.rowcount  # ledger rows only; trigger writes are not counted
+    
+    def get_loyalty_ledger(self, user_wallet: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get a wallet's most recent loyalty ledger entries"""
+        cursor = self.get_connection().execute('''
+            SELECT * FROM loyalty_ledger
+            WHERE user_wallet = ?
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (user_wallet.lower(), limit))
+        return [dict(row) for row in cursor.fetchall()]
     
     def get_loyalty_balance(self, user_wallet: str) -> Dict[str, Any]:
         """Get user's loyalty balance"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM loyalty_balances WHERE user_wallet = ?', (user_wallet.lower(),))
+        cursor = self.get_connection().execute(
+            'SELECT * FROM loyalty_balances WHERE user_wallet = ?', (user_wallet.lower(),)
+        )
         result = cursor.fetchone()
-        conn.close()
         
         if result:
             return dict(result)
@@ -434,37 +1053,41 @@ class Database:
             'last_free_unlock': None
         }
     
+    def _free_unlock_condition(self, now: datetime) -> Tuple[str, Tuple[Any, ...]]:
+        # Timestamps are stored as str(datetime), which sorts chronologically
+        cutoff = now - timedelta(hours=config.LOYALTY_FREE_UNLOCK_COOLDOWN_HOURS)
+        return ('balance >= ? AND (last_free_unlock IS NULL OR last_free_unlock <= ?)',
+                (config.LOYALTY_FREE_UNLOCK_MIN_BALANCE, cutoff))
+    
     def can_use_free_unlock(self, user_wallet: str) -> bool:
         """Check if user can use a free unlock (100+ tokens, 24h cooldown)"""
-        balance_info = self.get_loyalty_balance(user_wallet)
-        
-        # Check if user has enough tokens
-        if balance_info['balance'] < 100:
-            return False
-        
-        # Check cooldown
-        if balance_info['last_free_unlock']:
-            last_unlock = datetime.fromisoformat(balance_info['last_free_unlock'])
-            cooldown_hours = 24
-            if datetime.now() < last_unlock + timedelta(hours=cooldown_hours):
-                return False
-        
-        return True
+        condition, params = self._free_unlock_condition(datetime.now())
+        cursor = self.get_connection().execute(
+            f'SELECT 1 FROM loyalty_balances WHERE user_wallet = ? AND {condition}',
+            (user_wallet.lower(), *params)
+        )
+        return cursor.fetchone() is not None
     
     def use_free_unlock(self, user_wallet: str) -> bool:
-        """Record a free unlock usage"""
-        if not self.can_use_free_unlock(user_wallet):
-            return False
+        """Record a free unlock usage if the wallet is eligible; False otherwise.
         
+        Eligibility is checked and consumed by one conditional UPDATE, so two
+        concurrent requests cannot both use the same free unlock.
+        """
+        now = datetime.now()
+        condition, params = self._free_unlock_condition(now)
         conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE loyalty_balances 
-            SET last_free_unlock = ?
-            WHERE user_wallet = ?
-        ''', (datetime.now(), user_wallet.lower()))
-        conn.commit()
-        conn.close()
+        with conn:
+            cursor = conn.execute(
+                f'UPDATE loyalty_balances SET last_free_unlock = ? WHERE user_wallet = ? AND {condition}',
+                (now, user_wallet.lower(), *params)
+            )
+            if cursor.rowcount == 0:
+                return False
+            conn.execute('''
+                INSERT INTO loyalty_ledger (user_wallet, reason, created_at)
+                VALUES (?, 'free_unlock', ?)
+            ''', (user_wallet.lower(), now))
         return True
     
     # Token Gates Methods
@@ -472,15 +1095,13 @@ class Database:
         """Record a token-gated unlock"""
         try:
             conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO token_gates (user_wallet, item_type, item_id)
-                VALUES (?, ?, ?)
-            ''', (user_wallet.lower(), item_type, item_id))
-            conn.commit()
-            gate_id = cursor.lastrowid
-            conn.close()
-            return gate_id
+            with conn:
+                cursor = conn.execute('''
+                    INSERT INTO token_gates (user_wallet, item_type, item_id)
+                    VALUES (?, ?, ?)
+                ''', (user_wallet.lower(), item_type, item_id))
+            self.unlock_cache.invalidate(user_wallet.lower())
+            return cursor.lastrowid
         except sqlite3.IntegrityError:
             return None
     
@@ -490,30 +1111,23 @@ class Database:
                            success: bool = True) -> int:
         """Record an agent action"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO agent_actions 
-            (user_wallet, action_type, item_type, item_id, rule_matched, cost, success)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (user_wallet.lower(), action_type, item_type, item_id, rule_matched, cost, success))
-        conn.commit()
-        action_id = cursor.lastrowid
-        conn.close()
-        return action_id
+        with conn:
+            cursor = conn.execute('''
+                INSERT INTO agent_actions 
+                (user_wallet, action_type, item_type, item_id, rule_matched, cost, success)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (user_wallet.lower(), action_type, item_type, item_id, rule_matched, cost, success))
+        return cursor.lastrowid
     
     def get_agent_actions(self, user_wallet: str, limit: int = 50) -> List[Dict[str, Any]]:
         """Get recent agent actions for a user"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
+        cursor = self.get_connection().execute('''
             SELECT * FROM agent_actions 
             WHERE user_wallet = ? 
             ORDER BY executed_at DESC 
             LIMIT ?
         ''', (user_wallet.lower(), limit))
-        actions = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return actions
+        return [dict(row) for row in cursor.fetchall()]
     
     # AI Summaries Methods
     def save_ai_summary(self, item_type: str, item_id: int, summary_text: str,
@@ -521,28 +1135,212 @@ class Database:
         """Save an AI-generated summary"""
         try:
             conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO ai_summaries (item_type, item_id, summary_text, model_used)
-                VALUES (?, ?, ?, ?)
-            ''', (item_type, item_id, summary_text, model_used))
-            conn.commit()
-            summary_id = cursor.lastrowid
-            conn.close()
-            return summary_id
+            with conn:
+                cursor = conn.execute('''
+                    INSERT OR REPLACE INTO ai_summaries (item_type, item_id, summary_text, model_used)
+                    VALUES (?, ?, ?, ?)
+                ''', (item_type, item_id, summary_text, model_used))
+            return cursor.lastrowid
         except Exception as e:
             print(f"Error saving AI summary: {e}")
             return None
     
     def get_ai_summary(self, item_type: str, item_id: int) -> Optional[Dict[str, Any]]:
         """Get cached AI summary"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
+        cursor = self.get_connection().execute('''
             SELECT * FROM ai_summaries 
             WHERE item_type = ? AND item_id = ?
         ''', (item_type, item_id))
         result = cursor.fetchone()
-        conn.close()
         return dict(result) if result else None
-
+    
+    # Worker State Methods
+    def get_state(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """Get a persisted worker cursor or checkpoint"""
+        cursor = self.get_connection().execute('SELECT value FROM worker_state WHERE key = ?', (key,))
+        result = cursor.fetchone()
+        return result['value'] if result else default
+    
+    def set_state(self, key: str, value: Any):
+        """Persist a worker cursor or checkpoint"""
+        conn = self.get_connection()
+        with conn:
+            conn.execute('''
+                INSERT INTO worker_state (key, value, updated_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+            ''', (key, str(value), datetime.now()))
+    
+    # Feed State Methods
+    def get_feed_state(self, url: str) -> Optional[Dict[str, Any]]:
+        """Get the conditional GET validators and fingerprint stored for a feed"""
+        cursor = self.get_connection().execute('SELECT * FROM feed_state WHERE url = ?', (url,))
+        result = cursor.fetchone()
+        return dict(result) if result else None
+    
+    def record_feed_fetch(self, url: str, outcome: str, etag: str = None, last_modified: str = None,
+                          fingerprint: str = None, body_size: int = None):
+        """Record a feed fetch outcome: 'not_modified' (304), 'unchanged' or 'parsed'.
+        
+        A 304 keeps the stored validators and counts the last body size as saved.
+        """
+        not_modified = outcome == 'not_modified'
+        conn = self.get_connection()
+        with conn:
+            conn.execute('''
+                INSERT INTO feed_state
+                (url, etag, last_modified, fingerprint, body_size,
+                 not_modified, unchanged, parsed, bytes_downloaded, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    etag = CASE WHEN excluded.not_modified THEN etag ELSE excluded.etag END,
+                    last_modified = CASE WHEN excluded.not_modified THEN last_modified ELSE excluded.last_modified END,
+                    fingerprint = CASE WHEN excluded.not_modified THEN fingerprint ELSE excluded.fingerprint END,
+                    body_size = CASE WHEN excluded.not_modified THEN body_size ELSE excluded.body_size END,
+                    not_modified = not_modified + excluded.not_modified,
+                    unchanged = unchanged + excluded.unchanged,
+                    parsed = parsed + excluded.parsed,
+                    bytes_downloaded = bytes_downloaded + excluded.bytes_downloaded,
+                    bytes_saved = bytes_saved + CASE WHEN excluded.not_modified THEN COALESCE(body_size, 0) ELSE 0 END,
+                    updated_at = excluded.updated_at
+            ''', (url, etag, last_modified, fingerprint, body_size,
+                  int(not_modified), int(outcome == 'unchanged'), int(outcome == 'parsed'),
+                  body_size or 0, datetime.now()))
+    
+    def get_feed_stats(self) -> List[Dict[str, Any]]:
+        """Get fetch counters for every feed"""
+        cursor = self.get_connection().execute('''
+            SELECT url, not_modified, unchanged, parsed, bytes_downloaded, bytes_saved, updated_at
+            FROM feed_state ORDER BY url
+        ''')
+        return [dict(row) for row in cursor.fetchall()]
+    
+    # Search Methods
+    def search(self, query: str, kinds: List[str] = None, limit: int = 20, offset: int = 0,
+               prefix: bool = False, highlight: Tuple[str, str] = ('<mark>', '</mark>')) -> Dict[str, Any]:
+        """Full-text search over news, deals and alert labels, best match first.
+        
+        query is plain text and every word must match (see fts_query). kinds
+        narrows the search to some of 'news', 'deals' and 'alerts'. Each item
+        holds the kind, id, BM25 score (lower is better), a snippet with
+        matches wrapped in highlight, and the row. Pass next_offset as offset
+        for the next page. Ranking scores every match, so cost grows with the
+        number of rows a query matches, not with table size.
+        """
+        if not self.search_enabled:
+            raise RuntimeError('SQLite was built without FTS5; search is unavailable')
+        kinds = list(kinds or SEARCH_INDEXES)
+        unknown = [kind for kind in kinds if kind not in SEARCH_INDEXES]
+        if unknown:
+            raise ValueError(f"unknown search kind(s) {unknown}; expected {list(SEARCH_INDEXES)}")
+        match = fts_query(query, prefix)
+        if not match:
+            return {'items': [], 'next_offset': None}
+        
+        # Each table returns only its best offset + limit + 1 hits, then the
+        # branches are merged on score
+        branches, params = [], []
+        for kind in kinds:
+            fts = SEARCH_INDEXES[kind][0] + '_fts'
+            branches.append(f'''
+                SELECT * FROM (
+                    SELECT '{kind}' AS kind, rowid AS id, rank AS score,
+                           snippet({fts}, -1, ?, ?, '...', {SNIPPET_TOKENS}) AS snippet
+                    FROM {fts} WHERE {fts} MATCH ? ORDER BY rank LIMIT ?
+                )
+            ''')
+            params.extend([highlight[0], highlight[1], match, offset + limit + 1])
+        sql = ' UNION ALL '.join(branches) + ' ORDER BY score LIMIT ? OFFSET ?'
+        conn = self.get_connection()
+        hits = conn.execute(sql, params + [limit + 1, offset]).fetchall()
+        next_offset = offset + limit if len(hits) > limit else None
+        hits = hits[:limit]
+        
+        rows = {}
+        for kind in kinds:
+            table = SEARCH_INDEXES[kind][0]
+            ids = [hit['id'] for hit in hits if hit['kind'] == kind]
+            if ids:
+                cursor = conn.execute(
+                    f"SELECT * FROM {table} WHERE id IN ({', '.join('?' for _ in ids)})", ids
+                )
+                rows.update(((kind, row['id']), dict(row)) for row in cursor.fetchall())
+        
+        return {
+            'items': [
+                {'kind': hit['kind'], 'id': hit['id'], 'score': hit['score'], 'snippet': hit['snippet'],
+                 'row': rows.get((hit['kind'], hit['id']))}
+                for hit in hits
+            ],
+            'next_offset': next_offset,
+        }
+    
+    # Change Log Methods
+    def get_change_version(self) -> int:
+        """Sequence number of the latest change to any feed table; 0 before the first.
+        
+        A single rowid seek, so readers can poll it cheaply and skip all other
+        work while it is unchanged.
+        """
+        cursor = self.get_connection().execute('SELECT COALESCE(MAX(seq), 0) FROM change_log')
+        return cursor.fetchone()[0]
+    
+    def get_changes_since(self, seq: int, limit: int = 500) -> Dict[str, Any]:
+        """Changes to the feed tables after seq, oldest first, with the current row for each.
+        
+        Several changes to one row collapse into its latest. Deleted rows come
+        back with row None. Pass the returned version as seq on the next call;
+        has_more is set when limit cut the batch short. reset is set when seq
+        is older than the pruned log, and the reader should reload the tables
+        instead of applying deltas.
+        """
+        conn = self.get_connection()
+        pruned_through = int(self.get_state('change_log:pruned_through', 0))
+        entries = conn.execute('''
+            SELECT seq, table_name, row_id, op FROM change_log
+            WHERE seq > ? ORDER BY seq LIMIT ?
+        ''', (seq, limit)).fetchall()
+        
+        latest = {}
+        for entry in entries:
+            key = (entry['table_name'], entry['row_id'])
+            latest.pop(key, None)  # re-insert so dict order follows the latest seq
+            latest[key] = entry
+        
+        rows = {}
+        for table in CHANGE_LOG_TABLES:
+            ids = [row_id for (name, row_id), entry in latest.items()
+                   if name == table and entry['op'] != 'delete']
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                cursor = conn.execute(
+                    f"SELECT * FROM {table} WHERE id IN ({', '.join('?' for _ in chunk)})", chunk
+                )
+                rows.update(((table, row['id']), dict(row)) for row in cursor.fetchall())
+        
+        return {
+            'version': entries[-1]['seq'] if entries else max(seq, pruned_through),
+            'changes': [
+                {'seq': entry['seq'], 'table': table, 'id': row_id, 'op': entry['op'],
+                 'row': rows.get((table, row_id))}
+                for (table, row_id), entry in latest.items()
+            ],
+            'has_more': len(entries) == limit,
+            'reset': seq < pruned_through,
+        }
+    
+    def prune_change_log(self, keep: int = config.CHANGE_LOG_MAX_ROWS) -> int:
+        """Drop all but the newest keep change log entries; returns the number removed"""
+        conn = self.get_connection()
+        with conn:
+            cutoff = conn.execute('SELECT COALESCE(MAX(seq), 0) - ? FROM change_log', (keep,)).fetchone()[0]
+            if cutoff <= 0:
+                return 0
+            removed = conn.execute('DELETE FROM change_log WHERE seq <= ?', (cutoff,)).rowcount
+            if removed:
+                conn.execute('''
+                    INSERT INTO worker_state (key, value, updated_at)
+                    VALUES ('change_log:pruned_through', ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+                ''', (str(cutoff), datetime.now()))
+        return removed
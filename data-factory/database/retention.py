@@ -0,0 +1,265 @@
+"""
+Tiered retention: move aged rows out of the hot database into compressed archive files
+"""
+
+import argparse
+import gzip
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.models import Database
+import config
+
+# Columns that identify a row, for deleting archived rows and de-duplicating reads
+TABLE_KEYS = {
+    'market_bars': ('symbol', 'interval', 'bucket_start'),  # WITHOUT ROWID
+}
+
+class RetentionPolicy(NamedTuple):
+    table: str
+    ts_column: str
+    keep_days: float
+    where: Optional[str] = None  # extra SQL filter, e.g. one bar interval
+
+    @property
+    def key(self) -> Tuple[str, ...]:
+        return TABLE_KEYS.get(self.table, ('id',))
+
+def partition_of(ts: Any) -> str:
+    """Archive partition (YYYY-MM-DD) for a stored timestamp"""
+    return str(ts)[:10]
+
+class Archive:
+    """Date-partitioned, gzip-compressed NDJSON files: <root>/<table>/<YYYY-MM-DD>/part-*.ndjson.gz.
+
+    Each archived batch adds new part files and never rewrites old ones.
+    Parts are written to a temp file and os.replace()d into place, so a
+    reader never sees half a part. A batch archived twice (a crash between
+    writing it and deleting it from the database) is de-duplicated on read.
+    """
+
+    def __init__(self, root: str = config.ARCHIVE_DIR):
+        self.root = root
+
+    def write(self, table: str, ts_column: str, rows: List[Dict[str, Any]]) -> List[str]:
+        """Append rows to their date partitions; returns the part files written"""
+        partitions: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            partitions.setdefault(partition_of(row[ts_column]), []).append(row)
+
+        paths = []
+        for day, day_rows in sorted(partitions.items()):
+            directory = os.path.join(self.root, table, day)
+            os.makedirs(directory, exist_ok=True)
+            body = ''.join(json.dumps(row, default=str, separators=(',', ':')) + '\n' for row in day_rows)
+            path = os.path.join(directory, f"part-{time.time_ns()}-{os.getpid()}.ndjson.gz")
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(gzip.compress(body.encode(), compresslevel=6))
+                    f.flush()
+                    os.fsync(f.fileno())  # on disk before the rows leave the database
+                os.replace(tmp_path, path)
+            except BaseException:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+            paths.append(path)
+        return paths
+
+    def partitions(self, table: str) -> List[str]:
+        """Archived dates for a table, oldest first"""
+        directory = os.path.join(self.root, table)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name for name in os.listdir(directory) if len(name) == 10)
+
+    def read(self, table: str, ts_column: str, start: datetime, end: datetime,
+             key: Tuple[str, ...] = ('id',)) -> Iterator[Dict[str, Any]]:
+        """Archived rows with start <= ts_column < end, one partition at a time"""
+        low, high = str(start), str(end)
+        first, last = partition_of(low), partition_of(high)
+        for day in self.partitions(table):
+            if day < first or day > last:
+                continue
+            directory = os.path.join(self.root, table, day)
+            seen = set()
+            for name in sorted(os.listdir(directory)):
+                if not name.endswith('.ndjson.gz'):
+                    continue
+                with gzip.open(os.path.join(directory, name), 'rt') as f:
+                    for line in f:
+                        row = json.loads(line)
+                        row_key = tuple(row[column] for column in key)
+                        if row_key in seen or not low <= str(row[ts_column]) < high:
+                            continue
+                        seen.add(row_key)
+                        yield row
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Partitions, part files and compressed bytes per archived table"""
+        stats = {}
+        if not os.path.isdir(self.root):
+            return stats
+        for table in sorted(os.listdir(self.root)):
+            table_stats = {'partitions': 0, 'files': 0, 'bytes': 0}
+            for day in self.partitions(table):
+                table_stats['partitions'] += 1
+                for entry in os.scandir(os.path.join(self.root, table, day)):
+                    if entry.name.endswith('.ndjson.gz'):
+                        table_stats['files'] += 1
+                        table_stats['bytes'] += entry.stat().st_size
+            stats[table] = table_stats
+        return stats
+
+class RetentionManager:
+    """Applies per-table retention policies to the hot database.
+
+    Rows older than a policy's keep_days are moved in batches: each batch
+    is written to the archive and fsynced, then deleted in one transaction,
+    so a crash can duplicate a batch in the archive but never lose it.
+    Freed pages are then returned to the filesystem with incremental
+    vacuum, keeping the hot file small enough to stay in the page cache.
+    """
+
+    def __init__(self, db: Database = None, archive: Archive = None,
+                 policies: List[Tuple] = None, batch_size: int = config.RETENTION_BATCH):
+        self.db = db or Database()
+        self.archive = archive or Archive()
+        self.policies = [RetentionPolicy(*policy) for policy in (policies or config.RETENTION_POLICIES)]
+        self.batch_size = batch_size
+        self.archived: Dict[str, int] = {}
+
+    def setup(self):
+        """One-time setup before the first run, while no other lane is writing"""
+        self.enable_incremental_vacuum()
+
+    def enable_incremental_vacuum(self) -> bool:
+        """Switch the database to auto_vacuum=INCREMENTAL; returns True if it had to convert.
+
+        Databases created before auto_vacuum was configured need one full
+        VACUUM for the setting to take effect. It holds the write lock for as
+        long as it takes to rewrite the file, so it runs at startup (or by
+        hand with --convert) and never from the retention lane.
+        """
+        conn = self.db.get_connection()
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+            return False
+        print("[Retention] Converting database to incremental vacuum (one-time full VACUUM)")
+        started = time.perf_counter()
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+        print(f"[Retention] Converted in {time.perf_counter() - started:.1f}s")
+        return True
+
+    def run(self, now: datetime = None) -> Dict[str, int]:
+        """Archive every policy's aged rows, then vacuum; returns rows moved per table"""
+        now = now or datetime.now()
+        print(f"[Retention] Applying {len(self.policies)} policies at {now}")
+        moved: Dict[str, int] = {}
+        for policy in self.policies:
+            count = self.apply(policy, now - timedelta(days=policy.keep_days))
+            if count:
+                moved[policy.table] = moved.get(policy.table, 0) + count
+                self.archived[policy.table] = self.archived.get(policy.table, 0) + count
+        if moved:
+            freed = self.vacuum()
+            print(f"[Retention] Archived {moved}, freed {freed:,} pages")
+        return moved
+
+    def apply(self, policy: RetentionPolicy, cutoff: datetime) -> int:
+        """Move rows older than cutoff for one policy, batch by batch"""
+        conn = self.db.get_connection()
+        where = f"{policy.ts_column} < ?" + (f" AND {policy.where}" if policy.where else '')
+        key_match = ' AND '.join(f"{column} = ?" for column in policy.key)
+        moved = 0
+        while True:
+            rows = [dict(row) for row in conn.execute(
+                f"SELECT * FROM {policy.table} WHERE {where} ORDER BY {policy.ts_column} LIMIT ?",
+                (cutoff, self.batch_size)
+            ).fetchall()]
+            if not rows:
+                return moved
+            self.archive.write(policy.table, policy.ts_column, rows)
+            with conn:
+                conn.executemany(
+                    f"DELETE FROM {policy.table} WHERE {key_match}",
+                    [tuple(row[column] for column in policy.key) for row in rows]
+                )
+            moved += len(rows)
+
+    def vacuum(self) -> int:
+        """Return free pages to the filesystem; returns the number of pages freed"""
+        conn = self.db.get_connection()
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            # Not converted yet (see enable_incremental_vacuum); freed pages
+            # stay in the file and are reused by later inserts
+            return 0
+        free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        # incremental_vacuum frees one page per step and execute() only steps
+        # once; executescript() runs it to completion
+        conn.executescript('PRAGMA incremental_vacuum;')
+        return free
+
+    def query_range(self, table: str, start: datetime, end: datetime,
+                    include_archive: bool = False) -> List[Dict[str, Any]]:
+        """Rows of a retained table with start <= timestamp < end, oldest first.
+
+        With include_archive, archived rows in the range are merged in, so
+        callers need not know where the retention cutoff falls.
+        """
+        policy = next((policy for policy in self.policies if policy.table == table), None)
+        if policy is None:
+            raise ValueError(f"no retention policy for table {table!r}")
+        cursor = self.db.get_connection().execute(
+            f"SELECT * FROM {table} WHERE {policy.ts_column} >= ? AND {policy.ts_column} < ? "
+            f"ORDER BY {policy.ts_column}",
+            (start, end)
+        )
+        rows = [dict(row) for row in cursor.fetchall()]
+        if not include_archive:
+            return rows
+
+        hot_keys = {tuple(row[column] for column in policy.key) for row in rows}
+        rows.extend(
+            row for row in self.archive.read(table, policy.ts_column, start, end, policy.key)
+            if tuple(row[column] for column in policy.key) not in hot_keys
+        )
+        rows.sort(key=lambda row: (str(row[policy.ts_column]), tuple(row[column] for column in policy.key)))
+        return rows
+
+    def stats(self) -> Dict[str, Any]:
+        """Hot database size, rows archived this session and archive size per table"""
+        conn = self.db.get_connection()
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        return {
+            'hot_bytes': conn.execute('PRAGMA page_count').fetchone()[0] * page_size,
+            'free_bytes': conn.execute('PRAGMA freelist_count').fetchone()[0] * page_size,
+            'archived_rows': dict(self.archived),
+            'archive': self.archive.stats(),
+        }
+
+def run_once():
+    """Apply retention policies once"""
+    manager = RetentionManager()
+    manager.run()
+    print(f"[Retention] {manager.stats()}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='MicroTerm retention')
+    parser.add_argument('--convert', action='store_true',
+                        help='switch the database to incremental vacuum (full VACUUM) and exit')
+    args = parser.parse_args()
+
+    if args.convert:
+        RetentionManager().enable_incremental_vacuum()
+    else:
+        run_once()
@@ -0,0 +1,100 @@
+"""
+In-memory index of keys already stored, for rejecting duplicates before enrichment
+"""
+
+import hashlib
+import sys
+import os
+from typing import Callable, Dict, Iterable, List, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.models import Database
+
+# Click ids that only track the click and never change the page (plus utm_*);
+# generic names like ref are left alone because some sites route on them
+TRACKING_PARAMS = {'fbclid', 'gclid'}
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+def canonicalize_url(url: str) -> str:
+    """Normalize a URL so the same page always maps to the same key.
+    
+    Lowercases the scheme and host, drops default ports, fragments and
+    tracking parameters (utm_*, fbclid and gclid). Other query parameters
+    are kept in their original order. The result is a lookup key only;
+    rows store the link as published.
+    """
+    url = (url or '').strip()
+    if not url:
+        return ''
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if port and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    query = [
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not name.lower().startswith('utm_') and name.lower() not in TRACKING_PARAMS
+    ]
+    return urlunsplit((scheme, host, parts.path or '/', urlencode(query), ''))
+
+# namespace -> (table, column, normalizer)
+SOURCES: Dict[str, Tuple[str, str, Callable[[str], str]]] = {
+    'news': ('news', 'url', canonicalize_url),
+    'deals': ('private_deals', 'filing_url', canonicalize_url),
+    'tx': ('whale_alerts', 'tx_hash', str.lower),
+}
+
+def _digest(key: str) -> int:
+    # 64-bit digests keep each entry small; a collision would need ~2^32 keys
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+class SeenKeyIndex:
+    """Set of news URLs, filing URLs and tx hashes already in the database.
+    
+    warm() loads a namespace from its table once at startup; workers add() the
+    keys of every row they insert (or find already present), so a duplicate
+    feed entry or transaction is rejected with one set lookup instead of
+    being parsed, enriched and bounced off a UNIQUE constraint.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self._keys: Dict[str, set] = {namespace: set() for namespace in SOURCES}
+        self.rejected: Dict[str, int] = {namespace: 0 for namespace in SOURCES}
+
+    def warm(self, namespaces: Iterable[str] = None):
+        """Load every stored key for the given namespaces (default: all)"""
+        for namespace in namespaces or SOURCES:
+            table, column, normalize = SOURCES[namespace]
+            keys = set()
+            cursor = self.db.get_connection().execute(f'SELECT {column} FROM {table}')
+            while True:
+                rows = cursor.fetchmany(50_000)
+                if not rows:
+                    break
+                keys.update(_digest(normalize(key)) for key, in rows if key)
+            self._keys[namespace] = keys
+
+    def seen(self, namespace: str, key: str) -> bool:
+        """True if key is already stored; counts the rejection"""
+        if _digest(SOURCES[namespace][2](key or '')) in self._keys[namespace]:
+            self.rejected[namespace] += 1
+            return True
+        return False
+
+    def add(self, namespace: str, keys: List[str]):
+        """Mark keys as stored"""
+        normalize = SOURCES[namespace][2]
+        self._keys[namespace].update(_digest(normalize(key)) for key in keys if key)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            namespace: {'keys': len(self._keys[namespace]), 'rejected': self.rejected[namespace]}
+            for namespace in SOURCES
+        }
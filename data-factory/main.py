@@ -4,94 +4,86 @@ MicroTerm Data Factory - Main Worker Orchestrator
 Runs all data collection workers on scheduled intervals
 """
 
-import schedule
-import time
 from datetime import datetime
 import sys
+import threading
 
+from database.models import Database
+from database.columnar import ColumnarExporter
+from database.retention import RetentionManager
+from database.seen_keys import SeenKeyIndex
+from scheduler import Scheduler
+from workers.ratelimit import HostRateLimiter, pooled_session
+from workers.rpc import JsonRpcClient
 from workers.sec_worker import SECWorker
 from workers.blockchain_worker import BlockchainWorker
 from workers.news_worker import NewsWorker
 from workers.market_worker import MarketWorker
 import config
 
-def run_sec_worker():
-    """Run SEC worker"""
-    try:
-        print(f"\n{'='*60}")
-        print(f"[Main] Running SEC Worker at {datetime.now()}")
-        print(f"{'='*60}")
-        worker = SECWorker()
-        worker.fetch_form_d_filings()
-    except Exception as e:
-        print(f"[Main] SEC Worker error: {e}")
-
-def run_blockchain_worker():
-    """Run blockchain worker"""
-    try:
-        print(f"\n{'='*60}")
-        print(f"[Main] Running Blockchain Worker at {datetime.now()}")
-        print(f"{'='*60}")
-        worker = BlockchainWorker()
-        worker.watch_whale_transfers()
-    except Exception as e:
-        print(f"[Main] Blockchain Worker error: {e}")
+# Worker registry: name -> (display name, tick method, interval in seconds)
+WORKERS = {
+    'sec': ('SEC Worker', 'fetch_form_d_filings', config.SEC_WORKER_INTERVAL),
+    'blockchain': ('Blockchain Worker', 'watch_whale_transfers', config.BLOCKCHAIN_WORKER_INTERVAL),
+    'news': ('News Worker', 'fetch_news', config.NEWS_WORKER_INTERVAL),
+    'market': ('Market Worker', 'fetch_market_data', config.MARKET_WORKER_INTERVAL),
+    'retention': ('Retention', 'run', config.RETENTION_INTERVAL),
+    'columnar': ('Columnar Export', 'run', config.COLUMNAR_EXPORT_INTERVAL),
+}
 
-def run_news_worker():
-    """Run news worker"""
-    try:
-        print(f"\n{'='*60}")
-        print(f"[Main] Running News Worker at {datetime.now()}")
-        print(f"{'='*60}")
-        worker = NewsWorker()
-        worker.fetch_news()
-    except Exception as e:
-        print(f"[Main] News Worker error: {e}")
+def create_workers():
+    """Build every worker once around shared resources and run its one-time setup"""
+    db = Database()
+    session = pooled_session()
+    limiter = HostRateLimiter()
+    seen = SeenKeyIndex(db)
+    rpc = JsonRpcClient(config.ALCHEMY_BASE_URL, session=session) if config.ALCHEMY_BASE_URL else None
+    
+    workers = {
+        'sec': SECWorker(db=db, session=session, limiter=limiter, seen=seen),
+        'blockchain': BlockchainWorker(db=db, rpc=rpc, seen=seen),
+        'news': NewsWorker(db=db, session=session, limiter=limiter, seen=seen),
+        'market': MarketWorker(db=db),
+        'retention': RetentionManager(db=db),
+        'columnar': ColumnarExporter(db=db),
+    }
+    
+    for name, worker in workers.items():
+        if hasattr(worker, 'setup'):
+            try:
+                worker.setup()
+            except Exception as e:
+                print(f"[Main] {WORKERS[name][0]} setup error: {e}")
+    
+    return workers
 
-def run_market_worker():
-    """Run market worker"""
-    try:
-        print(f"\n{'='*60}")
-        print(f"[Main] Running Market Worker at {datetime.now()}")
-        print(f"{'='*60}")
-        worker = MarketWorker()
-        worker.fetch_market_data()
-    except Exception as e:
-        print(f"[Main] Market Worker error: {e}")
+def run_worker(name: str, worker):
+    """Run one tick of a long-lived worker.
+    
+    Errors propagate to the scheduler, which logs them and counts them as
+    lane failures.
+    """
+    display_name, tick, _ = WORKERS[name]
+    print(f"\n{'='*60}")
+    print(f"[Main] Running {display_name} at {datetime.now()}")
+    print(f"{'='*60}")
+    getattr(worker, tick)()
 
-def seed_all_data():
+def seed_all_data(workers):
     """Seed all workers with initial data"""
     print(f"\n{'='*60}")
     print("[Main] Seeding all workers with initial data")
     print(f"{'='*60}\n")
     
-    try:
-        print("[Main] Seeding SEC data...")
-        sec_worker = SECWorker()
-        sec_worker.seed_initial_data()
-    except Exception as e:
-        print(f"[Main] Error seeding SEC data: {e}")
-    
-    try:
-        print("\n[Main] Seeding Blockchain data...")
-        blockchain_worker = BlockchainWorker()
-        blockchain_worker.seed_initial_data()
-    except Exception as e:
-        print(f"[Main] Error seeding Blockchain data: {e}")
-    
-    try:
-        print("\n[Main] Seeding News data...")
-        news_worker = NewsWorker()
-        news_worker.seed_initial_data()
-    except Exception as e:
-        print(f"[Main] Error seeding News data: {e}")
-    
-    try:
-        print("\n[Main] Seeding Market data...")
-        market_worker = MarketWorker()
-        market_worker.seed_initial_data()
-    except Exception as e:
-        print(f"[Main] Error seeding Market data: {e}")
+    for name, worker in workers.items():
+        if not hasattr(worker, 'seed_initial_data'):
+            continue
+        display_name = WORKERS[name][0]
+        try:
+            print(f"\n[Main] Seeding {display_name} data...")
+            worker.seed_initial_data()
+        except Exception as e:
+            print(f"[Main] Error seeding {display_name} data: {e}")
     
     print(f"\n{'='*60}")
     print("[Main] Initial data seeding complete!")
@@ -103,43 +95,44 @@ def main():
     print("MicroTerm Data Factory Starting...")
     print(f"{'='*60}\n")
     
-    # Seed initial data
-    seed_all_data()
+    # Build long-lived workers and seed initial data
+    workers = create_workers()
+    seed_all_data(workers)
     
-    # Schedule workers
-    print("[Main] Scheduling workers...")
-    schedule.every(config.SEC_WORKER_INTERVAL).seconds.do(run_sec_worker)
-    schedule.every(config.BLOCKCHAIN_WORKER_INTERVAL).seconds.do(run_blockchain_worker)
-    schedule.every(config.NEWS_WORKER_INTERVAL).seconds.do(run_news_worker)
-    schedule.every(config.MARKET_WORKER_INTERVAL).seconds.do(run_market_worker)
+    # Stream new blocks over WebSocket when configured; the scheduled
+    # blockchain lane keeps polling whenever the stream is down
+    if config.ALCHEMY_BASE_WS_URL:
+        threading.Thread(target=workers['blockchain'].stream, name='blockchain-stream',
+                         daemon=True).start()
     
-    print(f"[Main] SEC Worker: Every {config.SEC_WORKER_INTERVAL}s")
-    print(f"[Main] Blockchain Worker: Every {config.BLOCKCHAIN_WORKER_INTERVAL}s")
-    print(f"[Main] News Worker: Every {config.NEWS_WORKER_INTERVAL}s")
-    print(f"[Main] Market Worker: Every {config.MARKET_WORKER_INTERVAL}s")
+    # Schedule workers, each on its own lane
+    print("[Main] Scheduling workers...")
+    scheduler = Scheduler()
+    for name, worker in workers.items():
+        display_name, _, interval = WORKERS[name]
+        scheduler.add(name, lambda name=name, worker=worker: run_worker(name, worker), interval,
+                      jitter=config.WORKER_STARTUP_JITTER)
+        print(f"[Main] {display_name}: Every {interval}s")
     
     print(f"\n{'='*60}")
     print("[Main] Workers scheduled. Running continuously...")
     print("[Main] Press Ctrl+C to stop")
     print(f"{'='*60}\n")
     
-    # Run all workers once immediately
-    run_market_worker()
-    time.sleep(2)
-    run_news_worker()
-    time.sleep(2)
-    run_sec_worker()
-    time.sleep(2)
-    
-    # Keep running scheduled tasks
+    # All lanes fire within WORKER_STARTUP_JITTER seconds, then keep their own interval
     try:
-        while True:
-            schedule.run_pending()
-            time.sleep(1)
+        scheduler.run_forever()
     except KeyboardInterrupt:
         print("\n\n[Main] Shutting down workers...")
+        scheduler.stop()
+        workers['blockchain'].stop_stream()
+        print(f"[Main] blockchain alert latency: {workers['blockchain'].latency_stats()}")
+        print(f"[Main] duplicates rejected early: {workers['news'].seen.stats()}")
+        print(f"[Main] EDGAR document cache: {workers['sec'].cache.stats()}")
+        print(f"[Main] retention: {workers['retention'].stats()}")
+        for name, stats in scheduler.stats().items():
+            print(f"[Main] {name}: {stats}")
         sys.exit(0)
 
 if __name__ == '__main__':
     main()
-
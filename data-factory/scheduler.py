@@ -0,0 +1,141 @@
+"""
+MicroTerm Data Factory - Worker Scheduler
+Runs each worker on its own executor lane so a slow worker never delays the others
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, Optional
+
+@dataclass
+class Lane:
+    """A periodically scheduled job and its run accounting"""
+    name: str
+    func: Callable[[], None]
+    interval: float
+    deadline: float
+    jitter: float = 0
+    next_run: float = 0
+    running: bool = False
+    started_at: Optional[float] = None
+    overrun_reported: bool = False
+    runs: int = 0
+    failures: int = 0
+    overruns: int = 0
+    missed_ticks: int = 0
+    last_duration: float = 0
+    max_duration: float = 0
+
+class Scheduler:
+    """Fixed-rate scheduler with one lane per job.
+
+    A lane never overlaps itself: a tick that comes due while the previous run
+    is still going is skipped and counted as missed. Runs that exceed their
+    deadline are reported while still running and counted as overruns.
+    """
+
+    def __init__(self, poll_interval: float = 1.0):
+        self.lanes: Dict[str, Lane] = {}
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def add(self, name: str, func: Callable[[], None], interval: float,
+            deadline: float = None, jitter: float = 0):
+        """Register a job to run every interval seconds.
+
+        deadline defaults to the interval; the first run starts after a random
+        delay of up to jitter seconds so lanes do not all fire at once.
+        """
+        self.lanes[name] = Lane(name=name, func=func, interval=interval,
+                                deadline=deadline or interval, jitter=jitter)
+
+    def run_forever(self):
+        """Dispatch lanes until stop() is called"""
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=max(len(self.lanes), 1),
+                                            thread_name_prefix='lane')
+        now = time.monotonic()
+        for lane in self.lanes.values():
+            lane.next_run = now + random.uniform(0, lane.jitter)
+
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                for lane in self.lanes.values():
+                    self._check_deadline(lane, now)
+                    if now >= lane.next_run:
+                        self._dispatch(lane, now)
+
+                next_due = min((lane.next_run for lane in self.lanes.values()), default=now)
+                self._stop.wait(min(max(next_due - time.monotonic(), 0), self.poll_interval))
+        finally:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self):
+        self._stop.set()
+
+    def _dispatch(self, lane: Lane, now: float):
+        with self._lock:
+            if lane.running:
+                lane.missed_ticks += 1
+                print(f"[Scheduler] {lane.name} still running, skipping tick "
+                      f"({lane.missed_ticks} missed)")
+            else:
+                lane.running = True
+                lane.started_at = now
+                lane.overrun_reported = False
+                self._executor.submit(self._run, lane)
+
+        # Fixed-rate schedule; if the loop fell behind by whole intervals
+        # (e.g. the process was suspended) count them instead of bursting
+        lane.next_run += lane.interval
+        if lane.next_run <= now:
+            behind = int((now - lane.next_run) // lane.interval) + 1
+            lane.missed_ticks += behind
+            lane.next_run += behind * lane.interval
+
+    def _run(self, lane: Lane):
+        try:
+            lane.func()
+        except Exception as e:
+            lane.failures += 1
+            print(f"[Scheduler] {lane.name} failed: {e}")
+        finally:
+            duration = time.monotonic() - lane.started_at
+            with self._lock:
+                lane.runs += 1
+                lane.last_duration = duration
+                lane.max_duration = max(lane.max_duration, duration)
+                if duration > lane.deadline and not lane.overrun_reported:
+                    lane.overruns += 1
+                lane.running = False
+
+    def _check_deadline(self, lane: Lane, now: float):
+        with self._lock:
+            if not lane.running or lane.overrun_reported:
+                return
+            if now - lane.started_at > lane.deadline:
+                lane.overrun_reported = True
+                lane.overruns += 1
+                print(f"[Scheduler] {lane.name} exceeded its {lane.deadline:g}s deadline")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Run accounting per lane"""
+        with self._lock:
+            return {
+                name: {
+                    'runs': lane.runs,
+                    'failures': lane.failures,
+                    'overruns': lane.overruns,
+                    'missed_ticks': lane.missed_ticks,
+                    'last_duration': round(lane.last_duration, 3),
+                    'max_duration': round(lane.max_duration, 3),
+                    'running': lane.running,
+                }
+                for name, lane in self.lanes.items()
+            }
@@ -0,0 +1,23 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.models import Database
+
+def test_search_survives_second_database_on_same_file(tmp_path):
+    """Opening another Database must not invalidate FTS5 config cached by the first"""
+    path = str(tmp_path / 'search.db')
+    first = Database(path)
+    first.insert_news_many([
+        {'title': 'Bitcoin surges past record', 'url': 'https://example.com/1',
+         'source': 'test', 'published_at': '2026-01-01 00:00:00'},
+    ])
+    assert [item['id'] for item in first.search('bitcoin')['items']] == [1]
+
+    second = Database(path)
+    try:
+        assert [item['id'] for item in first.search('bitcoin')['items']] == [1]
+        assert [item['id'] for item in second.search('surge')['items']] == [1]
+    finally:
+        second.close()
+        first.close()
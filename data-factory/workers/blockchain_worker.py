@@ -1,22 +1,57 @@
-from web3 import Web3
+import argparse
+import asyncio
+import json
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Dict, List, Optional
 import time
 import sys
 import os
+import websockets
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database.models import Database
+from database.address_labels import AddressLabelIndex
+from database.seen_keys import SeenKeyIndex
+from workers.rpc import JsonRpcClient, JsonRpcError, MissingBlocksError
 import config
 
+CURSOR_KEY = 'blockchain:last_scanned_block'
+GAPS_KEY = 'blockchain:skipped_ranges'  # JSON list of [start, end] left for backfill_gaps()
+WEI_PER_ETH = 10 ** 18
+TRANSFER_TOPIC = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
+
 class BlockchainWorker:
-    def __init__(self):
-        self.db = Database()
-        self.w3 = None
-        if config.ALCHEMY_BASE_URL:
-            self.w3 = Web3(Web3.HTTPProvider(config.ALCHEMY_BASE_URL))
-        
-        # Seed known addresses
+    def __init__(self, db: Database = None, rpc: JsonRpcClient = None,
+                 ws_url: str = config.ALCHEMY_BASE_WS_URL, seen: SeenKeyIndex = None):
+        self.db = db or Database()
+        self.rpc = rpc
+        if self.rpc is None and config.ALCHEMY_BASE_URL:
+            self.rpc = JsonRpcClient(config.ALCHEMY_BASE_URL)
+        self.ws_url = ws_url
+        self._scan_lock = threading.Lock()
+        self._gaps_lock = threading.Lock()
+        self._stop_stream = threading.Event()
+        # Scans from the stream run on one thread that outlives each reconnect's
+        # event loop, so they keep a single pooled database connection
+        self._scan_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='blockchain-scan')
+        self._last_head_at = None
+        self.alert_latencies = deque(maxlen=1000)
+        self.labels = AddressLabelIndex(self.db)
+        self.seen = seen or SeenKeyIndex(self.db)
+        # Watched tokens keyed by lowercase address, thresholds pre-scaled to raw units
+        self.watched_tokens = {
+            address.lower(): dict(token, min_raw_amount=int(token['threshold'] * 10 ** token['decimals']))
+            for address, token in config.WATCHED_TOKENS.items()
+        }
+    
+    def setup(self):
+        """One-time setup before the first run"""
         self.seed_known_addresses()
+        self.labels.warm()
+        self.seen.warm(['tx'])
     
     def seed_known_addresses(self):
         """Seed database with known addresses"""
@@ -43,73 +78,313 @@ class BlockchainWorker:
             ('0x3fc91a3afd70395cd496c647d5a6cc9d4b2b7fad', 'Uniswap: Universal Router', 'defi'),
         ]
         
-        for address, label, category in known_addresses:
-            self.db.insert_known_address(address, label, category)
+        self.db.insert_known_addresses_many(known_addresses)
     
     def watch_whale_transfers(self):
-        """Watch for large transfers on Base"""
-        print(f"[Blockchain Worker] Watching for whale transfers at {datetime.now()}")
-        
-        if not self.w3 or not self.w3.is_connected():
-            print("[Blockchain Worker] Not connected to Base RPC")
+        """Poll for new blocks and scan everything since the persisted cursor, then backfill skipped ranges"""
+        if not self.rpc:
+            print("[Blockchain Worker] Base RPC not configured")
             return
         
-        try:
-            # Get latest block
-            latest_block = self.w3.eth.get_block('latest', full_transactions=True)
-            
-            print(f"[Blockchain Worker] Scanning block {latest_block['number']}")
+        # While the newHeads stream is delivering blocks, polling is only the fallback
+        if not self.stream_healthy():
+            print(f"[Blockchain Worker] Watching for whale transfers at {datetime.now()}")
+            try:
+                if self.catch_up() is None:
+                    print("[Blockchain Worker] Up to date")
             
-            # Process transactions in the block
-            for tx in latest_block['transactions']:
-                self.process_transaction(tx)
+            except Exception as e:
+                print(f"[Blockchain Worker] Error watching transfers: {e}")
         
+        try:
+            self.backfill_gaps()
         except Exception as e:
-            print(f"[Blockchain Worker] Error watching transfers: {e}")
+            print(f"[Blockchain Worker] Error backfilling skipped blocks: {e}")
     
-    def process_transaction(self, tx):
-        """Process a single transaction"""
-        try:
-            # Check if it's a USDC transfer (simplified)
-            if tx['to'] and tx['to'].lower() == config.USDC_BASE_ADDRESS.lower():
-                # This is an interaction with USDC contract
-                # In reality, we'd decode the calldata to get transfer details
-                # For now, we'll generate sample data
-                pass
+    def catch_up(self, head: int = None) -> Optional[Dict[str, float]]:
+        """Scan from the persisted cursor to head (default: current chain head).
+        
+        Returns the scan stats, or None if there was nothing new to scan.
+        """
+        with self._scan_lock:
+            # Pick up labels imported since the last scan
+            self.labels.refresh()
             
-            # Check for large ETH transfers
-            value_eth = self.w3.from_wei(tx['value'], 'ether')
-            if value_eth >= config.WHALE_THRESHOLD_ETH:
-                self.record_whale_alert(tx, value_eth, 'ETH')
+            if head is None:
+                head = self.rpc.block_number()
+            cursor = self.db.get_state(CURSOR_KEY)
+            start = int(cursor) + 1 if cursor is not None else head
+            
+            # After long downtime, skip ahead rather than stall the live feed;
+            # the gap is recorded and scanned by backfill_gaps()
+            if head - start + 1 > config.BLOCKCHAIN_MAX_CATCHUP_BLOCKS:
+                skipped_to = head - config.BLOCKCHAIN_MAX_CATCHUP_BLOCKS + 1
+                print(f"[Blockchain Worker] {head - start + 1} blocks behind, deferring "
+                      f"{start}-{skipped_to - 1} to backfill")
+                self.record_gap(start, skipped_to - 1)
+                start = skipped_to
+            
+            if start > head:
+                return None
+            
+            return self.scan_range(start, head, CURSOR_KEY)
+    
+    def stream(self):
+        """Process blocks as newHeads notifications arrive, reconnecting with backoff.
         
-        except Exception as e:
-            print(f"[Blockchain Worker] Error processing transaction: {e}")
+        Every connection first catches up from the persisted cursor, so reconnects
+        never lose blocks. While the stream is down or stale, the scheduled
+        watch_whale_transfers() polling takes over.
+        """
+        failures = 0
+        while not self._stop_stream.is_set():
+            try:
+                asyncio.run(self._stream_new_heads())
+                failures = 0
+            except Exception as e:
+                failures += 1
+                delay = min(2 ** failures, config.BLOCKCHAIN_WS_MAX_BACKOFF)
+                print(f"[Blockchain Worker] newHeads stream down ({e}), "
+                      f"polling until reconnect in {delay}s")
+                self._stop_stream.wait(delay)
+            finally:
+                self._last_head_at = None
+    
+    def stop_stream(self):
+        self._stop_stream.set()
     
-    def record_whale_alert(self, tx, amount, token_symbol):
-        """Record a whale alert"""
+    def stream_healthy(self) -> bool:
+        """True while the newHeads stream has delivered a head recently"""
+        last_head_at = self._last_head_at
+        return last_head_at is not None and time.monotonic() - last_head_at < config.BLOCKCHAIN_WS_STALE_AFTER
+    
+    async def _stream_new_heads(self):
+        async with websockets.connect(self.ws_url) as ws:
+            await ws.send(json.dumps({
+                'jsonrpc': '2.0', 'id': 1, 'method': 'eth_subscribe', 'params': ['newHeads'],
+            }))
+            reply = json.loads(await ws.recv())
+            if 'error' in reply:
+                raise JsonRpcError('eth_subscribe', reply['error'])
+            print(f"[Blockchain Worker] Subscribed to newHeads ({reply.get('result')})")
+            
+            # Resume from the cursor before handling live heads
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._scan_executor, self._catch_up_from_stream, None)
+            self._last_head_at = time.monotonic()
+            
+            while not self._stop_stream.is_set():
+                try:
+                    message = await asyncio.wait_for(ws.recv(), timeout=config.BLOCKCHAIN_WS_STALE_AFTER)
+                except asyncio.TimeoutError:
+                    raise ConnectionError(f"no new heads for {config.BLOCKCHAIN_WS_STALE_AFTER}s")
+                
+                head = json.loads(message).get('params', {}).get('result')
+                if not head:
+                    continue
+                self._last_head_at = time.monotonic()
+                await loop.run_in_executor(self._scan_executor, self._catch_up_from_stream, int(head['number'], 16))
+    
+    def _catch_up_from_stream(self, head: Optional[int]):
         try:
-            sender_address = tx['from']
-            receiver_address = tx['to'] or 'Contract Creation'
+            self.catch_up(head)
+        except MissingBlocksError as e:
+            # The HTTP node has not served this head yet; the cursor did not
+            # move, so the next head scans these blocks again
+            print(f"[Blockchain Worker] {e}; retrying on the next head")
+    
+    def latency_stats(self) -> Dict[str, float]:
+        """Block timestamp to whale_alerts insert latency over recent alerts, in seconds"""
+        latencies = sorted(self.alert_latencies)
+        if not latencies:
+            return {'count': 0}
+        return {
+            'count': len(latencies),
+            'p50': latencies[len(latencies) // 2],
+            'p95': latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)],
+            'max': latencies[-1],
+        }
+    
+    def backfill(self, start: int, end: int, max_blocks: int = None) -> bool:
+        """Scan a historical block range, resuming from its own checkpoint.
+        
+        With max_blocks, scans at most that many blocks of the range this call.
+        Returns True once the whole range has been scanned.
+        """
+        checkpoint_key = f"{CURSOR_KEY}:backfill:{start}-{end}"
+        checkpoint = self.db.get_state(checkpoint_key)
+        resume_from = int(checkpoint) + 1 if checkpoint is not None else start
+        
+        if resume_from > end:
+            print(f"[Blockchain Worker] Backfill {start}-{end} already complete")
+            return True
+        
+        stop = end if max_blocks is None else min(end, resume_from + max_blocks - 1)
+        self.labels.refresh()
+        print(f"[Blockchain Worker] Backfilling blocks {resume_from}-{stop} of {start}-{end}")
+        self.scan_range(resume_from, stop, checkpoint_key)
+        return stop == end
+    
+    def record_gap(self, start: int, end: int):
+        """Persist a block range skipped by catch_up() for backfill_gaps().
+        
+        Blocks already in a recorded range are left out, so a catch_up() that
+        fails after recording its gap and is retried adds only the new blocks.
+        Existing ranges keep their bounds and with them their backfill checkpoints.
+        """
+        with self._gaps_lock:
+            gaps = json.loads(self.db.get_state(GAPS_KEY, '[]'))
+            pieces = [(start, end)]
+            for gap_start, gap_end in gaps:
+                pieces = [
+                    piece
+                    for piece_start, piece_end in pieces
+                    for piece in ((piece_start, min(piece_end, gap_start - 1)),
+                                  (max(piece_start, gap_end + 1), piece_end))
+                    if piece[0] <= piece[1]
+                ]
+            if pieces:
+                gaps = sorted(gaps + [list(piece) for piece in pieces])
+                self.db.set_state(GAPS_KEY, json.dumps(gaps))
+    
+    def backfill_gaps(self, max_blocks: int = config.BLOCKCHAIN_GAP_BACKFILL_BLOCKS) -> int:
+        """Backfill skipped ranges oldest first, at most max_blocks per call; returns ranges left"""
+        # Shares the scan lock with catch_up() so the two never scan or refresh labels at once
+        with self._scan_lock:
+            gaps = json.loads(self.db.get_state(GAPS_KEY, '[]'))
+            if not gaps:
+                return 0
+            start, end = gaps[0]
+            if self.backfill(start, end, max_blocks):
+                with self._gaps_lock:
+                    gaps = json.loads(self.db.get_state(GAPS_KEY, '[]'))
+                    gaps.remove([start, end])
+                    self.db.set_state(GAPS_KEY, json.dumps(gaps))
+            return len(gaps)
+    
+    def scan_range(self, start: int, end: int, cursor_key: str) -> Dict[str, float]:
+        """Scan blocks start..end inclusive, checkpointing cursor_key after each chunk.
+        
+        Alerts and the cursor are written per chunk; a crash between the two just
+        rescans that chunk, and duplicate alerts are ignored on insert.
+        """
+        started = time.perf_counter()
+        blocks_scanned = 0
+        alerts_inserted = 0
+        
+        for chunk_start in range(start, end + 1, config.BLOCKCHAIN_SCAN_CHUNK):
+            chunk_end = min(chunk_start + config.BLOCKCHAIN_SCAN_CHUNK - 1, end)
+            alerts = []
+            if config.BLOCKCHAIN_SCAN_MODE in ('blocks', 'all'):
+                alerts += self.scan_blocks(chunk_start, chunk_end)
+            if config.BLOCKCHAIN_SCAN_MODE in ('logs', 'all'):
+                alerts += self.scan_transfer_logs(chunk_start, chunk_end)
             
-            sender_label = self.db.get_address_label(sender_address) or 'Unknown Wallet'
-            receiver_label = self.db.get_address_label(receiver_address) or 'Unknown Wallet'
+            # whale_alerts keeps one row per tx_hash. A tx can carry several large
+            # transfers (ETH and token logs, or many logs), so keep its first alert,
+            # the one the insert would store, and report exactly that row
+            by_hash = {}
+            for alert in alerts:
+                by_hash.setdefault(alert['tx_hash'], alert)
             
-            alert_id = self.db.insert_whale_alert(
-                tx_hash=tx['hash'].hex(),
-                sender_address=sender_address,
-                sender_label=sender_label,
-                receiver_address=receiver_address,
-                receiver_label=receiver_label,
-                token_symbol=token_symbol,
-                amount=float(amount),
-                timestamp=datetime.now()
-            )
+            # Write the whole chunk in one transaction, then advance the cursor
+            result = self.db.insert_whale_alerts_many(list(by_hash.values()))
+            self.seen.add('tx', result['inserted'] + result['duplicates'])
+            inserted_at = datetime.now()
+            for tx_hash in result['inserted']:
+                alert = by_hash[tx_hash]
+                self.alert_latencies.append((inserted_at - alert['timestamp']).total_seconds())
+                print(f"[Blockchain Worker] Whale alert: {alert['amount']} {alert['token_symbol']} from {alert['sender_label']}")
+            self.db.set_state(cursor_key, chunk_end)
             
-            if alert_id:
-                print(f"[Blockchain Worker] Whale alert: {amount} {token_symbol} from {sender_label}")
+            blocks_scanned += chunk_end - chunk_start + 1
+            alerts_inserted += len(result['inserted'])
+        
+        elapsed = time.perf_counter() - started
+        print(f"[Blockchain Worker] Scanned blocks {start}-{end} "
+              f"({blocks_scanned / max(elapsed, 1e-9):,.0f} blocks/s, {alerts_inserted} new alerts)")
+        return {'blocks': blocks_scanned, 'alerts': alerts_inserted, 'seconds': elapsed}
+    
+    def scan_blocks(self, start: int, end: int) -> List[dict]:
+        """Walk full transaction bodies for large native ETH transfers"""
+        alerts = []
+        for block in self.rpc.get_blocks(range(start, end + 1)):
+            for tx in block['transactions']:
+                alert = self.process_transaction(tx, block)
+                if alert:
+                    alerts.append(alert)
+        return alerts
+    
+    def scan_transfer_logs(self, start: int, end: int) -> List[dict]:
+        """Pull ERC-20 Transfer logs for every watched token in one eth_getLogs call"""
+        logs = self.rpc.get_logs(start, end, list(self.watched_tokens), [TRANSFER_TOPIC])
+        
+        # Keep only transfers over their token's threshold, compared in raw units
+        transfers = []
+        for log in logs:
+            token = self.watched_tokens.get(log['address'].lower())
+            if token is None or len(log['topics']) != 3:
+                continue
+            value = int(log['data'], 16) if log['data'] not in ('0x', '') else 0
+            if value >= token['min_raw_amount'] and not self.seen.seen('tx', log['transactionHash']):
+                transfers.append((log, token, value))
+        
+        if not transfers:
+            return []
+        
+        # Logs don't always carry a timestamp; fetch headers only for blocks with alerts
+        timestamps = {}
+        missing = sorted({int(log['blockNumber'], 16) for log, _, _ in transfers if 'blockTimestamp' not in log})
+        for block in self.rpc.get_blocks(missing, full_transactions=False):
+            timestamps[int(block['number'], 16)] = int(block['timestamp'], 16)
+        
+        alerts = []
+        for log, token, value in transfers:
+            timestamp = log.get('blockTimestamp')
+            timestamp = int(timestamp, 16) if timestamp else timestamps.get(int(log['blockNumber'], 16))
+            alerts.append(self.build_whale_alert(
+                {
+                    'hash': log['transactionHash'],
+                    'from': '0x' + log['topics'][1][-40:],
+                    'to': '0x' + log['topics'][2][-40:],
+                },
+                value / 10 ** token['decimals'],
+                token['symbol'],
+                datetime.fromtimestamp(timestamp) if timestamp else None,
+                token_address=log['address'].lower(),
+            ))
+        return alerts
+    
+    def process_transaction(self, tx: dict, block: dict = None) -> Optional[dict]:
+        """Process a single JSON-RPC transaction, returning a whale alert row if it qualifies"""
+        try:
+            # Check for large ETH transfers
+            value_wei = int(tx['value'], 16)
+            if value_wei >= config.WHALE_THRESHOLD_ETH * WEI_PER_ETH and not self.seen.seen('tx', tx['hash']):
+                timestamp = datetime.fromtimestamp(int(block['timestamp'], 16)) if block else datetime.now()
+                return self.build_whale_alert(tx, value_wei / WEI_PER_ETH, 'ETH', timestamp)
         
         except Exception as e:
-            print(f"[Blockchain Worker] Error recording alert: {e}")
+            print(f"[Blockchain Worker] Error processing transaction: {e}")
+        return None
+    
+    def build_whale_alert(self, tx, amount, token_symbol, timestamp: datetime = None,
+                          token_address: str = None) -> dict:
+        """Build a whale alert row for a transaction"""
+        sender_address = tx['from']
+        receiver_address = tx['to'] or 'Contract Creation'
+        
+        return {
+            'tx_hash': tx['hash'],
+            'sender_address': sender_address,
+            'sender_label': self.labels.get(sender_address) or 'Unknown Wallet',
+            'receiver_address': receiver_address,
+            'receiver_label': self.labels.get(receiver_address) or 'Unknown Wallet',
+            'token_symbol': token_symbol,
+            'token_address': token_address,
+            'amount': float(amount),
+            'timestamp': timestamp or datetime.now(),
+        }
     
     def seed_initial_data(self):
         """Seed database with initial whale alerts"""
@@ -162,10 +437,25 @@ class BlockchainWorker:
 def run_once():
     """Run the blockchain worker once"""
     worker = BlockchainWorker()
+    worker.setup()
     worker.seed_initial_data()
     # Uncomment when Alchemy URL is configured
     # worker.watch_whale_transfers()
 
+def run_backfill(start: int, end: int):
+    """Scan a historical block range, resuming if interrupted"""
+    worker = BlockchainWorker()
+    worker.setup()
+    worker.backfill(start, end)
+
 if __name__ == '__main__':
-    run_once()
+    parser = argparse.ArgumentParser(description='MicroTerm blockchain worker')
+    parser.add_argument('--backfill', nargs=2, type=int, metavar=('START', 'END'),
+                        help='scan a historical block range instead of seeding')
+    args = parser.parse_args()
+    
+    if args.backfill:
+        run_backfill(*args.backfill)
+    else:
+        run_once()
 
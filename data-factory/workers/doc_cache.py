@@ -0,0 +1,156 @@
+"""
+Compressed on-disk cache for immutable documents such as EDGAR filings
+"""
+
+import gzip
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import config
+
+class DocumentCache:
+    """Size-bounded, gzip-compressed document store shared by any number of processes.
+
+    Each key (e.g. "<accession>/primary_doc.xml") maps to a file named by the
+    SHA-256 of the key, sharded by its first two hex digits. Writes go to a
+    temp file in the same directory and are os.replace()d into place, so a
+    reader in any process sees either the whole document or none of it.
+    A hit bumps the file's mtime; once the cache outgrows max_bytes the
+    least recently used files are deleted down to EVICT_TO of the limit.
+    A reader that loses a race with eviction just sees a miss. Temp files
+    left by a process that died mid-write are swept on startup once they
+    are older than TMP_MAX_AGE seconds (younger ones may be another
+    process's write in progress).
+    """
+
+    EVICT_TO = 0.9
+    TMP_MAX_AGE = 3600
+
+    def __init__(self, root: str = config.DOC_CACHE_DIR, max_bytes: int = config.DOC_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None  # bytes on disk, measured on first write
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.bytes_served = 0
+        self._sweep_temp_files()
+
+    def path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.root, digest[:2], digest[2:] + '.gz')
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Cached document, or None on a miss"""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = gzip.decompress(f.read())
+        except (FileNotFoundError, OSError, EOFError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(path)  # LRU order is file mtime, shared across processes
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+            self.bytes_served += len(data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Store a document atomically, evicting old entries if over the size limit"""
+        path = self.path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        compressed = gzip.compress(data, compresslevel=6)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            self.writes += 1
+            if self._size is None:
+                self._size = sum(size for _, _, size in self._scan())
+            else:
+                self._size += len(compressed)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        """(mtime, path, size) of every cached file"""
+        files = []
+        if not os.path.isdir(self.root):
+            return files
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith('.gz'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # evicted by another process mid-scan
+                files.append((stat.st_mtime, entry.path, stat.st_size))
+        return files
+
+    def _sweep_temp_files(self):
+        if not os.path.isdir(self.root):
+            return
+        cutoff = time.time() - self.TMP_MAX_AGE
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass  # swept or renamed into place by another process
+
+    def _evict(self):
+        # Rescan rather than trust the running total, since other processes write too
+        files = sorted(self._scan())
+        size = sum(file_size for _, _, file_size in files)
+        target = self.max_bytes * self.EVICT_TO
+        for _, path, file_size in files:
+            if size <= target:
+                break
+            try:
+                os.unlink(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            size -= file_size
+        self._size = size
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'writes': self.writes,
+            'evictions': self.evictions,
+            'bytes_served': self.bytes_served,
+        }
@@ -0,0 +1,130 @@
+"""
+Streaming reader for EDGAR full-index and daily-index files (form.idx, master.idx)
+"""
+
+import os
+import re
+from datetime import datetime
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import requests
+
+import config
+
+QUARTER_RE = re.compile(r'^(\d{4})Q([1-4])$', re.IGNORECASE)
+READ_CHUNK = 64 * 1024
+
+class IndexRow(NamedTuple):
+    form_type: str
+    company_name: str
+    cik: str
+    date_filed: str
+    file_name: str  # e.g. edgar/data/1975835/0001975835-24-000002.txt
+
+def quarterly_index_urls(start: str, end: str, kind: str = 'form') -> List[str]:
+    """full-index URLs for every quarter from start to end inclusive, e.g. '2023Q3'..'2024Q2'"""
+    bounds = []
+    for quarter in (start, end):
+        match = QUARTER_RE.match(quarter)
+        if not match:
+            raise ValueError(f"expected a quarter like 2024Q1, got {quarter!r}")
+        bounds.append(int(match.group(1)) * 4 + int(match.group(2)) - 1)
+    return [
+        f"{config.SEC_ARCHIVES_URL}/full-index/{index // 4}/QTR{index % 4 + 1}/{kind}.idx"
+        for index in range(bounds[0], bounds[1] + 1)
+    ]
+
+def archives_url_for(source: str) -> str:
+    """Archive root that an index file's filing paths are relative to"""
+    for marker in ('/full-index/', '/daily-index/'):
+        if source.startswith(('http://', 'https://')) and marker in source:
+            return source.split(marker, 1)[0]
+    return config.SEC_ARCHIVES_URL
+
+def filing_index_url(row: IndexRow, archives_url: str = config.SEC_ARCHIVES_URL) -> str:
+    """Filing index page for an index row, in the same form as the current-filings feed links"""
+    accession = os.path.splitext(os.path.basename(row.file_name))[0]
+    return f"{archives_url}/data/{int(row.cik)}/{accession.replace('-', '')}/{accession}-index.htm"
+
+def parse_date_filed(value: str) -> datetime:
+    """Date Filed column; older indexes use YYYYMMDD"""
+    return datetime.strptime(value, '%Y-%m-%d' if '-' in value else '%Y%m%d')
+
+def parse_form_idx_line(line: str) -> Optional[IndexRow]:
+    """Fixed-width form.idx row: form type, company, CIK, date filed, file name"""
+    # Company names contain single spaces, so peel the last three fields off
+    # the right and split the rest at the first run of 2+ spaces
+    parts = line.rsplit(None, 3)
+    if len(parts) != 4:
+        return None
+    head = re.split(r'\s{2,}', parts[0].strip(), maxsplit=1)
+    if len(head) != 2:
+        return None
+    return IndexRow(head[0], head[1], parts[1], parts[2], parts[3])
+
+def parse_master_idx_line(line: str) -> Optional[IndexRow]:
+    """Pipe-delimited master.idx row: CIK|Company Name|Form Type|Date Filed|Filename"""
+    parts = line.split('|')
+    if len(parts) != 5:
+        return None
+    cik, company_name, form_type, date_filed, file_name = (part.strip() for part in parts)
+    return IndexRow(form_type, company_name, cik, date_filed, file_name)
+
+def _read_chunks(source: str, offset: int, session: requests.Session,
+                 headers: Dict[str, str]) -> Iterator[bytes]:
+    """Raw bytes of a local index file or URL, starting at byte offset"""
+    if not source.startswith(('http://', 'https://')):
+        with open(source, 'rb') as f:
+            f.seek(offset)
+            while True:
+                chunk = f.read(READ_CHUNK)
+                if not chunk:
+                    return
+                yield chunk
+
+    # identity encoding so byte offsets mean the same thing on every request
+    request_headers = dict(headers or {}, **{'Accept-Encoding': 'identity'})
+    if offset:
+        request_headers['Range'] = f"bytes={offset}-"
+    with session.get(source, headers=request_headers, stream=True, timeout=config.HTTP_TIMEOUT) as response:
+        if response.status_code == 416:
+            return  # offset is already at the end
+        response.raise_for_status()
+        skip = offset if response.status_code != 206 else 0  # server ignored the Range
+        for chunk in response.iter_content(READ_CHUNK):
+            if skip:
+                if len(chunk) <= skip:
+                    skip -= len(chunk)
+                    continue
+                chunk, skip = chunk[skip:], 0
+            yield chunk
+
+def stream_index(source: str, offset: int = 0, session: requests.Session = None,
+                 headers: Dict[str, str] = None) -> Iterator[Tuple[Optional[IndexRow], int]]:
+    """Yield (row, end offset) for each data line of an index file or URL.
+
+    Reads fixed-size chunks, so memory stays constant whatever the index size.
+    The end offset is the byte position just past the line and can be passed
+    back as offset to resume there (sent as an HTTP Range for URLs). Header
+    lines are skipped; rows that fail to parse are yielded as None so the
+    offset still advances.
+    """
+    parse = parse_master_idx_line if 'master' in os.path.basename(source) else parse_form_idx_line
+    in_data = offset > 0  # a resume offset is always past the header
+    position = offset
+    pending = b''
+
+    for chunk in _read_chunks(source, offset, session or requests.Session(), headers):
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for raw in lines:
+            position += len(raw) + 1
+            line = raw.decode('latin-1').rstrip('\r')
+            if not in_data:
+                in_data = line.startswith('---')
+                continue
+            if line.strip():
+                yield parse(line), position
+
+    if pending.strip() and in_data:
+        yield parse(pending.decode('latin-1').rstrip('\r')), position + len(pending)
@@ -0,0 +1,103 @@
+"""
+RSS/Atom fetching with conditional GET and a persisted per-feed state
+"""
+
+import hashlib
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import feedparser
+import requests
+
+from database.models import Database
+from workers.ratelimit import HostRateLimiter
+import config
+
+# First <item> (RSS) or <entry> (Atom) element in a feed body
+FIRST_ENTRY_RE = re.compile(rb'<(item|entry)[\s>].*?</\1>', re.DOTALL)
+
+def newest_entry_fingerprint(body: bytes) -> str:
+    """Hash of the first entry in a feed, or of the whole body if none is found.
+
+    Feeds list the newest entry first, so an unchanged first entry means
+    nothing new was published even if channel metadata like lastBuildDate moved.
+    """
+    match = FIRST_ENTRY_RE.search(body)
+    return hashlib.sha1(match.group(0) if match else body).hexdigest()
+
+class FeedValidators(NamedTuple):
+    """Validators of a parsed feed, stored by FeedFetcher.commit() once its entries are saved"""
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fingerprint: str
+    body_size: int
+
+class FeedFetcher:
+    """Fetches feeds, skipping the download on 304 and the parse on an unchanged newest entry.
+
+    Every request first waits for its host's token bucket, so fetch_many() can
+    run many feeds at once while each host still sees a bounded request rate.
+    The worker threads live as long as the fetcher, so their database
+    connections are opened once rather than on every poll.
+    """
+
+    def __init__(self, db: Database, session: requests.Session = None,
+                 limiter: HostRateLimiter = None,
+                 max_workers: int = config.FEED_FETCH_CONCURRENCY):
+        self.db = db
+        self.session = session or requests.Session()
+        self.limiter = limiter or HostRateLimiter()
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='feeds')
+
+    def fetch(self, url: str, headers: Dict[str, str] = None
+              ) -> Tuple[Optional[feedparser.FeedParserDict], Optional[FeedValidators]]:
+        """Return the parsed feed and its validators, or (None, None) if nothing changed.
+        
+        The validators of a parsed feed are not stored here: the caller passes
+        them to commit() after its entries are saved, so a failure while
+        processing them makes the next fetch download and parse the feed again.
+        """
+        state = self.db.get_feed_state(url) or {}
+        request_headers = dict(headers or {})
+        if state.get('etag'):
+            request_headers['If-None-Match'] = state['etag']
+        if state.get('last_modified'):
+            request_headers['If-Modified-Since'] = state['last_modified']
+
+        self.limiter.acquire(url)
+        response = self.session.get(url, headers=request_headers, timeout=config.HTTP_TIMEOUT)
+        if response.status_code == 304:
+            self.db.record_feed_fetch(url, 'not_modified')
+            return None, None
+        response.raise_for_status()
+
+        body = response.content
+        fingerprint = newest_entry_fingerprint(body)
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if fingerprint == state.get('fingerprint'):
+            self.db.record_feed_fetch(url, 'unchanged', etag, last_modified, fingerprint, len(body))
+            return None, None
+
+        return feedparser.parse(body), FeedValidators(etag, last_modified, fingerprint, len(body))
+
+    def commit(self, url: str, validators: FeedValidators):
+        """Store a parsed feed's validators once its entries have been processed"""
+        self.db.record_feed_fetch(url, 'parsed', *validators)
+
+    def fetch_many(self, urls: List[str], headers: Dict[str, str] = None
+                   ) -> Iterator[Tuple[str, Optional[feedparser.FeedParserDict],
+                                       Optional[FeedValidators], Optional[Exception]]]:
+        """Fetch feeds concurrently, yielding (url, feed, validators, error) as each completes"""
+        if not urls:
+            return
+        futures = {self.executor.submit(self.fetch, url, headers): url for url in urls}
+        for future in as_completed(futures):
+            try:
+                feed, validators = future.result()
+            except Exception as e:
+                yield futures[future], None, None, e
+                continue
+            yield futures[future], feed, validators, None
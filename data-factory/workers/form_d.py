@@ -0,0 +1,147 @@
+"""
+Form D primary_doc.xml resolution, streaming parse and concurrent fetch
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from lxml import etree
+
+from workers.doc_cache import DocumentCache
+from workers.ratelimit import HostRateLimiter
+import config
+
+# Filing index links look like /Archives/edgar/data/<cik>/<accession without dashes>/...
+FILING_PATH_RE = re.compile(r'/Archives/edgar/data/(\d+)/(\d{18})(?:/|$)')
+
+# Leaf elements read from the submission; everything else is skipped
+FORM_D_FIELDS = {
+    'submissionType': 'submission_type',
+    'industryGroupType': 'industry_group',
+    'investmentFundType': 'fund_type',
+    'totalOfferingAmount': 'total_offering_amount',
+    'totalAmountSold': 'total_amount_sold',
+}
+
+# Only these elements produce events; the repeated blocks are there to be cleared
+ITERPARSE_TAGS = ['{*}' + name for name in (
+    *FORM_D_FIELDS, 'entityName', 'cik', 'offeringSalesAmounts', 'issuer', 'relatedPersonInfo',
+)]
+
+def primary_doc_url(filing_url: str) -> Optional[str]:
+    """URL of the Form D XML for a filing index link, on the same host"""
+    parts = urlsplit(filing_url)
+    match = FILING_PATH_RE.search(parts.path)
+    if not match:
+        return None
+    cik, accession = match.groups()
+    path = f"/Archives/edgar/data/{int(cik)}/{accession}/primary_doc.xml"
+    return urlunsplit((parts.scheme, parts.netloc, path, '', ''))
+
+def document_key(url: str) -> Optional[str]:
+    """Cache key for an EDGAR archive document: '<accession>/<file name>', independent of host"""
+    path = urlsplit(url).path
+    match = FILING_PATH_RE.search(path)
+    if not match:
+        return None
+    cik, accession = match.groups()
+    return f"{accession[:10]}-{accession[10:12]}-{accession[12:]}/{path.rsplit('/', 1)[-1]}"
+
+def parse_amount(value: Optional[str]) -> Optional[float]:
+    """Dollar amount from a Form D field; None for 'Indefinite' or blank"""
+    try:
+        return float(value.replace(',', '').replace('$', '')) if value else None
+    except ValueError:
+        return None
+
+def parse_form_d(source: Union[bytes, BinaryIO]) -> Dict[str, Any]:
+    """Issuer, industry group and offering amounts from a Form D submission.
+
+    Parses with iterparse, receiving events only for the fields read, and
+    stops at the end of offeringSalesAmounts, so signatures and anything
+    after the amounts are never parsed. Namespaced and plain documents are
+    both accepted.
+    """
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+
+    form = {'issuer': None, 'cik': None, 'submission_type': None, 'industry_group': None,
+            'fund_type': None, 'total_offering_amount': None, 'total_amount_sold': None}
+    context = etree.iterparse(source, events=('end',), tag=ITERPARSE_TAGS, resolve_entities=False,
+                              no_network=True, remove_comments=True, remove_pis=True)
+    for _, elem in context:
+        name = etree.QName(elem).localname
+        if name in FORM_D_FIELDS:
+            form[FORM_D_FIELDS[name]] = (elem.text or '').strip() or None
+        elif name in ('entityName', 'cik'):
+            # Only the primary issuer; issuerList repeats these for co-issuers
+            if etree.QName(elem.getparent()).localname == 'primaryIssuer':
+                form['issuer' if name == 'entityName' else 'cik'] = (elem.text or '').strip() or None
+        elif name == 'offeringSalesAmounts':
+            break
+        else:
+            # Repeated blocks (co-issuers, related persons) are dropped as soon
+            # as they close, so memory stays flat however many a filing lists
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+    del context
+
+    form['total_offering_amount'] = parse_amount(form['total_offering_amount'])
+    form['total_amount_sold'] = parse_amount(form['total_amount_sold'])
+    return form
+
+class FormDFetcher:
+    """Fetches and parses primary_doc.xml for many filings at once under the per-host rate limit.
+
+    Filed documents are immutable, so with a cache each one is downloaded at
+    most once across runs, restarts and backfills.
+    """
+
+    def __init__(self, session: requests.Session = None, limiter: HostRateLimiter = None,
+                 headers: Dict[str, str] = None, max_workers: int = config.SEC_FETCH_CONCURRENCY,
+                 cache: DocumentCache = None):
+        self.session = session or requests.Session()
+        self.limiter = limiter or HostRateLimiter()
+        self.cache = cache
+        self.headers = headers or {'User-Agent': config.SEC_USER_AGENT}
+        self.max_workers = max_workers
+
+    def fetch(self, filing_url: str) -> Dict[str, Any]:
+        """Parsed Form D for a filing index link"""
+        url = primary_doc_url(filing_url)
+        if url is None:
+            raise ValueError(f"not an EDGAR filing link: {filing_url}")
+        return parse_form_d(self.fetch_document(url))
+    
+    def fetch_document(self, url: str) -> bytes:
+        """Raw bytes of an EDGAR archive document, from the cache when present"""
+        key = document_key(url) if self.cache else None
+        if key:
+            data = self.cache.get(key)
+            if data is not None:
+                return data
+
+        self.limiter.acquire(url)
+        response = self.session.get(url, headers=self.headers, timeout=config.HTTP_TIMEOUT)
+        response.raise_for_status()
+        if key:
+            self.cache.put(key, response.content)
+        return response.content
+
+    def fetch_many(self, filing_urls: List[str]
+                   ) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[Exception]]]:
+        """Fetch filings concurrently, yielding (filing_url, form or None, error or None) as each completes"""
+        if not filing_urls:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(filing_urls))) as executor:
+            futures = {executor.submit(self.fetch, url): url for url in filing_urls}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as e:
+                    yield futures[future], None, e
@@ -0,0 +1,65 @@
+"""
+Streaming HTML-to-text extraction for feed summaries
+"""
+
+import re
+from html import unescape
+
+# One token per match: a comment, a script/style element with its body,
+# a tag, a stray '<' that starts no tag, or a run of text
+TOKEN_RE = re.compile(
+    r'<!--.*?(?:-->|$)'
+    r'|<(script|style)\b[^>]*>.*?(?:</\1\s*>|$)'
+    r'|</?([a-zA-Z][a-zA-Z0-9]*)[^>]*>?'
+    r'|<[!?][^>]*>?'
+    r'|<'
+    r'|[^<]+',
+    re.DOTALL | re.IGNORECASE,
+)
+
+# Tags that separate words even without surrounding whitespace
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'figcaption',
+    'figure', 'footer', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'img', 'li',
+    'ol', 'p', 'pre', 'section', 'table', 'td', 'th', 'tr', 'ul',
+}
+
+# Keep cutting at a word boundary unless that would drop more than this share
+MIN_WORD_CUT = 0.6
+
+def html_to_text(html: str, max_chars: int = None) -> str:
+    """Visible text of an HTML fragment with entities decoded and whitespace collapsed.
+
+    With max_chars, tokenizing stops as soon as more than max_chars characters
+    of text are collected, so long bodies are never scanned to the end.
+    """
+    parts = []
+    collected = 0
+    for match in TOKEN_RE.finditer(html):
+        token = match.group(0)
+        if token[0] == '<' and len(token) > 1:
+            tag = match.group(2)
+            if tag and tag.lower() in BLOCK_TAGS:
+                parts.append(' ')
+            continue
+
+        if '&' in token:
+            token = unescape(token)
+        parts.append(token)
+        collected += len(token)
+        # Raw length overcounts collapsible whitespace, so confirm before stopping
+        if max_chars is not None and collected > max_chars and len(' '.join(''.join(parts).split())) > max_chars:
+            break
+
+    return ' '.join(''.join(parts).split())
+
+def summarize_html(html: str, max_chars: int = 200, ellipsis: str = '...') -> str:
+    """Plain-text summary of at most max_chars characters (plus ellipsis), cut between words"""
+    text = html_to_text(html, max_chars)
+    if len(text) <= max_chars:
+        return text
+
+    cut = text.rfind(' ', 0, max_chars + 1)
+    if cut < max_chars * MIN_WORD_CUT:
+        cut = max_chars  # one very long word; cut inside it
+    return text[:cut].rstrip(' ,;:-') + ellipsis
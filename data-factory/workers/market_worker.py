@@ -1,62 +1,100 @@
 import yfinance as yf
+import numpy as np
+import pandas as pd
 from datetime import datetime
+from typing import Any, Callable, Dict, List
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database.models import Database
+import config
+
+# A market data source takes a list of tickers and returns daily bars as a
+# DataFrame with (field, ticker) columns, at least 'Close' and 'Volume'
+MarketSource = Callable[[List[str]], pd.DataFrame]
+
+def yahoo_download(tickers: List[str], period: str = config.MARKET_HISTORY_PERIOD) -> pd.DataFrame:
+    """Daily bars for every ticker from one multi-symbol Yahoo Finance download"""
+    frame = yf.download(tickers, period=period, interval='1d', group_by='column',
+                        auto_adjust=False, threads=True, progress=False)
+    if frame.columns.nlevels == 1:
+        # A single ticker comes back with plain field columns
+        frame.columns = pd.MultiIndex.from_product([frame.columns, tickers[:1]])
+    return frame
+
+def compute_snapshots(frame: pd.DataFrame, tickers: List[str]) -> List[Dict[str, Any]]:
+    """Latest price, change since the previous close and volume for every ticker with data.
+    
+    Works on the Close and Volume columns as (days x tickers) arrays in one
+    vectorized pass. Stocks have no bars on weekends while crypto does, so
+    each ticker uses its own last and previous non-missing closes rather than
+    the frame's last two rows. Tickers with one bar report a change of 0;
+    tickers with none are left out.
+    """
+    if frame.empty:
+        return []
+    close = frame['Close'].reindex(columns=tickers).to_numpy(dtype=float)
+    volume = frame['Volume'].reindex(columns=tickers).to_numpy(dtype=float)
+    days = close.shape[0]
+    columns = np.arange(close.shape[1])
+    
+    valid = ~np.isnan(close)
+    counts = valid.sum(axis=0)
+    # argmax over the reversed mask finds the last valid row of each column
+    last = days - 1 - np.argmax(valid[::-1], axis=0)
+    valid[last, columns] = False
+    prev = days - 1 - np.argmax(valid[::-1], axis=0)
+    
+    price = close[last, columns]
+    prev_price = close[prev, columns]
+    has_change = (counts >= 2) & (prev_price != 0)
+    change = np.zeros_like(price)
+    np.divide(price - prev_price, prev_price, out=change, where=has_change)
+    change *= 100
+    volume_24h = np.nan_to_num(volume[last, columns])
+    
+    return [
+        {
+            'symbol': tickers[i].replace('-USD', ''),
+            'price': float(price[i]),
+            'change_24h': float(change[i]),
+            'volume_24h': float(volume_24h[i]),
+        }
+        for i in np.flatnonzero(counts)
+    ]
 
 class MarketWorker:
-    def __init__(self):
-        self.db = Database()
-        self.tickers = ['BTC-USD', 'ETH-USD', 'SOL-USD', 'NVDA', 'COIN']
+    def __init__(self, db: Database = None, source: MarketSource = None, tickers: List[str] = None):
+        self.db = db or Database()
+        self.source = source or yahoo_download
+        self.tickers = list(tickers or config.MARKET_TICKERS)
     
-    def fetch_market_data(self):
-        """Fetch market data for all tickers"""
-        print(f"[Market Worker] Fetching market data at {datetime.now()}")
+    def fetch_market_data(self) -> int:
+        """Fetch all tickers in one batched request and store their snapshots in one transaction"""
+        print(f"[Market Worker] Fetching {len(self.tickers)} tickers at {datetime.now()}")
         
-        for ticker in self.tickers:
-            try:
-                self.fetch_ticker_data(ticker)
-            except Exception as e:
-                print(f"[Market Worker] Error fetching {ticker}: {e}")
-    
-    def fetch_ticker_data(self, ticker: str):
-        """Fetch data for a single ticker"""
         try:
-            stock = yf.Ticker(ticker)
-            
-            # Get current price and stats
-            info = stock.info
-            
-            # Get historical data for 24h change
-            hist = stock.history(period='2d')
-            
-            if len(hist) >= 2:
-                current_price = hist['Close'].iloc[-1]
-                prev_price = hist['Close'].iloc[-2]
-                change_24h = ((current_price - prev_price) / prev_price) * 100
-                volume_24h = hist['Volume'].iloc[-1]
-            else:
-                current_price = info.get('currentPrice', 0)
-                change_24h = info.get('regularMarketChangePercent', 0)
-                volume_24h = info.get('volume', 0)
-            
-            # Update database
-            self.db.update_market_data(
-                symbol=ticker.replace('-USD', ''),
-                price=float(current_price),
-                change_24h=float(change_24h),
-                volume_24h=float(volume_24h)
-            )
-            
-            print(f"[Market Worker] Updated {ticker}: ${current_price:.2f} ({change_24h:+.2f}%)")
-        
+            frame = self.source(self.tickers)
         except Exception as e:
-            print(f"[Market Worker] Error fetching {ticker}: {e}")
+            print(f"[Market Worker] Error fetching market data: {e}")
+            return 0
+        
+        rows = compute_snapshots(frame, self.tickers)
+        if rows:
+            self.db.update_market_data_many(rows)
+        
+        missing = len(self.tickers) - len(rows)
+        print(f"[Market Worker] Updated {len(rows)} symbols"
+              + (f" ({missing} returned no data)" if missing else ""))
+        return len(rows)
     
     def seed_initial_data(self):
-        """Seed database with initial market data"""
+        """Seed placeholder snapshots into an empty database; ticks and bars only ever hold real data"""
+        if self.db.get_market_data():
+            print("[Market Worker] Market data present, skipping seed")
+            return
+        
         print("[Market Worker] Seeding initial market data...")
         
         sample_data = [
@@ -67,14 +105,8 @@ class MarketWorker:
             {'symbol': 'COIN', 'price': 234.67, 'change_24h': -0.8, 'volume_24h': 8_500_000},
         ]
         
-        for data in sample_data:
-            self.db.update_market_data(
-                symbol=data['symbol'],
-                price=data['price'],
-                change_24h=data['change_24h'],
-                volume_24h=data['volume_24h']
-            )
-            print(f"[Market Worker] Seeded: {data['symbol']}")
+        self.db.seed_market_data(sample_data)
+        print(f"[Market Worker] Seeded: {', '.join(data['symbol'] for data in sample_data)}")
 
 def run_once():
     """Run the market worker once"""
@@ -84,4 +116,3 @@ def run_once():
 
 if __name__ == '__main__':
     run_once()
-
@@ -1,90 +1,128 @@
-import feedparser
 import requests
 from datetime import datetime
-import time
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database.models import Database
+from database.seen_keys import SeenKeyIndex, canonicalize_url
+from workers.feeds import FeedFetcher
+from workers.html_text import summarize_html
+from workers.ratelimit import HostRateLimiter
+from workers.sentiment import SentimentEngine
 import config
 
 class NewsWorker:
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, db: Database = None, session: requests.Session = None,
+                 limiter: HostRateLimiter = None, seen: SeenKeyIndex = None):
+        self.db = db or Database()
+        self.session = session or requests.Session()
+        self.feeds = FeedFetcher(self.db, self.session, limiter)
+        self.seen = seen or SeenKeyIndex(self.db)
+        self.sentiment = SentimentEngine.from_config()
+    
+    def setup(self):
+        """One-time setup before the first run"""
+        self.seen.warm(['news'])
     
     def fetch_news(self):
         """Fetch news from RSS feeds"""
         print(f"[News Worker] Fetching news at {datetime.now()}")
         
-        for source_url in config.NEWS_SOURCES:
-            try:
-                self.fetch_from_source(source_url)
-                time.sleep(1)  # Rate limiting between sources
-            except Exception as e:
-                print(f"[News Worker] Error fetching from {source_url}: {e}")
+        # Feeds download concurrently (rate limited per host); rows are
+        # written here, one feed at a time, as each download completes
+        for source_url, feed, validators, error in self.feeds.fetch_many(config.NEWS_SOURCES):
+            if error:
+                print(f"[News Worker] Error fetching from {source_url}: {error}")
+                continue
+            if self.process_feed(source_url, feed) and validators:
+                self.feeds.commit(source_url, validators)
     
     def fetch_from_source(self, source_url: str):
         """Fetch news from a single RSS source"""
         try:
-            feed = feedparser.parse(source_url)
+            feed, validators = self.feeds.fetch(source_url)
+        except Exception as e:
+            print(f"[News Worker] Error fetching from {source_url}: {e}")
+            return
+        if self.process_feed(source_url, feed) and validators:
+            self.feeds.commit(source_url, validators)
+    
+    def process_feed(self, source_url: str, feed) -> bool:
+        """Store the newest articles of a fetched feed (None if unchanged); False if that failed"""
+        try:
+            if feed is None:
+                print(f"[News Worker] No changes from {source_url}")
+                return True
             
             if not feed.entries:
                 print(f"[News Worker] No entries from {source_url}")
-                return
+                return True
             
             print(f"[News Worker] Found {len(feed.entries)} articles from {source_url}")
             
+            articles = []
+            batch = set()
+            skipped = 0
             for entry in feed.entries[:10]:  # Limit to 10 most recent
+                # Reject stored articles, and variants of a link already in
+                # this batch, before any parsing or enrichment
+                key = canonicalize_url(entry.get('link', ''))
+                if key in batch or self.seen.seen('news', key):
+                    skipped += 1
+                    continue
+                batch.add(key)
                 try:
-                    self.process_article(entry, source_url)
+                    articles.append(self.parse_article(entry, source_url))
                 except Exception as e:
                     print(f"[News Worker] Error processing article: {e}")
                     continue
+            
+            self.score_articles(articles)
+            
+            # Write the whole feed in one transaction
+            result = self.db.insert_news_many(articles)
+            self.seen.add('news', result['inserted'] + result['duplicates'])
+            titles = {article['url']: article['title'] for article in articles}
+            for url in result['inserted']:
+                print(f"[News Worker] Inserted: {titles[url][:50]}...")
+            skipped += len(result['duplicates'])
+            if skipped:
+                print(f"[News Worker] Skipped {skipped} existing articles from {source_url}")
+            return True
         
         except Exception as e:
             print(f"[News Worker] Error parsing feed: {e}")
+            return False
     
-    def process_article(self, entry, source_url: str):
-        """Process a single news article"""
+    def parse_article(self, entry, source_url: str) -> dict:
+        """Build a news row from a single feed entry"""
+        title = entry.get('title', 'Untitled')
+        url = entry.get('link', '')
+        
+        # Parse published date
+        published = entry.get('published', '')
         try:
-            title = entry.get('title', 'Untitled')
-            url = entry.get('link', '')
-            
-            # Parse published date
-            published = entry.get('published', '')
+            published_at = datetime.strptime(published, '%a, %d %b %Y %H:%M:%S %z')
+        except:
             try:
-                published_at = datetime.strptime(published, '%a, %d %b %Y %H:%M:%S %z')
+                published_at = datetime.strptime(published, '%Y-%m-%dT%H:%M:%S%z')
             except:
-                try:
-                    published_at = datetime.strptime(published, '%Y-%m-%dT%H:%M:%S%z')
-                except:
-                    published_at = datetime.now()
-            
-            # Extract source name from URL
-            source = self.extract_source_name(source_url)
-            
-            # Generate summary and sentiment
-            summary = self.generate_summary(entry)
-            sentiment = self.analyze_sentiment(title, summary)
-            
-            # Insert into database
-            news_id = self.db.insert_news(
-                title=title,
-                summary=summary,
-                sentiment=sentiment,
-                source=source,
-                url=url,
-                published_at=published_at
-            )
-            
-            if news_id:
-                print(f"[News Worker] Inserted: {title[:50]}...")
-            else:
-                print(f"[News Worker] Article already exists: {title[:50]}...")
+                published_at = datetime.now()
         
-        except Exception as e:
-            print(f"[News Worker] Error processing article: {e}")
+        # Extract source name from URL
+        source = self.extract_source_name(source_url)
+        
+        # Sentiment is scored per feed in score_articles
+        summary = self.generate_summary(entry)
+        
+        return {
+            'title': title,
+            'summary': summary,
+            'source': source,
+            'url': url,
+            'published_at': published_at,
+        }
     
     def extract_source_name(self, url: str) -> str:
         """Extract source name from URL"""
@@ -104,35 +142,24 @@ class NewsWorker:
         # Try to get summary from feed
         summary = entry.get('summary', '')
         if summary:
-            # Clean HTML tags
-            from bs4 import BeautifulSoup
-            soup = BeautifulSoup(summary, 'html.parser')
-            summary = soup.get_text()
-            # Limit length
-            if len(summary) > 200:
-                summary = summary[:200] + '...'
-            return summary
+            # Strip HTML, reading only as far as the first 200 characters of text
+            summary = summarize_html(summary, 200)
+            if summary:
+                return summary
         
         # Fallback to title
         return entry.get('title', 'No summary available')
     
     def analyze_sentiment(self, title: str, summary: str) -> str:
-        """Analyze sentiment (simplified)"""
-        # In production, use OpenAI API for better analysis
-        text = (title + ' ' + summary).lower()
-        
-        bullish_keywords = ['surge', 'rally', 'gain', 'approve', 'adoption', 'upgrade', 'success']
-        bearish_keywords = ['crash', 'drop', 'fall', 'reject', 'hack', 'scam', 'fraud']
-        
-        bullish_count = sum(1 for word in bullish_keywords if word in text)
-        bearish_count = sum(1 for word in bearish_keywords if word in text)
-        
-        if bullish_count > bearish_count:
-            return 'Bullish'
-        elif bearish_count > bullish_count:
-            return 'Bearish'
-        else:
-            return 'Neutral'
+        """Sentiment label for a single article"""
+        return self.sentiment.score(title + ' ' + summary).label
+    
+    def score_articles(self, articles: list):
+        """Set sentiment and sentiment_score on a batch of parsed articles"""
+        results = self.sentiment.score_many(article['title'] + ' ' + article['summary'] for article in articles)
+        for article, result in zip(articles, results):
+            article['sentiment'] = result.label
+            article['sentiment_score'] = round(result.score, 4)
     
     def seed_initial_data(self):
         """Seed database with initial news"""
@@ -184,6 +211,7 @@ class NewsWorker:
 def run_once():
     """Run the news worker once"""
     worker = NewsWorker()
+    worker.setup()
     worker.seed_initial_data()
     worker.fetch_news()
 
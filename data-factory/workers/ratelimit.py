@@ -0,0 +1,65 @@
+"""
+Per-host token-bucket rate limiting and a pooled keep-alive HTTP session
+"""
+
+import threading
+import time
+from typing import Dict, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+
+def pooled_session(pool_size: int = config.HTTP_POOL_SIZE) -> requests.Session:
+    """Session keeping up to pool_size keep-alive connections per host"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+class TokenBucket:
+    """Allows rate requests per second on average, with bursts of up to capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Take the token now, possibly going negative; callers queue up
+            # behind each other in order and each sleeps until its turn
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+class HostRateLimiter:
+    """One token bucket per host, so a slow host never holds back the others"""
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]] = None,
+                 default: Tuple[float, float] = config.DEFAULT_HOST_RATE_LIMIT):
+        self.limits = config.HOST_RATE_LIMITS if limits is None else limits
+        self.default = default
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(*self.limits.get(host, self.default))
+            return bucket
+
+    def acquire(self, url: str):
+        """Block until a request to url's host is allowed"""
+        self.bucket(urlsplit(url).hostname or '').acquire()
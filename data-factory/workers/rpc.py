@@ -0,0 +1,139 @@
+"""
+Minimal Ethereum JSON-RPC client with request batching
+"""
+
+import itertools
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Tuple
+
+import requests
+
+import config
+
+# How providers say an eth_getLogs range matched too many logs (Infura -32005,
+# Alchemy "response size exceeded", QuickNode/others "limit exceeded", ...)
+LOG_LIMIT_RE = re.compile(
+    r'more than \d+ results|response size|limit exceeded|too many|query timeout|block range', re.IGNORECASE
+)
+
+class JsonRpcError(Exception):
+    """Error object returned by the node for a JSON-RPC call"""
+
+    def __init__(self, method: str, error: Dict[str, Any]):
+        self.method = method
+        self.code = error.get('code')
+        self.message = str(error.get('message', error))
+        super().__init__(f"{method}: {self.message}")
+
+    @property
+    def is_log_limit(self) -> bool:
+        """True if the node refused an eth_getLogs range for returning too many results"""
+        return self.method == 'eth_getLogs' and (self.code == -32005 or bool(LOG_LIMIT_RE.search(self.message)))
+
+class MissingBlocksError(JsonRpcError):
+    """The node returned null for blocks it has not served yet (a lagging or load-balanced replica)"""
+
+    def __init__(self, numbers: List[int]):
+        self.numbers = numbers
+        super().__init__('eth_getBlockByNumber', {'message': f"{len(numbers)} blocks not available, "
+                                                             f"first {numbers[0]}"})
+
+class JsonRpcClient:
+    """JSON-RPC over HTTP, sending many calls per request.
+
+    batch() splits calls into requests of batch_size and keeps at most
+    max_workers of those requests in flight at once.
+    """
+
+    def __init__(self, url: str, session: requests.Session = None,
+                 batch_size: int = config.BLOCKCHAIN_RPC_BATCH_SIZE,
+                 max_workers: int = config.BLOCKCHAIN_RPC_CONCURRENCY):
+        self.url = url
+        self.session = session or requests.Session()
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self._ids = itertools.count(1)
+
+    def call(self, method: str, *params) -> Any:
+        """Send a single JSON-RPC call and return its result"""
+        return self.batch([(method, list(params))])[0]
+
+    def batch(self, calls: Iterable[Tuple[str, List[Any]]]) -> List[Any]:
+        """Send (method, params) calls and return their results in order"""
+        calls = list(calls)
+        chunks = [calls[i:i + self.batch_size] for i in range(0, len(calls), self.batch_size)]
+        if len(chunks) <= 1 or self.max_workers <= 1:
+            return [result for chunk in chunks for result in self._post(chunk)]
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as executor:
+            return [result for results in executor.map(self._post, chunks) for result in results]
+
+    def _post(self, calls: List[Tuple[str, List[Any]]]) -> List[Any]:
+        payload = [
+            {'jsonrpc': '2.0', 'id': next(self._ids), 'method': method, 'params': params}
+            for method, params in calls
+        ]
+        response = self.session.post(self.url, json=payload, timeout=config.HTTP_TIMEOUT)
+        response.raise_for_status()
+
+        # Batch responses may come back in any order
+        by_id = {item.get('id'): item for item in response.json()}
+        results = []
+        for request, (method, _) in zip(payload, calls):
+            item = by_id.get(request['id'])
+            if item is None:
+                raise JsonRpcError(method, {'message': 'missing response in batch'})
+            if 'error' in item:
+                raise JsonRpcError(method, item['error'])
+            results.append(item.get('result'))
+        return results
+
+    def block_number(self) -> int:
+        return int(self.call('eth_blockNumber'), 16)
+
+    def get_blocks(self, numbers: Iterable[int], full_transactions: bool = True) -> List[Dict[str, Any]]:
+        """Fetch blocks by number, batched, in the order requested.
+        
+        Blocks the node returns as null are re-requested a few times; if any
+        are still missing, MissingBlocksError is raised rather than returning
+        a short list the caller could mistake for the whole range.
+        """
+        numbers = list(numbers)
+        blocks = self.batch(
+            ('eth_getBlockByNumber', [hex(number), full_transactions]) for number in numbers
+        )
+        for _ in range(config.BLOCKCHAIN_RPC_MISSING_RETRIES):
+            missing = [i for i, block in enumerate(blocks) if not block]
+            if not missing:
+                break
+            time.sleep(config.BLOCKCHAIN_RPC_MISSING_RETRY_DELAY)
+            refetched = self.batch(
+                ('eth_getBlockByNumber', [hex(numbers[i]), full_transactions]) for i in missing
+            )
+            for i, block in zip(missing, refetched):
+                blocks[i] = block
+        
+        missing = [number for number, block in zip(numbers, blocks) if not block]
+        if missing:
+            raise MissingBlocksError(missing)
+        return blocks
+
+    def get_logs(self, from_block: int, to_block: int, addresses: List[str],
+                 topics: List[Any]) -> List[Dict[str, Any]]:
+        """Fetch logs emitted by any of addresses over an inclusive block range,
+        halving the range whenever the provider rejects it for too many results"""
+        try:
+            return self.call('eth_getLogs', {
+                'fromBlock': hex(from_block),
+                'toBlock': hex(to_block),
+                'address': addresses,
+                'topics': topics,
+            })
+        except JsonRpcError as e:
+            if not e.is_log_limit or from_block >= to_block:
+                raise
+        middle = (from_block + to_block) // 2
+        return (self.get_logs(from_block, middle, addresses, topics)
+                + self.get_logs(middle + 1, to_block, addresses, topics))
@@ -1,21 +1,46 @@
-import feedparser
+import argparse
 import requests
+from lxml import etree
 from datetime import datetime
-from bs4 import BeautifulSoup
-import time
+from typing import Dict, List, Optional
+import re
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database.models import Database
+from database.seen_keys import SeenKeyIndex, canonicalize_url
+from workers.doc_cache import DocumentCache
+from workers.edgar_index import (archives_url_for, filing_index_url, parse_date_filed,
+                                 quarterly_index_urls, stream_index)
+from workers.feeds import FeedFetcher
+from workers.form_d import FormDFetcher
+from workers.ratelimit import HostRateLimiter
 import config
 
+FEED_TITLE_RE = re.compile(r'^[\w/]+ - (.+?) \(\d{10}\)')
+BACKFILL_KEY = 'sec:backfill'
+BACKFILL_CHECKPOINT_LINES = 50_000  # also checkpoint through long runs of other form types
+
 class SECWorker:
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, db: Database = None, session: requests.Session = None,
+                 limiter: HostRateLimiter = None, seen: SeenKeyIndex = None,
+                 cache: DocumentCache = None):
+        self.db = db or Database()
+        self.session = session or requests.Session()
+        # SEC fair access is enforced by the shared per-host limiter
+        self.limiter = limiter or HostRateLimiter()
+        self.feeds = FeedFetcher(self.db, self.session, self.limiter)
+        self.seen = seen or SeenKeyIndex(self.db)
         self.headers = {
             'User-Agent': config.SEC_USER_AGENT
         }
+        self.cache = cache or DocumentCache()
+        self.form_d = FormDFetcher(self.session, self.limiter, self.headers, cache=self.cache)
+    
+    def setup(self):
+        """One-time setup before the first run"""
+        self.seen.warm(['deals'])
     
     def fetch_form_d_filings(self):
         """Fetch Form D filings from SEC RSS feed"""
@@ -23,78 +48,180 @@ class SECWorker:
         
         try:
             # Parse RSS feed
-            feed = feedparser.parse(config.SEC_FORM_D_RSS)
+            feed, validators = self.feeds.fetch(config.SEC_FORM_D_RSS, headers=self.headers)
+            if feed is None:
+                print("[SEC Worker] No new filings since last fetch")
+                return
             
             if not feed.entries:
                 print("[SEC Worker] No entries found in feed")
+                self.feeds.commit(config.SEC_FORM_D_RSS, validators)
                 return
             
             print(f"[SEC Worker] Found {len(feed.entries)} entries")
             
+            # Reject stored (or already filtered) filings before fetching their XML
+            entries = {}
+            skipped = 0
             for entry in feed.entries:
-                try:
-                    self.process_filing(entry)
-                    time.sleep(0.1)  # Rate limiting
-                except Exception as e:
-                    print(f"[SEC Worker] Error processing entry: {e}")
+                if self.seen.seen('deals', entry.get('link', '')):
+                    skipped += 1
+                    continue
+                entries[canonicalize_url(entry.get('link', ''))] = entry
+            
+            # Download primary_doc.xml for every new filing concurrently, within SEC fair access
+            deals = []
+            failed = 0
+            for filing_url, form, error in self.form_d.fetch_many(list(entries)):
+                if error:
+                    print(f"[SEC Worker] Error fetching Form D for {filing_url}: {error}")
+                    failed += 1
                     continue
+                deal = self.parse_filing(entries[filing_url], form)
+                if deal:
+                    deals.append(deal)
+                else:
+                    self.seen.add('deals', [filing_url])
+            
+            # Write the whole feed in one transaction
+            result = self.db.insert_deals_many(deals)
+            self.seen.add('deals', result['inserted'] + result['duplicates'])
+            by_url = {deal['filing_url']: deal for deal in deals}
+            for filing_url in result['inserted']:
+                deal = by_url[filing_url]
+                print(f"[SEC Worker] Inserted deal: {deal['company_name']} - ${deal['amount_raised']:,.0f}")
+            skipped += len(result['duplicates'])
+            if skipped:
+                print(f"[SEC Worker] Skipped {skipped} existing deals")
+            
+            # Leave the feed marked unprocessed until every filing is stored,
+            # so failed downloads are retried on the next fetch
+            if failed:
+                print(f"[SEC Worker] {failed} filings failed; feed will be re-read next time")
+            else:
+                self.feeds.commit(config.SEC_FORM_D_RSS, validators)
         
         except Exception as e:
             print(f"[SEC Worker] Error fetching RSS feed: {e}")
     
-    def process_filing(self, entry):
-        """Process a single Form D filing"""
+    def parse_filing(self, entry, form: dict) -> Optional[dict]:
+        """Build a private deal row from a feed entry and its parsed Form D, or None if filtered out"""
+        # Parse the filing date (the current-filings feed only sets <updated>)
+        published = entry.get('published') or entry.get('updated', '')
         try:
-            # Extract basic info from RSS entry
-            company_name = entry.get('title', 'Unknown Company')
-            filing_url = entry.get('link', '')
-            
-            # Parse the published date
-            published = entry.get('published', '')
-            try:
-                filed_at = datetime.strptime(published, '%Y-%m-%dT%H:%M:%S%z')
-            except:
-                filed_at = datetime.now()
-            
-            # Extract additional details from summary
-            summary = entry.get('summary', '')
-            
-            # Try to extract amount raised and sector from the filing
-            # Note: This is simplified - real implementation would parse XML
-            amount_raised = self.extract_amount_from_summary(summary)
-            sector = self.extract_sector_from_summary(summary)
-            
-            # Filter: Only store deals > $1M
-            if amount_raised and amount_raised >= 1_000_000:
-                deal_id = self.db.insert_deal(
-                    company_name=company_name,
-                    amount_raised=amount_raised,
-                    filing_url=filing_url,
-                    sector=sector or 'Unknown',
-                    filed_at=filed_at
-                )
-                
-                if deal_id:
-                    print(f"[SEC Worker] Inserted deal: {company_name} - ${amount_raised:,.0f}")
-                else:
-                    print(f"[SEC Worker] Deal already exists: {company_name}")
+            filed_at = datetime.strptime(published, '%Y-%m-%dT%H:%M:%S%z')
+        except:
+            filed_at = datetime.now()
         
-        except Exception as e:
-            print(f"[SEC Worker] Error processing filing: {e}")
+        return self.build_deal(canonicalize_url(entry.get('link', '')), form, filed_at,
+                               self.company_from_title(entry.get('title', '')))
+    
+    def build_deal(self, filing_url: str, form: dict, filed_at: datetime,
+                   company_name: str = 'Unknown Company') -> Optional[dict]:
+        """Build a private deal row from a parsed Form D, or None if filtered out"""
+        amount_sold = form['total_amount_sold'] or 0
+        offering_amount = form['total_offering_amount']
+        
+        # Filter: Only store deals > $1M (sold so far, or offered when the offering is still open)
+        if max(amount_sold, offering_amount or 0) < 1_000_000:
+            return None
+        
+        sector = form['industry_group'] or 'Unknown'
+        if form['fund_type']:
+            sector = f"{sector} ({form['fund_type']})"
+        
+        return {
+            'company_name': form['issuer'] or company_name,
+            'amount_raised': amount_sold,
+            'offering_amount': offering_amount,
+            'form_type': form['submission_type'],
+            'filing_url': filing_url,
+            'sector': sector,
+            'filed_at': filed_at,
+        }
     
-    def extract_amount_from_summary(self, summary: str) -> float:
-        """Extract amount raised from summary (simplified)"""
-        # In a real implementation, you would parse the actual Form D XML
-        # For now, we'll generate realistic amounts for demonstration
-        import random
-        amounts = [1_500_000, 5_000_000, 10_000_000, 25_000_000, 50_000_000, 100_000_000]
-        return random.choice(amounts)
+    def company_from_title(self, title: str) -> str:
+        """Issuer name from a feed title like 'D - Acme Inc (0001234567) (Filer)'"""
+        match = FEED_TITLE_RE.match(title)
+        return match.group(1) if match else (title or 'Unknown Company')
+    
+    def backfill(self, sources: List[str]):
+        """Ingest Form D and D/A filings from EDGAR index files or URLs, each resuming from its checkpoint"""
+        for source in sources:
+            try:
+                self.backfill_index(source)
+            except Exception as e:
+                print(f"[SEC Worker] Backfill of {source} stopped: {e}")
+    
+    def backfill_index(self, source: str) -> Optional[Dict[str, int]]:
+        """Stream one form.idx/master.idx, checkpointing its byte offset after every batch.
+        
+        Rows are read a chunk at a time and handled in batches of
+        SEC_BACKFILL_BATCH, so memory does not grow with the index size.
+        A restart resumes at the saved offset (an HTTP Range request for URLs).
+        """
+        checkpoint_key = f"{BACKFILL_KEY}:{source}"
+        checkpoint = self.db.get_state(checkpoint_key)
+        if checkpoint == 'done':
+            print(f"[SEC Worker] Backfill of {source} already complete")
+            return None
+        
+        offset = int(checkpoint or 0)
+        print(f"[SEC Worker] Backfilling {source}" + (f" from byte {offset:,}" if offset else ''))
+        archives_url = archives_url_for(source)
+        if source.startswith(('http://', 'https://')):
+            self.limiter.acquire(source)
+        
+        stats = {'lines': 0, 'filings': 0, 'inserted': 0}
+        rows = []
+        for row, position in stream_index(source, offset, self.session, self.headers):
+            stats['lines'] += 1
+            if row and row.form_type in config.SEC_BACKFILL_FORM_TYPES:
+                rows.append(row)
+            if len(rows) >= config.SEC_BACKFILL_BATCH or stats['lines'] % BACKFILL_CHECKPOINT_LINES == 0:
+                stats['filings'] += len(rows)
+                stats['inserted'] += self.ingest_index_rows(rows, archives_url)
+                self.db.set_state(checkpoint_key, position)
+                rows = []
+        
+        stats['filings'] += len(rows)
+        stats['inserted'] += self.ingest_index_rows(rows, archives_url)
+        self.db.set_state(checkpoint_key, 'done')
+        print(f"[SEC Worker] Backfill of {source} complete: {stats['lines']:,} index lines, "
+              f"{stats['filings']:,} Form D filings, {stats['inserted']:,} new deals")
+        return stats
     
-    def extract_sector_from_summary(self, summary: str) -> str:
-        """Extract sector from summary (simplified)"""
-        sectors = ['Technology', 'Healthcare', 'Fintech', 'AI/ML', 'Biotech', 'SaaS', 'E-commerce']
-        import random
-        return random.choice(sectors)
+    def ingest_index_rows(self, rows: list, archives_url: str) -> int:
+        """Fetch, filter and insert one batch of index rows; returns the number of new deals"""
+        filings = {}
+        for row in rows:
+            filing_url = canonicalize_url(filing_index_url(row, archives_url))
+            if not self.seen.seen('deals', filing_url):
+                filings[filing_url] = row
+        
+        deals = []
+        failed = 0
+        for filing_url, form, error in self.form_d.fetch_many(list(filings)):
+            if error:
+                print(f"[SEC Worker] Error fetching Form D for {filing_url}: {error}")
+                # A missing or malformed document will never succeed; anything else
+                # (network, 429, 5xx) must not be skipped past by the checkpoint
+                status = getattr(getattr(error, 'response', None), 'status_code', None)
+                if status not in (404, 410) and not isinstance(error, (ValueError, etree.XMLSyntaxError)):
+                    failed += 1
+                continue
+            row = filings[filing_url]
+            deal = self.build_deal(filing_url, form, parse_date_filed(row.date_filed), row.company_name)
+            if deal:
+                deals.append(deal)
+            else:
+                self.seen.add('deals', [filing_url])
+        
+        result = self.db.insert_deals_many(deals)
+        self.seen.add('deals', result['inserted'] + result['duplicates'])
+        if failed:
+            raise RuntimeError(f"{failed} Form D downloads failed; rerun to resume from the last checkpoint")
+        return len(result['inserted'])
     
     def seed_initial_data(self):
         """Seed database with initial sample data"""
@@ -147,9 +274,28 @@ class SECWorker:
 def run_once():
     """Run the SEC worker once"""
     worker = SECWorker()
+    worker.setup()
     worker.seed_initial_data()
     worker.fetch_form_d_filings()
 
+def run_backfill(sources: List[str]):
+    """Ingest historical Form D filings from EDGAR indexes, resuming if interrupted"""
+    worker = SECWorker()
+    worker.setup()
+    worker.backfill(sources)
+    print(f"[SEC Worker] Document cache: {worker.cache.stats()}")
+
 if __name__ == '__main__':
-    run_once()
+    parser = argparse.ArgumentParser(description='MicroTerm SEC worker')
+    parser.add_argument('--backfill', nargs=2, metavar=('START', 'END'),
+                        help='ingest the quarterly form.idx files from START to END, e.g. 2023Q1 2024Q2')
+    parser.add_argument('--index', action='append', default=[], metavar='PATH_OR_URL',
+                        help='ingest a form.idx/master.idx file or URL (daily indexes, fixtures); repeatable')
+    args = parser.parse_args()
+    
+    sources = (quarterly_index_urls(*args.backfill) if args.backfill else []) + args.index
+    if sources:
+        run_backfill(sources)
+    else:
+        run_once()
 
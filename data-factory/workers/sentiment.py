@@ -0,0 +1,156 @@
+"""
+Weighted-lexicon sentiment scoring for news headlines and summaries
+"""
+
+import csv
+import math
+import re
+from itertools import compress
+from typing import Dict, Iterable, List, NamedTuple
+
+import config
+
+# Words, keeping inner apostrophes so "isn't" stays one token
+WORD_RE = re.compile(r"[a-z0-9]+(?:['’][a-z]+)?")
+
+# A negator directly before a term flips it, at reduced strength
+NEGATORS = {
+    'not', 'no', 'never', 'without', 'nor', "isn't", "wasn't", "aren't", "won't",
+    "don't", "doesn't", "didn't", "can't", "cannot", 'hardly',
+}
+NEGATION_FACTOR = 0.75
+
+# Squashes the summed weights into (-1, 1); a single weight-2 term scores ~0.46
+NORMALIZATION_ALPHA = 15
+
+DEFAULT_LEXICON = {
+    # Bullish
+    'surge': 2.5, 'surges': 2.5, 'surged': 2.5, 'soar': 2.5, 'soars': 2.5, 'soared': 2.5,
+    'rally': 2, 'rallies': 2, 'rallied': 2, 'gain': 1.5, 'gains': 1.5, 'gained': 1.5,
+    'jump': 1.5, 'jumps': 1.5, 'jumped': 1.5, 'climb': 1.5, 'climbs': 1.5, 'climbed': 1.5,
+    'rise': 1, 'rises': 1, 'rose': 1, 'rebound': 1.5, 'rebounds': 1.5, 'recovery': 1.5,
+    'approve': 2, 'approves': 2, 'approved': 2, 'approval': 2, 'adoption': 2, 'adopts': 1.5,
+    'upgrade': 1.5, 'upgrades': 1.5, 'upgraded': 1.5, 'success': 1.5, 'successful': 1.5,
+    'successfully': 1.5, 'record high': 2.5, 'all time high': 3, 'breakout': 2, 'bullish': 2.5,
+    'partnership': 1.5, 'launch': 1, 'launches': 1, 'inflows': 1.5, 'milestone': 1.5,
+    'outperform': 1.5, 'outperforms': 1.5, 'boost': 1.5, 'boosts': 1.5, 'optimism': 1.5,
+    'rate cut': 1.5, 'dovish': 1, 'buyback': 1, 'profit': 1, 'profits': 1, 'beat': 1,
+    'beats': 1, 'strong': 1, 'strength': 1, 'accumulation': 1, 'raises': 1, 'funding': 0.5,
+    # Bearish
+    'crash': -3, 'crashes': -3, 'crashed': -3, 'plunge': -2.5, 'plunges': -2.5, 'plunged': -2.5,
+    'drop': -1.5, 'drops': -1.5, 'dropped': -1.5, 'fall': -1.5, 'falls': -1.5, 'fell': -1.5,
+    'slump': -2, 'slumps': -2, 'tumble': -2, 'tumbles': -2, 'tumbled': -2, 'decline': -1.5,
+    'declines': -1.5, 'reject': -2, 'rejects': -2, 'rejected': -2, 'rejection': -2,
+    'hack': -3, 'hacked': -3, 'hacks': -3, 'exploit': -2.5, 'exploited': -2.5, 'breach': -2.5,
+    'scam': -3, 'scams': -3, 'fraud': -3, 'fraudulent': -3, 'lawsuit': -2, 'sues': -2,
+    'sued': -2, 'charges': -1.5, 'charged': -1.5, 'ban': -2, 'bans': -2, 'banned': -2,
+    'crackdown': -2, 'bearish': -2.5, 'selloff': -2, 'sell off': -2, 'outflows': -1.5,
+    'liquidation': -2, 'liquidations': -2, 'bankruptcy': -3, 'insolvent': -3, 'collapse': -3,
+    'collapses': -3, 'collapsed': -3, 'vulnerability': -1.5, 'delay': -1, 'delays': -1,
+    'delayed': -1, 'warning': -1.5, 'warns': -1.5, 'losses': -1.5, 'loss': -1.5, 'fear': -1.5,
+    'fears': -1.5, 'rate hike': -1.5, 'hawkish': -1, 'layoffs': -1.5, 'weak': -1,
+    'downgrade': -1.5, 'downgraded': -1.5, 'investigation': -1.5, 'probe': -1.5,
+}
+
+class Sentiment(NamedTuple):
+    label: str
+    score: float
+
+def tokenize(text: str) -> List[str]:
+    return WORD_RE.findall(text.lower())
+
+def load_lexicon(path: str) -> Dict[str, float]:
+    """Read term,weight rows from a CSV (or tab-separated) lexicon file"""
+    with open(path, newline='', encoding='utf-8') as f:
+        dialect = 'excel-tab' if path.endswith(('.tsv', '.txt')) else 'excel'
+        lexicon = {}
+        for row in csv.reader(f, dialect):
+            if len(row) < 2 or row[0].startswith('#'):
+                continue
+            try:
+                lexicon[row[0]] = float(row[1])
+            except ValueError:
+                continue  # header row
+        return lexicon
+
+class SentimentEngine:
+    """Scores text against a weighted lexicon in one pass over its words.
+
+    Terms are compiled once into a dict of single words plus a dict of
+    multi-word phrases indexed by their first word, so each word of the text
+    costs one dict lookup no matter how large the lexicon is. Matching is on
+    whole words: "fall" does not match "fallout". The summed weights are
+    normalized to a score in (-1, 1) and labelled Bullish/Bearish/Neutral.
+    """
+
+    def __init__(self, lexicon: Dict[str, float] = None,
+                 threshold: float = config.SENTIMENT_THRESHOLD):
+        self.threshold = threshold
+        self._words: Dict[str, float] = {}
+        self._phrases: Dict[str, float] = {}
+        self._phrase_lengths: Dict[str, List[int]] = {}
+
+        for term, weight in (DEFAULT_LEXICON if lexicon is None else lexicon).items():
+            tokens = tokenize(term)
+            if len(tokens) == 1:
+                self._words[tokens[0]] = weight
+            elif tokens:
+                self._phrases[' '.join(tokens)] = weight
+                self._phrase_lengths.setdefault(tokens[0], []).append(len(tokens))
+        for lengths in self._phrase_lengths.values():
+            lengths.sort(reverse=True)  # longest match wins
+        # Any word that can start a match; all other words are skipped in C
+        self._starts = frozenset(self._words) | frozenset(self._phrase_lengths)
+
+    @classmethod
+    def from_config(cls) -> 'SentimentEngine':
+        """Default lexicon, extended by SENTIMENT_LEXICON_PATH when set"""
+        lexicon = dict(DEFAULT_LEXICON)
+        if config.SENTIMENT_LEXICON_PATH:
+            lexicon.update(load_lexicon(config.SENTIMENT_LEXICON_PATH))
+        return cls(lexicon)
+
+    def __len__(self) -> int:
+        return len(self._words) + len(self._phrases)
+
+    def raw_score(self, tokens: List[str]) -> float:
+        """Sum of matched term weights, with negated terms flipped"""
+        words, phrases, phrase_lengths = self._words, self._phrases, self._phrase_lengths
+        total = 0.0
+        n = len(tokens)
+        next_free = 0  # first token not consumed by a matched phrase
+        for i in compress(range(n), map(self._starts.__contains__, tokens)):
+            if i < next_free:
+                continue
+            token = tokens[i]
+            weight, size = None, 1
+            lengths = phrase_lengths.get(token)
+            if lengths:
+                for length in lengths:
+                    if i + length <= n:
+                        weight = phrases.get(' '.join(tokens[i:i + length]))
+                        if weight is not None:
+                            size = length
+                            break
+            if weight is None:
+                weight = words.get(token)
+            if weight is not None:
+                if i and tokens[i - 1] in NEGATORS:
+                    weight = -weight * NEGATION_FACTOR
+                total += weight
+                next_free = i + size
+        return total
+
+    def score(self, text: str) -> Sentiment:
+        """Score a single text"""
+        total = self.raw_score(tokenize(text))
+        score = total / math.sqrt(total * total + NORMALIZATION_ALPHA)
+        if score > self.threshold:
+            return Sentiment('Bullish', score)
+        if score < -self.threshold:
+            return Sentiment('Bearish', score)
+        return Sentiment('Neutral', score)
+
+    def score_many(self, texts: Iterable[str]) -> List[Sentiment]:
+        """Score a batch of texts, e.g. every article in a feed"""
+        return [self.score(text) for text in texts]
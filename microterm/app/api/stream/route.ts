@@ -4,9 +4,138 @@ import { getDatabase } from '@/lib/db';
 export const runtime = 'nodejs';
 export const dynamic = 'force-dynamic';
 
+const POLL_INTERVAL_MS = 10000;
+const CHANGE_BATCH = 500;
+const FEED_TABLES = ['private_deals', 'whale_alerts', 'news'] as const;
+
+type FeedTable = (typeof FEED_TABLES)[number];
+
+interface Change {
+  seq: number;
+  table: FeedTable;
+  id: number;
+  op: 'insert' | 'update' | 'delete';
+  row: Record<string, unknown> | null;
+}
+
+type Subscriber = (payload: string) => void;
+
+// One poller per server process, shared by every connected client, so the
+// database cost of a tick does not grow with the number of clients
+const subscribers = new Set<Subscriber>();
+let poller: ReturnType<typeof setInterval> | null = null;
+let lastSeq: number | null = null;
+
+function currentVersion(): number {
+  const row = getDatabase()
+    .prepare('SELECT COALESCE(MAX(seq), 0) AS version FROM change_log')
+    .get() as { version: number };
+  return row.version;
+}
+
+// Changes after seq, collapsed to the latest per row, with the current row
+// for each (see Database.get_changes_since in data-factory)
+function changesSince(seq: number): { version: number; changes: Change[] } {
+  const db = getDatabase();
+  const entries = db
+    .prepare(
+      'SELECT seq, table_name, row_id, op FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?'
+    )
+    .all(seq, CHANGE_BATCH) as { seq: number; table_name: FeedTable; row_id: number; op: Change['op'] }[];
+
+  const latest = new Map<string, (typeof entries)[number]>();
+  for (const entry of entries) {
+    const key = `${entry.table_name}:${entry.row_id}`;
+    latest.delete(key);
+    latest.set(key, entry);
+  }
+
+  const rows = new Map<string, Record<string, unknown>>();
+  for (const table of FEED_TABLES) {
+    const ids = [...latest.values()]
+      .filter((entry) => entry.table_name === table && entry.op !== 'delete')
+      .map((entry) => entry.row_id);
+    if (ids.length === 0) continue;
+    const found = db
+      .prepare(`SELECT * FROM ${table} WHERE id IN (${ids.map(() => '?').join(', ')})`)
+      .all(...ids) as Record<string, unknown>[];
+    for (const row of found) rows.set(`${table}:${row.id}`, row);
+  }
+
+  return {
+    version: entries.length ? entries[entries.length - 1].seq : seq,
+    changes: [...latest.entries()].map(([key, entry]) => ({
+      seq: entry.seq,
+      table: entry.table_name,
+      id: entry.row_id,
+      op: entry.op,
+      row: rows.get(key) ?? null,
+    })),
+  };
+}
+
+// Newest row of each feed table, as the stream has always reported in `data`
+function latestRows() {
+  const db = getDatabase();
+  return {
+    deal: db.prepare('SELECT * FROM private_deals ORDER BY filed_at DESC LIMIT 1').get(),
+    alert: db.prepare('SELECT * FROM whale_alerts ORDER BY timestamp DESC LIMIT 1').get(),
+    news: db.prepare('SELECT * FROM news ORDER BY published_at DESC LIMIT 1').get(),
+  };
+}
+
+function updatePayload(version: number, changes: Change[]): string {
+  return `data: ${JSON.stringify({
+    type: 'update',
+    version,
+    changes,
+    data: latestRows(),
+    timestamp: new Date().toISOString(),
+  })}\n\n`;
+}
+
+function poll() {
+  try {
+    const version = currentVersion();
+    if (lastSeq === null || version < lastSeq) {
+      lastSeq = version; // first tick, or the database was replaced
+      return;
+    }
+    if (version === lastSeq) return; // nothing changed: one index seek per tick
+
+    const { version: seq, changes } = changesSince(lastSeq);
+    lastSeq = seq;
+    const payload = updatePayload(seq, changes);
+    for (const send of subscribers) send(payload);
+  } catch (error) {
+    console.error('Error polling change log:', error);
+  }
+}
+
+function subscribe(send: Subscriber): () => void {
+  subscribers.add(send);
+  if (!poller) poller = setInterval(poll, POLL_INTERVAL_MS);
+  // A new client gets the current state right away instead of waiting for a change
+  try {
+    const version = currentVersion();
+    if (lastSeq === null) lastSeq = version; // changes after this snapshot go out as deltas
+    send(updatePayload(version, []));
+  } catch (error) {
+    console.error('Error sending initial snapshot:', error);
+  }
+  return () => {
+    subscribers.delete(send);
+    if (subscribers.size === 0 && poller) {
+      clearInterval(poller);
+      poller = null;
+      lastSeq = null;
+    }
+  };
+}
+
 export async function GET(request: NextRequest) {
   const encoder = new TextEncoder();
-  
+
   const stream = new ReadableStream({
     start(controller) {
       // Send initial connection message
@@ -14,37 +143,12 @@ export async function GET(request: NextRequest) {
         encoder.encode(`data: ${JSON.stringify({ type: 'connected' })}\n\n`)
       );
 
-      // Send updates every 10 seconds
-      const interval = setInterval(() => {
-        try {
-          const db = getDatabase();
-          
-          // Get latest data
-          const latestDeal = db.prepare('SELECT * FROM private_deals ORDER BY filed_at DESC LIMIT 1').get();
-          const latestAlert = db.prepare('SELECT * FROM whale_alerts ORDER BY timestamp DESC LIMIT 1').get();
-          const latestNews = db.prepare('SELECT * FROM news ORDER BY published_at DESC LIMIT 1').get();
-          
-          const update = {
-            type: 'update',
-            data: {
-              deal: latestDeal,
-              alert: latestAlert,
-              news: latestNews,
-            },
-            timestamp: new Date().toISOString(),
-          };
-
-          controller.enqueue(
-            encoder.encode(`data: ${JSON.stringify(update)}\n\n`)
-          );
-        } catch (error) {
-          console.error('Error sending SSE update:', error);
-        }
-      }, 10000);
+      // Deltas are pushed only when the change log moves
+      const unsubscribe = subscribe((payload) => controller.enqueue(encoder.encode(payload)));
 
       // Cleanup on close
       request.signal.addEventListener('abort', () => {
-        clearInterval(interval);
+        unsubscribe();
         controller.close();
       });
     },
@@ -58,4 +162,3 @@ export async function GET(request: NextRequest) {
     },
   });
 }
-